@@ -0,0 +1,98 @@
+"""
+Compares small object uploads with a client per upload
+against a shared pooled client.
+
+Run against a local S3 stand-in, for example MinIO or moto server:
+
+    moto_server -p 5000 &
+    python -m benchmarks.s3_client --endpoint-url http://127.0.0.1:5000
+"""
+
+import argparse
+import asyncio
+import io
+import time
+from typing import Awaitable, Callable
+
+import aioboto3
+from aiobotocore.config import AioConfig
+
+from utils.s3 import init_s3_client
+
+
+async def per_upload_client(
+    session: aioboto3.Session,
+    endpoint_url: str,
+    bucket: str,
+    key: str,
+    content: bytes,
+) -> None:
+    async with session.client("s3", endpoint_url=endpoint_url) as s3:
+        await s3.upload_fileobj(io.BytesIO(content), bucket, key)
+
+
+async def measure(
+    name: str,
+    upload: Callable[[str], Awaitable[None]],
+    uploads: int,
+    concurrency: int,
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def task(i: int) -> None:
+        async with semaphore:
+            await upload(f"benchmark/{name}/{i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(task(i) for i in range(uploads)))
+    elapsed = time.perf_counter() - started
+    print(f"{name}: {elapsed:.2f}s, {uploads / elapsed:.1f} uploads/s")
+
+
+async def main(args: argparse.Namespace) -> None:
+    session = aioboto3.Session(
+        aws_access_key_id="benchmark",
+        aws_secret_access_key="benchmark",
+        region_name="us-east-1",
+    )
+    content = b"x" * args.size
+    async with session.client(
+        "s3",
+        endpoint_url=args.endpoint_url,
+        config=AioConfig(max_pool_connections=1),
+    ) as s3:
+        try:
+            await s3.create_bucket(Bucket=args.bucket)
+        except s3.exceptions.BucketAlreadyOwnedByYou:
+            pass
+
+    await measure(
+        "per-upload",
+        lambda key: per_upload_client(
+            session, args.endpoint_url, args.bucket, key, content
+        ),
+        args.uploads,
+        args.concurrency,
+    )
+
+    resource = init_s3_client(session, args.endpoint_url, args.concurrency)
+    s3 = await anext(resource)
+    try:
+        await measure(
+            "shared",
+            lambda key: s3.upload_fileobj(io.BytesIO(content), args.bucket, key),
+            args.uploads,
+            args.concurrency,
+        )
+    finally:
+        await resource.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--endpoint-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--bucket", default="benchmark")
+    parser.add_argument("--uploads", type=int, default=500)
+    parser.add_argument("--size", type=int, default=4 * 1024)
+    parser.add_argument("--concurrency", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
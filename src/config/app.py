@@ -1,9 +1,11 @@
+import asyncio
+import inspect
 import logging
+from typing import Set
 
 from fastapi import Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi_utils.tasks import repeat_every
 from fastapi_versioning import VersionedFastAPI
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 
@@ -74,20 +76,52 @@ for sub_app in __app.routes:
             sub_app.app.add_exception_handler(exception, handler)
 
 
+__background_tasks: Set[asyncio.Task] = set()
+
+
 @__app.on_event("startup")
-@repeat_every(
-    seconds=settings.SCHEDULER_DISK_CLEANUP_EVERY * 60,
-    raise_exceptions=True,
-)
-async def disk_cleanup() -> None:
-    # NOTE: This could be done in many different ways:
-    # scheduler, crontab, linux crontab,
-    # celery worker + beat, etc.
-    # But for such a simple, rarely running task
-    # this looks ok.
-    logging.debug("DISK CLEANUP STARTED...")
-    await container.clean_disk()()
-    logging.debug("DISK CLEANUP ENDED...")
+async def s3_sync() -> None:
+    # otherwise queue is processed by a separate worker, see worker.py
+    if settings.S3_SYNC_IN_PROCESS:
+        __background_tasks.add(asyncio.create_task(container.sync_files_to_s3()()))
+
+
+@__app.on_event("startup")
+async def access_tracking() -> None:
+    # accesses are aggregated in memory and written in batches,
+    # pending ones are written when the task is cancelled on shutdown
+    __background_tasks.add(asyncio.create_task(container.track_access()()))
+
+
+@__app.on_event("startup")
+async def scheduler() -> None:
+    # jobs are leased in db, so only one process of the cluster runs each of them.
+    # Otherwise they are run by a separate worker, see worker.py
+    if settings.SCHEDULER_IN_PROCESS:
+        for scheduled in (
+            container.disk_cleanup_scheduler(),
+            container.s3_reconcile_scheduler(),
+            container.disk_eviction_scheduler(),
+            container.file_placement_scheduler(),
+            container.file_expiry_scheduler(),
+            container.disk_reconcile_scheduler(),
+        ):
+            __background_tasks.add(asyncio.create_task(scheduled()))
+
+
+@__app.on_event("shutdown")
+async def stop_background_tasks() -> None:
+    # claimed jobs of cancelled workers are retried after the lease
+    for task in __background_tasks:
+        task.cancel()
+    await asyncio.gather(*__background_tasks, return_exceptions=True)
+
+
+@__app.on_event("shutdown")
+async def shutdown_resources() -> None:
+    # async resources, like s3 client, make shutdown awaitable
+    if inspect.isawaitable(result := container.shutdown_resources()):
+        await result
 
 
 def get_fastapi_app() -> FastAPI:
@@ -3,9 +3,18 @@ from dependency_injector import containers, providers
 
 from config import settings
 from config.db import Database
+from models.access import FileAccess
 from models.file import File
+from models.schedule import ScheduledJob
+from models.sync import S3SyncJob
+from repo.access import FileAccessRepo
+from repo.file import FileRepo
+from repo.schedule import ScheduledJobRepo
+from repo.sync import SyncJobRepo
 from services import *
-from utils.repo import Repo
+from utils.asyncio import AIMDLimiter, CircuitBreaker, Hedger, init_process_pool
+from utils.image import parse_variants
+from utils.s3 import close_body, init_s3_client, is_overload_error, is_unavailable_error
 from utils.sqlalchemy import Filter, FilterSeq
 
 
@@ -21,12 +30,47 @@ class Container(containers.DeclarativeContainer):
         )
     )
 
+    s3_client = providers.Resource(
+        init_s3_client,
+        session=boto3,
+        endpoint_url=settings.AWS_ENDPOINT_URL,
+        max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+    )
+
+    process_pool = providers.Resource(
+        init_process_pool,
+        max_workers=settings.IMAGE_WORKERS,
+    )
+
     file_repo = providers.Singleton(
-        Repo[File],
+        FileRepo,
         db=db,
         model_class=File,
         pk_field="uuid",
     )
+    sync_job_repo = providers.Singleton(
+        SyncJobRepo,
+        db=db,
+        model_class=S3SyncJob,
+        pk_field="file_uuid",
+    )
+    scheduled_job_repo = providers.Singleton(
+        ScheduledJobRepo,
+        db=db,
+        model_class=ScheduledJob,
+        pk_field="name",
+    )
+    file_access_repo = providers.Singleton(
+        FileAccessRepo,
+        db=db,
+        model_class=FileAccess,
+        pk_field="file_uuid",
+    )
+    file_uuid_filter = providers.Singleton(
+        Filter,
+        model_class=File,
+        column_name="uuid",
+    )
     file_created_at_filter = providers.Singleton(
         Filter,
         model_class=File,
@@ -42,29 +86,289 @@ class Container(containers.DeclarativeContainer):
         model_class=File,
         column_name="is_removed_from_disk",
     )
+    file_is_saved_to_s3_filter = providers.Singleton(
+        Filter,
+        model_class=File,
+        column_name="is_saved_to_s3",
+    )
+    file_rehydrated_at_filter = providers.Singleton(
+        Filter,
+        model_class=File,
+        column_name="rehydrated_at",
+    )
 
+    s3_sync_limiter = providers.Singleton(
+        AIMDLimiter,
+        min_limit=settings.S3_SYNC_MIN_WORKERS,
+        max_limit=settings.S3_SYNC_WORKERS,
+        latency_target=settings.S3_SYNC_LATENCY_TARGET,
+        is_overload=is_overload_error,
+    )
+    s3_breaker = providers.Singleton(
+        CircuitBreaker,
+        failure_threshold=settings.S3_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=settings.S3_BREAKER_RESET_TIMEOUT,
+        is_failure=is_unavailable_error,
+    )
+    s3_get_hedger = providers.Singleton(
+        Hedger,
+        enabled=settings.S3_HEDGE_ENABLED,
+        percentile=settings.S3_HEDGE_PERCENTILE,
+        budget=settings.S3_HEDGE_BUDGET,
+        discard=close_body,
+    )
+    s3_put_hedger = providers.Singleton(
+        Hedger,
+        enabled=settings.S3_HEDGE_ENABLED,
+        percentile=settings.S3_HEDGE_PERCENTILE,
+        budget=settings.S3_HEDGE_BUDGET,
+    )
+    save_file_to_s3 = providers.Singleton(
+        SaveFileToS3,
+        repo=file_repo,
+        # async resource, so the service awaits the client itself
+        s3=s3_client.provider,
+        bucket=settings.AWS_BUCKET_NAME,
+        multipart_threshold=settings.AWS_MULTIPART_THRESHOLD,
+        multipart_part_size=settings.AWS_MULTIPART_PART_SIZE,
+        multipart_concurrency=settings.AWS_MULTIPART_CONCURRENCY,
+        limiter=s3_sync_limiter,
+        hedge=s3_put_hedger,
+        hedge_max_size=settings.S3_HEDGE_MAX_PUT_SIZE,
+        breaker=s3_breaker,
+    )
+    stream_file_from_s3 = providers.Singleton(
+        StreamFileFromS3,
+        s3=s3_client.provider,
+        bucket=settings.AWS_BUCKET_NAME,
+        max_streams=settings.AWS_MAX_STREAMS,
+        wait_timeout=settings.AWS_STREAM_WAIT_TIMEOUT,
+        hedge=s3_get_hedger,
+    )
+    disk_cache = providers.Singleton(
+        DiskCache,
+        max_bytes=settings.DISK_CACHE_MAX_BYTES,
+        max_object_bytes=settings.DISK_CACHE_MAX_OBJECT_BYTES,
+        part_size=settings.AWS_MULTIPART_PART_SIZE,
+        concurrency=settings.AWS_MULTIPART_CONCURRENCY,
+        s3=s3_client.provider,
+        bucket=settings.AWS_BUCKET_NAME,
+        repo=file_repo,
+        rehydrated_at_filter=file_rehydrated_at_filter,
+        is_removed_from_disk_filter=file_is_removed_from_disk_filter,
+        filter_seq_class=FilterSeq,
+        hedge=s3_get_hedger,
+    )
+    track_access = providers.Singleton(
+        TrackAccess,
+        flush_interval=settings.ACCESS_FLUSH_INTERVAL,
+        max_pending=settings.ACCESS_MAX_PENDING,
+        half_life=settings.PLACEMENT_HALF_LIFE,
+        repo=file_access_repo,
+    )
     extract_metadata = providers.Singleton(ExtractMetadata)
+    extract_attributes = providers.Singleton(
+        ExtractAttributes,
+        repo=file_repo,
+        executor=process_pool,
+    )
     create_file = providers.Singleton(
         CreateFile,
         base_path=settings.MEDIA_ROOT,
         max_bytes=settings.UPLOAD_MAX_SIZE_IN_BYTES,
+        compression_enabled=settings.COMPRESSION_ENABLED,
+        compression_min_size=settings.COMPRESSION_MIN_SIZE_IN_BYTES,
         repo=file_repo,
+        sync_repo=sync_job_repo,
+        save_to_s3=save_file_to_s3,
         extract_metadata=extract_metadata,
     )
-    save_file_to_s3 = providers.Singleton(
-        SaveFileToS3,
+    start_direct_upload = providers.Singleton(
+        StartDirectUpload,
+        base_path=settings.MEDIA_ROOT,
+        max_bytes=settings.DIRECT_UPLOAD_MAX_SIZE_IN_BYTES,
+        multipart_threshold=settings.AWS_MULTIPART_THRESHOLD,
+        multipart_part_size=settings.AWS_MULTIPART_PART_SIZE,
+        expiration=settings.AWS_PRESIGNED_EXPIRATION,
+        s3=s3_client.provider,
+        bucket=settings.AWS_BUCKET_NAME,
+    )
+    presign_download = providers.Singleton(
+        PresignDownload,
+        enabled=settings.AWS_PRESIGNED_DOWNLOADS,
+        expiration=settings.AWS_PRESIGNED_DOWNLOAD_EXPIRATION,
+        s3=s3_client.provider,
+        bucket=settings.AWS_BUCKET_NAME,
+    )
+    complete_direct_upload = providers.Singleton(
+        CompleteDirectUpload,
+        base_path=settings.MEDIA_ROOT,
+        max_bytes=settings.DIRECT_UPLOAD_MAX_SIZE_IN_BYTES,
+        s3=s3_client.provider,
+        bucket=settings.AWS_BUCKET_NAME,
         repo=file_repo,
-        boto3=boto3,
-        endpoint_url=settings.AWS_ENDPOINT_URL,
+    )
+    sync_files_to_s3 = providers.Singleton(
+        SyncFilesToS3,
+        repo=sync_job_repo,
+        save_to_s3=save_file_to_s3,
+        max_workers=settings.S3_SYNC_WORKERS,
+        max_attempts=settings.S3_SYNC_MAX_ATTEMPTS,
+        backoff=settings.S3_SYNC_BACKOFF,
+        max_backoff=settings.S3_SYNC_MAX_BACKOFF,
+        lease=settings.S3_SYNC_LEASE,
+        poll_interval=settings.S3_SYNC_POLL_INTERVAL,
+        limiter=s3_sync_limiter,
+        breaker=s3_breaker,
+        stats_interval=settings.S3_SYNC_STATS_INTERVAL,
+    )
+    reconcile_s3 = providers.Singleton(
+        ReconcileS3,
+        prefix=f"{settings.MEDIA_ROOT.strip('/')}/",
+        page_size=settings.S3_RECONCILE_PAGE_SIZE,
+        orphan_age=settings.S3_RECONCILE_ORPHAN_AGE,
+        s3=s3_client.provider,
         bucket=settings.AWS_BUCKET_NAME,
+        repo=file_repo,
+        sync_repo=sync_job_repo,
+    )
+    reconcile_disk = providers.Singleton(
+        ReconcileDisk,
+        base_path=settings.MEDIA_ROOT,
+        max_entries=settings.DISK_RECONCILE_MAX_ENTRIES,
+        page_size=settings.DISK_RECONCILE_PAGE_SIZE,
+        orphan_age=settings.DISK_RECONCILE_ORPHAN_AGE,
+        quarantine=settings.DISK_RECONCILE_QUARANTINE,
+        repo=file_repo,
+    )
+    stream_archive = providers.Singleton(
+        StreamArchive,
+        max_files=settings.ARCHIVE_MAX_FILES,
+        repo=file_repo,
+        filter_class=Filter,
+        filter_seq_class=FilterSeq,
+        stream_from_s3=stream_file_from_s3,
+    )
+    import_archive = providers.Singleton(
+        ImportArchive,
+        max_files=settings.ARCHIVE_MAX_FILES,
+        max_bytes=settings.UPLOAD_MAX_SIZE_IN_BYTES,
+        max_workers=settings.ARCHIVE_IMPORT_WORKERS,
+        create_file=create_file,
+        repo=file_repo,
+        sync_repo=sync_job_repo,
+    )
+    create_derivative = providers.Singleton(
+        CreateDerivative,
+        base_path=settings.MEDIA_ROOT,
+        variants=providers.Callable(parse_variants, settings.IMAGE_VARIANTS),
+        on_upload=settings.IMAGE_VARIANTS_ON_UPLOAD,
+        repo=file_repo,
+        executor=process_pool,
+        filter_class=Filter,
+        filter_seq_class=FilterSeq,
     )
     clean_disk = providers.Singleton(
         CleanDisk,
         max_days=settings.SCHEDULER_REMOVE_FILES_OLDER_THAN,
         max_days_unused=settings.SCHEDULER_REMOVE_FILES_UNUSED_MORE_THAN,
+        batch_size=settings.SCHEDULER_DISK_CLEANUP_BATCH_SIZE,
+        max_workers=settings.SCHEDULER_DISK_CLEANUP_WORKERS,
         repo=file_repo,
+        access_repo=file_access_repo,
+        uuid_filter=file_uuid_filter,
         created_at_filter=file_created_at_filter,
         updated_at_filter=file_updated_at_filter,
         is_removed_from_disk_filter=file_is_removed_from_disk_filter,
+        rehydrated_at_filter=file_rehydrated_at_filter,
         filter_seq_class=FilterSeq,
     )
+    evict_from_disk = providers.Singleton(
+        EvictFromDisk,
+        path=settings.MEDIA_ROOT,
+        high_watermark=settings.DISK_EVICTION_HIGH_WATERMARK,
+        low_watermark=settings.DISK_EVICTION_LOW_WATERMARK,
+        batch_size=settings.DISK_EVICTION_BATCH_SIZE,
+        order=settings.DISK_EVICTION_ORDER,
+        repo=file_repo,
+        is_saved_to_s3_filter=file_is_saved_to_s3_filter,
+        is_removed_from_disk_filter=file_is_removed_from_disk_filter,
+        rehydrated_at_filter=file_rehydrated_at_filter,
+        filter_seq_class=FilterSeq,
+    )
+    expire_files = providers.Singleton(
+        ExpireFiles,
+        window=settings.FILE_EXPIRY_WINDOW,
+        batch_size=settings.FILE_EXPIRY_BATCH_SIZE,
+        s3=s3_client.provider,
+        bucket=settings.AWS_BUCKET_NAME,
+        repo=file_repo,
+    )
+    place_files = providers.Singleton(
+        PlaceFiles,
+        half_life=settings.PLACEMENT_HALF_LIFE,
+        demote_below=settings.PLACEMENT_DEMOTE_BELOW,
+        promote_above=settings.PLACEMENT_PROMOTE_ABOVE,
+        min_age=settings.PLACEMENT_MIN_AGE,
+        batch_size=settings.PLACEMENT_BATCH_SIZE,
+        max_promotions=settings.PLACEMENT_MAX_PROMOTIONS,
+        repo=file_repo,
+        disk_cache=disk_cache,
+    )
+    disk_cleanup_scheduler = providers.Singleton(
+        RunScheduled,
+        name="disk_cleanup",
+        every=settings.SCHEDULER_DISK_CLEANUP_EVERY * 60,
+        poll_interval=settings.SCHEDULER_POLL_INTERVAL,
+        lease=settings.SCHEDULER_LEASE,
+        repo=scheduled_job_repo,
+        job=clean_disk,
+    )
+    s3_reconcile_scheduler = providers.Singleton(
+        RunScheduled,
+        name="s3_reconcile",
+        every=settings.S3_RECONCILE_EVERY * 60,
+        poll_interval=settings.SCHEDULER_POLL_INTERVAL,
+        lease=settings.SCHEDULER_LEASE,
+        repo=scheduled_job_repo,
+        job=reconcile_s3,
+    )
+    disk_eviction_scheduler = providers.Singleton(
+        RunScheduled,
+        name="disk_eviction",
+        # usage is checked locally, the lease is taken only under pressure
+        every=0,
+        poll_interval=settings.DISK_EVICTION_CHECK_INTERVAL,
+        lease=settings.SCHEDULER_LEASE,
+        repo=scheduled_job_repo,
+        job=evict_from_disk,
+        is_due=evict_from_disk.provided.is_needed,
+    )
+    file_placement_scheduler = providers.Singleton(
+        RunScheduled,
+        name="file_placement",
+        every=settings.PLACEMENT_EVERY * 60,
+        poll_interval=settings.SCHEDULER_POLL_INTERVAL,
+        lease=settings.SCHEDULER_LEASE,
+        repo=scheduled_job_repo,
+        job=place_files,
+    )
+    file_expiry_scheduler = providers.Singleton(
+        RunScheduled,
+        name="file_expiry",
+        # every run covers a window, the next one starts right after it
+        every=0,
+        poll_interval=settings.FILE_EXPIRY_CHECK_INTERVAL,
+        lease=settings.SCHEDULER_LEASE,
+        repo=scheduled_job_repo,
+        job=expire_files,
+    )
+    disk_reconcile_scheduler = providers.Singleton(
+        RunScheduled,
+        name="disk_reconcile",
+        every=settings.DISK_RECONCILE_EVERY * 60,
+        poll_interval=settings.SCHEDULER_POLL_INTERVAL,
+        lease=settings.SCHEDULER_LEASE,
+        repo=scheduled_job_repo,
+        job=reconcile_disk,
+    )
@@ -30,8 +30,37 @@ UPLOAD_MAX_SIZE_IN_BYTES: int = int(
     )
 )
 
+DIRECT_UPLOAD_MAX_SIZE_IN_BYTES: int = int(
+    os.environ.get(
+        "DIRECT_UPLOAD_MAX_SIZE_IN_BYTES",
+        50 * 1024 * 1024 * 1024,
+    )
+)
+
+# Images
+IMAGE_VARIANTS: str = os.environ.get(
+    "IMAGE_VARIANTS",
+    "thumbnail:256x256:webp,preview:1280x1280:jpeg",
+)
+IMAGE_VARIANTS_ON_UPLOAD: bool = bool(
+    int(os.environ.get("IMAGE_VARIANTS_ON_UPLOAD", 1))
+)
+IMAGE_WORKERS: int = int(os.environ.get("IMAGE_WORKERS", 2))
+
+# Compression
+COMPRESSION_ENABLED: bool = bool(int(os.environ.get("COMPRESSION_ENABLED", 1)))
+COMPRESSION_MIN_SIZE_IN_BYTES: int = int(
+    os.environ.get(
+        "COMPRESSION_MIN_SIZE_IN_BYTES",
+        1024,
+    )
+)
+
 MEDIA_ROOT: str = "/media"
 
+ARCHIVE_MAX_FILES: int = int(os.environ.get("ARCHIVE_MAX_FILES", 1000))
+ARCHIVE_IMPORT_WORKERS: int = int(os.environ.get("ARCHIVE_IMPORT_WORKERS", 4))
+
 # S3
 AWS_ACCESS_KEY_ID: str = os.environ.get("AWS_ACCESS_KEY_ID", "")
 AWS_SECRET_ACCESS_KEY: str = os.environ.get("AWS_SECRET_ACCESS_KEY", "")
@@ -39,8 +68,209 @@ AWS_SESSION_TOKEN: str = os.environ.get("AWS_SESSION_TOKEN", "")
 AWS_ENDPOINT_URL: str = os.environ.get("AWS_ENDPOINT_URL", "")
 AWS_REGION_NAME: str = os.environ.get("AWS_REGION_NAME", "")
 AWS_BUCKET_NAME: str = os.environ.get("AWS_BUCKET_NAME", "")
+AWS_MAX_POOL_CONNECTIONS: int = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", 50))
+AWS_MULTIPART_THRESHOLD: int = int(
+    os.environ.get(
+        "AWS_MULTIPART_THRESHOLD",
+        64 * 1024 * 1024,
+    )
+)  # in bytes
+AWS_MULTIPART_PART_SIZE: int = int(
+    os.environ.get(
+        "AWS_MULTIPART_PART_SIZE",
+        8 * 1024 * 1024,
+    )
+)  # in bytes
+AWS_PRESIGNED_EXPIRATION: int = int(
+    os.environ.get(
+        "AWS_PRESIGNED_EXPIRATION",
+        3600,
+    )
+)  # in seconds
+AWS_PRESIGNED_DOWNLOADS: bool = bool(int(os.environ.get("AWS_PRESIGNED_DOWNLOADS", 0)))
+AWS_PRESIGNED_DOWNLOAD_EXPIRATION: int = int(
+    os.environ.get(
+        "AWS_PRESIGNED_DOWNLOAD_EXPIRATION",
+        300,
+    )
+)  # in seconds
+AWS_MULTIPART_CONCURRENCY: int = int(os.environ.get("AWS_MULTIPART_CONCURRENCY", 8))
+AWS_MAX_STREAMS: int = int(os.environ.get("AWS_MAX_STREAMS", 32))
+AWS_STREAM_WAIT_TIMEOUT: int = int(
+    os.environ.get(
+        "AWS_STREAM_WAIT_TIMEOUT",
+        10,
+    )
+)  # in seconds
+
+# Hedged S3 requests
+S3_HEDGE_ENABLED: bool = bool(int(os.environ.get("S3_HEDGE_ENABLED", 0)))
+S3_HEDGE_PERCENTILE: float = float(os.environ.get("S3_HEDGE_PERCENTILE", 95))
+S3_HEDGE_BUDGET: float = float(os.environ.get("S3_HEDGE_BUDGET", 0.05))
+S3_HEDGE_MAX_PUT_SIZE: int = int(
+    os.environ.get(
+        "S3_HEDGE_MAX_PUT_SIZE",
+        1024 * 1024,
+    )
+)  # in bytes
+
+# Disk cache of files rehydrated from S3
+DISK_CACHE_MAX_BYTES: int = int(
+    os.environ.get(
+        "DISK_CACHE_MAX_BYTES",
+        10 * 1024 * 1024 * 1024,
+    )
+)
+DISK_CACHE_MAX_OBJECT_BYTES: int = int(
+    os.environ.get(
+        "DISK_CACHE_MAX_OBJECT_BYTES",
+        1024 * 1024 * 1024,
+    )
+)
+
+# S3 sync queue
+S3_SYNC_IN_PROCESS: bool = bool(int(os.environ.get("S3_SYNC_IN_PROCESS", 1)))
+S3_SYNC_WORKERS: int = int(os.environ.get("S3_SYNC_WORKERS", 4))
+S3_SYNC_MIN_WORKERS: int = int(os.environ.get("S3_SYNC_MIN_WORKERS", 1))
+S3_SYNC_LATENCY_TARGET: float = float(
+    os.environ.get(
+        "S3_SYNC_LATENCY_TARGET",
+        1.0,
+    )
+)  # in seconds per megabyte
+S3_SYNC_MAX_ATTEMPTS: int = int(os.environ.get("S3_SYNC_MAX_ATTEMPTS", 10))
+S3_SYNC_BACKOFF: int = int(os.environ.get("S3_SYNC_BACKOFF", 5))  # in seconds
+S3_SYNC_MAX_BACKOFF: int = int(
+    os.environ.get(
+        "S3_SYNC_MAX_BACKOFF",
+        3600,
+    )
+)  # in seconds
+S3_SYNC_LEASE: int = int(os.environ.get("S3_SYNC_LEASE", 600))  # in seconds
+S3_SYNC_POLL_INTERVAL: int = int(
+    os.environ.get(
+        "S3_SYNC_POLL_INTERVAL",
+        5,
+    )
+)  # in seconds
+
+S3_BREAKER_FAILURE_THRESHOLD: int = int(
+    os.environ.get(
+        "S3_BREAKER_FAILURE_THRESHOLD",
+        5,
+    )
+)
+S3_BREAKER_RESET_TIMEOUT: int = int(
+    os.environ.get(
+        "S3_BREAKER_RESET_TIMEOUT",
+        30,
+    )
+)  # in seconds
+S3_SYNC_STATS_INTERVAL: int = int(
+    os.environ.get(
+        "S3_SYNC_STATS_INTERVAL",
+        60,
+    )
+)  # in seconds
+
+# S3 reconciliation
+S3_RECONCILE_EVERY: int = int(
+    os.environ.get(
+        "S3_RECONCILE_EVERY",
+        1440,
+    )
+)  # in minutes
+S3_RECONCILE_PAGE_SIZE: int = int(os.environ.get("S3_RECONCILE_PAGE_SIZE", 1000))
+S3_RECONCILE_ORPHAN_AGE: int = int(
+    os.environ.get(
+        "S3_RECONCILE_ORPHAN_AGE",
+        24 * 60 * 60,
+    )
+)  # in seconds
+
+# Access tracking
+ACCESS_FLUSH_INTERVAL: int = int(
+    os.environ.get("ACCESS_FLUSH_INTERVAL", 5)
+)  # in seconds
+ACCESS_MAX_PENDING: int = int(os.environ.get("ACCESS_MAX_PENDING", 10000))
+
+# Expiry of files uploaded with ttl
+FILE_EXPIRY_WINDOW: int = int(os.environ.get("FILE_EXPIRY_WINDOW", 60))  # in seconds
+FILE_EXPIRY_CHECK_INTERVAL: int = int(
+    os.environ.get("FILE_EXPIRY_CHECK_INTERVAL", 5)
+)  # in seconds
+FILE_EXPIRY_BATCH_SIZE: int = int(os.environ.get("FILE_EXPIRY_BATCH_SIZE", 1000))
+
+# Tiered placement by access frequency
+PLACEMENT_HALF_LIFE: int = int(
+    os.environ.get("PLACEMENT_HALF_LIFE", 24 * 60 * 60)
+)  # in seconds
+PLACEMENT_EVERY: int = int(os.environ.get("PLACEMENT_EVERY", 10))  # in minutes
+PLACEMENT_DEMOTE_BELOW: float = float(
+    os.environ.get("PLACEMENT_DEMOTE_BELOW", 0.01)
+)  # decayed downloads
+PLACEMENT_PROMOTE_ABOVE: float = float(
+    os.environ.get("PLACEMENT_PROMOTE_ABOVE", 5)
+)  # decayed downloads
+PLACEMENT_MIN_AGE: int = int(
+    os.environ.get("PLACEMENT_MIN_AGE", 24 * 60 * 60)
+)  # in seconds
+PLACEMENT_BATCH_SIZE: int = int(os.environ.get("PLACEMENT_BATCH_SIZE", 1000))
+PLACEMENT_MAX_PROMOTIONS: int = int(os.environ.get("PLACEMENT_MAX_PROMOTIONS", 100))
+
+# Eviction from disk under pressure
+DISK_EVICTION_HIGH_WATERMARK: float = float(
+    os.environ.get(
+        "DISK_EVICTION_HIGH_WATERMARK",
+        0.9,
+    )
+)  # share of used disk space
+DISK_EVICTION_LOW_WATERMARK: float = float(
+    os.environ.get(
+        "DISK_EVICTION_LOW_WATERMARK",
+        0.8,
+    )
+)  # share of used disk space
+DISK_EVICTION_CHECK_INTERVAL: int = int(
+    os.environ.get(
+        "DISK_EVICTION_CHECK_INTERVAL",
+        5,
+    )
+)  # in seconds
+DISK_EVICTION_BATCH_SIZE: int = int(os.environ.get("DISK_EVICTION_BATCH_SIZE", 100))
+DISK_EVICTION_ORDER: str = os.environ.get("DISK_EVICTION_ORDER", "lru")
+
+# Disk reconciliation
+DISK_RECONCILE_EVERY: int = int(
+    os.environ.get(
+        "DISK_RECONCILE_EVERY",
+        60,
+    )
+)  # in minutes
+DISK_RECONCILE_MAX_ENTRIES: int = int(
+    os.environ.get("DISK_RECONCILE_MAX_ENTRIES", 100000)
+)
+DISK_RECONCILE_PAGE_SIZE: int = int(os.environ.get("DISK_RECONCILE_PAGE_SIZE", 1000))
+DISK_RECONCILE_ORPHAN_AGE: int = int(
+    os.environ.get(
+        "DISK_RECONCILE_ORPHAN_AGE",
+        24 * 60 * 60,
+    )
+)  # in seconds
+# empty to delete orphans instead of moving them aside
+DISK_RECONCILE_QUARANTINE: str = os.environ.get(
+    "DISK_RECONCILE_QUARANTINE", os.path.join(MEDIA_ROOT, ".orphans")
+)
 
 # Scheduler
+SCHEDULER_IN_PROCESS: bool = bool(int(os.environ.get("SCHEDULER_IN_PROCESS", 1)))
+SCHEDULER_POLL_INTERVAL: int = int(
+    os.environ.get(
+        "SCHEDULER_POLL_INTERVAL",
+        60,
+    )
+)  # in seconds
+SCHEDULER_LEASE: int = int(os.environ.get("SCHEDULER_LEASE", 300))  # in seconds
 SCHEDULER_DISK_CLEANUP_EVERY: int = int(
     os.environ.get(
         "SCHEDULER_DISK_CLEANUP_EVERY",
@@ -59,3 +289,15 @@ SCHEDULER_REMOVE_FILES_UNUSED_MORE_THAN: int = int(
         30,
     )
 )  # in days
+SCHEDULER_DISK_CLEANUP_BATCH_SIZE: int = int(
+    os.environ.get(
+        "SCHEDULER_DISK_CLEANUP_BATCH_SIZE",
+        1000,
+    )
+)
+SCHEDULER_DISK_CLEANUP_WORKERS: int = int(
+    os.environ.get(
+        "SCHEDULER_DISK_CLEANUP_WORKERS",
+        4,
+    )
+)
@@ -1,17 +1,37 @@
 import io
-from typing import Annotated
+from typing import Annotated, Dict
 from uuid import UUID
 
 from dependency_injector.wiring import Provide, inject
-from fastapi import BackgroundTasks, Depends, Header, Request, UploadFile
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import BackgroundTasks, Depends, Form, Header, Request, UploadFile
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from fastapi_versioning import version
 
 from config.di import Container
 from models.file import File
-from schemas.files import UploadedFile
-from services.interfaces import ICreateFile, ISaveFileToExternalStorage
-from utils.exceptions import Custom400Exception
+from schemas.files import (
+    ArchiveManifest,
+    ArchiveQuery,
+    CompleteDirectUploadRequest,
+    DirectUpload,
+    DirectUploadRequest,
+    UploadedFile,
+)
+from services.interfaces import (
+    ICompleteDirectUpload,
+    ICreateDerivative,
+    ICreateFile,
+    IDiskCache,
+    IExtractAttributes,
+    IImportArchive,
+    IPresignDownload,
+    IStartDirectUpload,
+    IStreamArchive,
+    IStreamFileFromExternalStorage,
+    ISyncFiles,
+    ITrackAccess,
+)
+from utils.compression import accepts_encoding, decompress_stream
 from utils.file import chunk_file
 from utils.http import safe_filename
 from utils.repo import IRepo
@@ -26,13 +46,24 @@ router = APIRouter(prefix="/uploads", tags=["uploads"])
 async def upload_file(
     file: UploadFile,
     background_tasks: BackgroundTasks,
+    durable: bool = False,
+    ttl: Annotated[int | None, Form(gt=0)] = None,
     create_file: ICreateFile = Depends(Provide[Container.create_file]),
-    save_to_s3: ISaveFileToExternalStorage = Depends(
-        Provide[Container.save_file_to_s3]
+    sync_to_s3: ISyncFiles = Depends(Provide[Container.sync_files_to_s3]),
+    create_derivative: ICreateDerivative = Depends(
+        Provide[Container.create_derivative]
+    ),
+    extract_attributes: IExtractAttributes = Depends(
+        Provide[Container.extract_attributes]
     ),
 ) -> UploadedFile:
-    instance = await create_file(file)
-    background_tasks.add_task(save_to_s3, instance.uuid)
+    instance = await create_file(file, durable=durable, ttl=ttl)
+    if not durable:
+        # file is synced by the queue workers, wake them up
+        sync_to_s3.notify()
+    background_tasks.add_task(extract_attributes.extract, instance.uuid)
+    if instance.format.startswith("image/"):
+        background_tasks.add_task(create_derivative.create_all, instance.uuid)
     return instance
 
 
@@ -44,9 +75,15 @@ async def stream_upload_file(
     filename: Annotated[str, Header()],
     content_type: Annotated[str, Header(regex=r"application/octet-stream")],
     background_tasks: BackgroundTasks,
+    durable: bool = False,
+    ttl: Annotated[int | None, Header(gt=0)] = None,
     create_file: ICreateFile = Depends(Provide[Container.create_file]),
-    save_to_s3: ISaveFileToExternalStorage = Depends(
-        Provide[Container.save_file_to_s3]
+    sync_to_s3: ISyncFiles = Depends(Provide[Container.sync_files_to_s3]),
+    create_derivative: ICreateDerivative = Depends(
+        Provide[Container.create_derivative]
+    ),
+    extract_attributes: IExtractAttributes = Depends(
+        Provide[Container.extract_attributes]
     ),
 ) -> UploadedFile:
     buffer = io.BytesIO()
@@ -60,20 +97,86 @@ async def stream_upload_file(
             size=buffer.getbuffer().nbytes,
             filename=filename,
             headers=request.headers,
-        )
+        ),
+        durable=durable,
+        ttl=ttl,
     )
-    background_tasks.add_task(save_to_s3, instance.uuid)
+    if not durable:
+        # file is synced by the queue workers, wake them up
+        sync_to_s3.notify()
+    background_tasks.add_task(extract_attributes.extract, instance.uuid)
+    if instance.format.startswith("image/"):
+        background_tasks.add_task(create_derivative.create_all, instance.uuid)
     return instance
 
 
+@router.post("/file/direct/", response_model=DirectUpload)
+@version(0)
+@inject
+async def start_direct_upload(
+    request: DirectUploadRequest,
+    start_direct_upload: IStartDirectUpload = Depends(
+        Provide[Container.start_direct_upload]
+    ),
+) -> DirectUpload:
+    # file content goes straight to s3 with presigned urls,
+    # it never passes through the service
+    return await start_direct_upload(request)
+
+
+@router.post("/file/direct/complete/", response_model=UploadedFile)
+@version(0)
+@inject
+async def complete_direct_upload(
+    upload: CompleteDirectUploadRequest,
+    complete_direct_upload: ICompleteDirectUpload = Depends(
+        Provide[Container.complete_direct_upload]
+    ),
+) -> UploadedFile:
+    return await complete_direct_upload(upload)
+
+
+@router.post("/files/archive/stream/", response_model=ArchiveManifest)
+@version(0)
+@inject
+async def stream_upload_archive(
+    request: Request,
+    content_type: Annotated[
+        str,
+        Header(
+            regex=r"application/(zip|x-zip-compressed|x-tar|gzip|x-gzip|x-gtar)",
+        ),
+    ],
+    background_tasks: BackgroundTasks,
+    import_archive: IImportArchive = Depends(Provide[Container.import_archive]),
+    sync_to_s3: ISyncFiles = Depends(Provide[Container.sync_files_to_s3]),
+    extract_attributes: IExtractAttributes = Depends(
+        Provide[Container.extract_attributes]
+    ),
+) -> ArchiveManifest:
+    files = await import_archive(request.stream(), content_type)
+    sync_to_s3.notify()
+    for file in files:
+        background_tasks.add_task(extract_attributes.extract, file.uuid)
+    return ArchiveManifest(files=files)
+
+
 @router.get("/file/{uuid}/", response_model=UploadedFile)
 @version(0)
 @inject
 async def get_file(
     uuid: UUID,
     repo: IRepo[File] = Depends(Provide[Container.file_repo]),
+    extract_attributes: IExtractAttributes = Depends(
+        Provide[Container.extract_attributes]
+    ),
+    track_access: ITrackAccess = Depends(Provide[Container.track_access]),
 ):
     file = await repo.get_by_id(uuid)
+    track_access.read(file.uuid)
+    # attributes are extracted in background after upload,
+    # the first read extracts them if that did not happen yet
+    attributes = await extract_attributes(file)
     return UploadedFile(
         uuid=file.uuid,
         path=file.path,
@@ -83,6 +186,8 @@ async def get_file(
         ext=file.ext,
         created_at=file.created_at,
         available_for_download=file.is_removed_from_disk is False,
+        attributes=attributes,
+        expires_at=file.expires_at,
     )
 
 
@@ -99,24 +204,62 @@ async def get_file(
                     "example": 'attachment; filename="image.png"',
                 }
             },
-        }
+        },
+        302: {
+            "description": "Presigned S3 url of a file removed from disk",
+            "headers": {
+                "Location": {
+                    "description": "Presigned url",
+                    "type": "string",
+                }
+            },
+        },
     },
 )
 @version(0)
 @inject
 async def download_file(
     uuid: UUID,
+    variant: str | None = None,
+    accept_encoding: Annotated[str | None, Header()] = None,
+    range: Annotated[str | None, Header()] = None,
     repo: IRepo[File] = Depends(Provide[Container.file_repo]),
+    create_derivative: ICreateDerivative = Depends(
+        Provide[Container.create_derivative]
+    ),
+    stream_from_s3: IStreamFileFromExternalStorage = Depends(
+        Provide[Container.stream_file_from_s3]
+    ),
+    disk_cache: IDiskCache = Depends(Provide[Container.disk_cache]),
+    presign_download: IPresignDownload = Depends(Provide[Container.presign_download]),
+    track_access: ITrackAccess = Depends(Provide[Container.track_access]),
 ):
-    file = await repo.get_by_id(uuid)
+    if variant is None:
+        file = await repo.get_by_id(uuid)
+    else:
+        file = await create_derivative(uuid, variant)
+    track_access.download(file.uuid)
+    # cold file is served from s3 this time, the next reads hit disk
+    disk_cache.warm(file)
+    if file.is_removed_from_disk and (
+        # s3 serves stored bytes, so decompression stays here
+        not file.encoding
+        or accepts_encoding(accept_encoding, file.encoding)
+    ):
+        if url := await presign_download(file):
+            return RedirectResponse(url, status_code=302)
     if file.is_removed_from_disk:
-        # S3 could be integrated in that case.
-        raise Custom400Exception("File is not available for download.")
+        return await _stream_from_s3(file, accept_encoding, range, stream_from_s3)
+    headers = _download_headers(file, accept_encoding)
+    if file.encoding and not accepts_encoding(accept_encoding, file.encoding):
+        return StreamingResponse(
+            decompress_stream(chunk_file(file.path)),
+            headers=headers,
+            media_type="application/octet-stream",
+        )
     return FileResponse(
         file.path,
-        headers={
-            "Content-Disposition": f'attachment; filename="{safe_filename(file.name)}"'
-        },
+        headers=headers,
         media_type="application/octet-stream",
         filename=file.name,
     )
@@ -142,16 +285,100 @@ async def download_file(
 @inject
 async def stream_file(
     uuid: UUID,
+    variant: str | None = None,
+    accept_encoding: Annotated[str | None, Header()] = None,
+    range: Annotated[str | None, Header()] = None,
     repo: IRepo[File] = Depends(Provide[Container.file_repo]),
+    create_derivative: ICreateDerivative = Depends(
+        Provide[Container.create_derivative]
+    ),
+    stream_from_s3: IStreamFileFromExternalStorage = Depends(
+        Provide[Container.stream_file_from_s3]
+    ),
+    disk_cache: IDiskCache = Depends(Provide[Container.disk_cache]),
+    track_access: ITrackAccess = Depends(Provide[Container.track_access]),
 ):
-    file = await repo.get_by_id(uuid)
+    if variant is None:
+        file = await repo.get_by_id(uuid)
+    else:
+        file = await create_derivative(uuid, variant)
+    track_access.download(file.uuid)
+    disk_cache.warm(file)
     if file.is_removed_from_disk:
-        # S3 could be integrated in that case.
-        raise Custom400Exception("File is not available for download.")
+        return await _stream_from_s3(file, accept_encoding, range, stream_from_s3)
+    chunks = chunk_file(file.path)
+    if file.encoding and not accepts_encoding(accept_encoding, file.encoding):
+        chunks = decompress_stream(chunks)
     return StreamingResponse(
-        chunk_file(file.path),
-        headers={
-            "Content-Disposition": f'attachment; filename="{safe_filename(file.name)}"'
-        },
+        chunks,
+        headers=_download_headers(file, accept_encoding),
         media_type="application/octet-stream",
     )
+
+
+@router.post(
+    "/files/archive/",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/zip": {}},
+            "headers": {
+                "Content-Disposition": {
+                    "description": "Content disposition header",
+                    "type": "string",
+                    "example": 'attachment; filename="files.zip"',
+                }
+            },
+        }
+    },
+)
+@version(0)
+@inject
+async def download_archive(
+    query: ArchiveQuery,
+    stream_archive: IStreamArchive = Depends(Provide[Container.stream_archive]),
+):
+    return StreamingResponse(
+        await stream_archive(query),
+        headers={"Content-Disposition": 'attachment; filename="files.zip"'},
+        media_type="application/zip",
+    )
+
+
+async def _stream_from_s3(
+    file: File,
+    accept_encoding: str | None,
+    range: str | None,
+    stream_from_s3: IStreamFileFromExternalStorage,
+) -> StreamingResponse:
+    headers = _download_headers(file, accept_encoding)
+    if file.encoding and not accepts_encoding(accept_encoding, file.encoding):
+        # ranges are over compressed bytes, so the whole file is decompressed
+        s3_object = await stream_from_s3(file)
+        return StreamingResponse(
+            decompress_stream(s3_object.chunks),
+            headers=headers,
+            media_type="application/octet-stream",
+        )
+    s3_object = await stream_from_s3(file, range)
+    return StreamingResponse(
+        s3_object.chunks,
+        status_code=s3_object.status_code,
+        headers={**headers, **s3_object.headers},
+        media_type="application/octet-stream",
+    )
+
+
+def _download_headers(
+    file: File,
+    accept_encoding: str | None = None,
+) -> Dict[str, str]:
+    headers = {
+        "Content-Disposition": f'attachment; filename="{safe_filename(file.name)}"'
+    }
+    if file.encoding:
+        # response differs depending on what client accepts
+        headers["Vary"] = "Accept-Encoding"
+        if accepts_encoding(accept_encoding, file.encoding):
+            headers["Content-Encoding"] = file.encoding
+    return headers
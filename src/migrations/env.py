@@ -4,7 +4,10 @@ from alembic import context
 from sqlalchemy import engine_from_config, pool
 
 from config import settings
+from models.access import file_access_table
 from models.file import file_table
+from models.schedule import scheduled_job_table
+from models.sync import s3_sync_job_table
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -26,7 +29,7 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-tables = [file_table]
+tables = [file_table, s3_sync_job_table, scheduled_job_table, file_access_table]
 target_metadata = list(table.metadata for table in tables)
 
 
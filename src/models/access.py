@@ -0,0 +1,37 @@
+from datetime import datetime
+from uuid import UUID as UUIDType
+
+from sqlalchemy import UUID, BigInteger, Column, DateTime, Float, ForeignKey, Table
+
+from models.file import mapper_registry
+
+# kept apart from files, so reads do not rewrite wide file rows
+file_access_table = Table(
+    "file_accesses",
+    mapper_registry.metadata,
+    Column(
+        "file_uuid",
+        UUID,
+        ForeignKey("files.uuid", ondelete="CASCADE"),
+        primary_key=True,
+        nullable=False,
+    ),
+    # least recently used files are evicted from disk first
+    Column("accessed_at", DateTime(timezone=True), nullable=False, index=True),
+    Column("reads", BigInteger, default=0, server_default="0", nullable=False),
+    Column("downloads", BigInteger, default=0, server_default="0", nullable=False),
+    # decayed download count in forward decay form, see utils/heat.py.
+    # NULL until the first download
+    Column("heat", Float, nullable=True, index=True),
+)
+
+
+class FileAccess:
+    file_uuid: UUIDType
+    accessed_at: datetime
+    reads: int
+    downloads: int
+    heat: float | None
+
+
+file_access_mapper = mapper_registry.map_imperatively(FileAccess, file_access_table)
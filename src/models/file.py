@@ -1,7 +1,22 @@
 from datetime import datetime
+from typing import Any, Dict
 from uuid import UUID as UUIDType
 
-from sqlalchemy import UUID, BigInteger, Boolean, Column, DateTime, String, Table, func
+from sqlalchemy import (
+    UUID,
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    String,
+    Table,
+    UniqueConstraint,
+    and_,
+    func,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import registry
 
 mapper_registry = registry()
@@ -24,6 +39,19 @@ file_table = Table(
     Column("ext", String(16), nullable=True),
     Column("is_saved_to_s3", Boolean, default=False, nullable=False),
     Column("is_removed_from_disk", Boolean, default=False, nullable=False),
+    Column("encoding", String(16), nullable=True),
+    Column(
+        "parent_uuid",
+        UUID,
+        ForeignKey("files.uuid", ondelete="CASCADE"),
+        nullable=True,
+        index=True,
+    ),
+    Column("variant", String(32), nullable=True),
+    Column("attributes", JSONB, nullable=True),
+    Column("rehydrated_at", DateTime(timezone=True), nullable=True),
+    # NULL for files kept until cleanup
+    Column("expires_at", DateTime(timezone=True), nullable=True),
     Column(
         "created_at",
         DateTime(timezone=True),
@@ -37,6 +65,69 @@ file_table = Table(
         onupdate=func.now(),
         nullable=False,
     ),
+    UniqueConstraint("parent_uuid", "variant"),
+)
+# s3 lists keys in byte order, files are paged in the same order
+# to be reconciled with the bucket. One row per stored object,
+# so a direct upload can not be registered twice
+Index("ix_files_path", file_table.c.path.collate("C"), unique=True)
+# partial indexes cover only rows background jobs look for,
+# so they stay small however large the table grows.
+# Disk cleanup pages files on disk by uuid, columns it filters on
+# are included, so batches are read from the index alone
+Index(
+    "ix_files_on_disk",
+    file_table.c.uuid,
+    postgresql_include=["path", "created_at", "updated_at"],
+    postgresql_where=and_(
+        file_table.c.is_removed_from_disk.is_(False),
+        file_table.c.rehydrated_at.is_(None),
+    ),
+)
+# files the disk cache counts against its budget and evicts
+Index(
+    "ix_files_rehydrated_at",
+    file_table.c.rehydrated_at,
+    postgresql_where=and_(
+        file_table.c.is_removed_from_disk.is_(False),
+        file_table.c.rehydrated_at.is_not(None),
+    ),
+)
+# files eviction from disk under pressure picks from,
+# in least recently used and largest first orders
+Index(
+    "ix_files_evictable_updated_at",
+    file_table.c.updated_at,
+    postgresql_where=and_(
+        file_table.c.is_saved_to_s3.is_(True),
+        file_table.c.is_removed_from_disk.is_(False),
+        file_table.c.rehydrated_at.is_(None),
+    ),
+)
+Index(
+    "ix_files_evictable_size",
+    file_table.c.size,
+    postgresql_where=and_(
+        file_table.c.is_saved_to_s3.is_(True),
+        file_table.c.is_removed_from_disk.is_(False),
+        file_table.c.rehydrated_at.is_(None),
+    ),
+)
+# files with ttl, in order they expire in
+Index(
+    "ix_files_expires_at",
+    file_table.c.expires_at,
+    postgresql_where=file_table.c.expires_at.is_not(None),
+)
+# s3 sync backlog
+Index(
+    "ix_files_unsynced",
+    file_table.c.uuid,
+    postgresql_where=and_(
+        file_table.c.is_saved_to_s3.is_(False),
+        file_table.c.is_removed_from_disk.is_(False),
+        file_table.c.parent_uuid.is_(None),
+    ),
 )
 
 
@@ -49,6 +140,12 @@ class File:
     ext: str
     is_saved_to_s3: bool
     is_removed_from_disk: bool
+    encoding: str | None
+    parent_uuid: UUIDType | None
+    variant: str | None
+    attributes: Dict[str, Any] | None
+    rehydrated_at: datetime | None
+    expires_at: datetime | None
     created_at: datetime
     updated_at: datetime
 
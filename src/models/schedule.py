@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy import Column, DateTime, Float, String, Table
+from sqlalchemy.dialects.postgresql import JSONB
+
+from models.file import mapper_registry
+
+scheduled_job_table = Table(
+    "scheduled_jobs",
+    mapper_registry.metadata,
+    Column("name", String(64), primary_key=True, nullable=False),
+    # process running the job, NULL when nobody does
+    Column("owner", String(128), nullable=True),
+    Column("leased_until", DateTime(timezone=True), nullable=True),
+    Column("started_at", DateTime(timezone=True), nullable=True),
+    Column("finished_at", DateTime(timezone=True), nullable=True),
+    Column("duration", Float, nullable=True),  # in seconds
+    Column("result", JSONB, nullable=True),
+)
+
+
+class ScheduledJob:
+    name: str
+    owner: str | None
+    leased_until: datetime | None
+    started_at: datetime | None
+    finished_at: datetime | None
+    duration: float | None
+    result: Dict[str, Any] | None
+
+
+scheduled_job_mapper = mapper_registry.map_imperatively(
+    ScheduledJob, scheduled_job_table
+)
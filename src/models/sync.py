@@ -0,0 +1,43 @@
+from datetime import datetime
+from uuid import UUID as UUIDType
+
+from sqlalchemy import UUID, Column, DateTime, ForeignKey, Integer, Table, func
+
+from models.file import mapper_registry
+
+s3_sync_job_table = Table(
+    "s3_sync_jobs",
+    mapper_registry.metadata,
+    Column(
+        "file_uuid",
+        UUID,
+        ForeignKey("files.uuid", ondelete="CASCADE"),
+        primary_key=True,
+        nullable=False,
+    ),
+    Column("attempts", Integer, default=0, server_default="0", nullable=False),
+    # NULL means attempts are exhausted, job waits for the next startup sweep
+    Column(
+        "next_attempt_at",
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=True,
+        index=True,
+    ),
+    Column(
+        "created_at",
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    ),
+)
+
+
+class S3SyncJob:
+    file_uuid: UUIDType
+    attempts: int
+    next_attempt_at: datetime | None
+    created_at: datetime
+
+
+s3_sync_job_mapper = mapper_registry.map_imperatively(S3SyncJob, s3_sync_job_table)
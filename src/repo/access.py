@@ -0,0 +1,163 @@
+import math
+from abc import abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Sequence, Set
+from uuid import UUID
+
+from sqlalchemy import UUID as UUIDColumn
+from sqlalchemy import (
+    BigInteger,
+    Case,
+    ColumnElement,
+    DateTime,
+    Float,
+    case,
+    cast,
+    column,
+    func,
+    select,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.access import FileAccess
+from models.file import File
+from utils.decorators import handle_orm_error
+from utils.decorators import session as inject_session
+from utils.repo import IRepo, Repo
+
+
+class IFileAccessRepo(IRepo[FileAccess]):
+    @abstractmethod
+    async def record(
+        self,
+        accesses: Sequence[Dict[str, Any]],
+        *,
+        session: AsyncSession = None,
+    ) -> int:
+        """
+        Add aggregated accesses to the stored ones in a single statement.
+        Counts and heats are summed up, the latest access time wins,
+        accesses of files removed meanwhile are dropped
+
+        :param accesses: dicts with file_uuid, accessed_at, reads, downloads
+            and heat of the downloads or None, one per file
+        :type accesses: Sequence[Dict[str, Any]]
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: number of recorded files
+        :rtype: int
+        """
+        ...
+
+    @abstractmethod
+    async def get_accessed_since(
+        self,
+        uuids: Sequence[str | UUID],
+        since: datetime,
+        *,
+        session: AsyncSession = None,
+    ) -> Set[UUID]:
+        """
+        Get files accessed after the given time
+
+        :param uuids: uuids of files to check
+        :type uuids: Sequence[str | UUID]
+        :param since: time to check against
+        :type since: datetime
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: uuids of accessed files
+        :rtype: Set[UUID]
+        """
+        ...
+
+
+class FileAccessRepo(Repo[FileAccess], IFileAccessRepo):
+    @handle_orm_error
+    @inject_session
+    async def record(
+        self,
+        accesses: Sequence[Dict[str, Any]],
+        *,
+        session: AsyncSession = None,
+    ) -> int:
+        if not accesses:
+            return 0
+        hits = values(
+            column("file_uuid", UUIDColumn),
+            column("accessed_at", DateTime(timezone=True)),
+            column("reads", BigInteger),
+            column("downloads", BigInteger),
+            column("heat", Float),
+            name="hits",
+        ).data(
+            [
+                (
+                    access["file_uuid"],
+                    access["accessed_at"],
+                    access["reads"],
+                    access["downloads"],
+                    access["heat"],
+                )
+                # same order in every process, so concurrent flushes
+                # do not deadlock on row locks
+                for access in sorted(accesses, key=lambda a: str(a["file_uuid"]))
+            ]
+        )
+        stmt = insert(FileAccess).from_select(
+            ["file_uuid", "accessed_at", "reads", "downloads", "heat"],
+            # join drops files removed after they were accessed
+            select(
+                hits.c.file_uuid,
+                hits.c.accessed_at,
+                hits.c.reads,
+                hits.c.downloads,
+                # batch of reads only would be typed as text otherwise
+                cast(hits.c.heat, Float),
+            ).join(File, File.uuid == hits.c.file_uuid),
+        )
+        result = await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[FileAccess.file_uuid],
+                set_={
+                    "accessed_at": func.greatest(
+                        FileAccess.accessed_at, stmt.excluded.accessed_at
+                    ),
+                    "reads": FileAccess.reads + stmt.excluded.reads,
+                    "downloads": FileAccess.downloads + stmt.excluded.downloads,
+                    "heat": _add_heat(FileAccess.heat, stmt.excluded.heat),
+                },
+            )
+        )
+        return result.rowcount
+
+    @handle_orm_error
+    @inject_session
+    async def get_accessed_since(
+        self,
+        uuids: Sequence[str | UUID],
+        since: datetime,
+        *,
+        session: AsyncSession = None,
+    ) -> Set[UUID]:
+        if not uuids:
+            return set()
+        result = await session.scalars(
+            select(FileAccess.file_uuid).filter(
+                FileAccess.file_uuid.in_(uuids),
+                FileAccess.accessed_at > since,
+            )
+        )
+        return set(result)
+
+
+def _add_heat(a: ColumnElement[float], b: ColumnElement[float]) -> Case:
+    # sum of counts in log space, see utils/heat.py
+    return case(
+        (a.is_(None), b),
+        (b.is_(None), a),
+        else_=func.greatest(a, b)
+        + func.ln(1 + func.power(2.0, -func.abs(a - b))) / math.log(2),
+    )
@@ -0,0 +1,352 @@
+from abc import abstractmethod
+from datetime import datetime
+from typing import List, Sequence
+from uuid import UUID
+
+from sqlalchemy import Row, and_, delete, exists, func, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.access import FileAccess
+from models.file import File
+from utils.decorators import handle_orm_error
+from utils.decorators import session as inject_session
+from utils.repo import IRepo, Repo
+
+
+class IFileRepo(IRepo[File]):
+    @abstractmethod
+    async def get_page_by_path(
+        self,
+        after: str | None,
+        limit: int,
+        *,
+        session: AsyncSession = None,
+    ) -> List[Row]:
+        """
+        Get page of files sorted by path in byte order, the same order
+        s3 lists keys in. Pages are keyset paginated, so each page is
+        an index range scan no matter how deep it is
+
+        :param after: path of the last file of the previous page,
+            None for the first page
+        :type after: str | None
+        :param limit: max number of files
+        :type limit: int
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: rows of uuid, path, is_saved_to_s3,
+            is_removed_from_disk and updated_at
+        :rtype: List[Row]
+        """
+        ...
+
+    @abstractmethod
+    async def get_cold_page(
+        self,
+        heat_below: float,
+        created_before: datetime,
+        after: UUID | None,
+        limit: int,
+        *,
+        session: AsyncSession = None,
+    ) -> List[Row]:
+        """
+        Get page of original files on disk that are saved to s3
+        and are colder than given heat, never downloaded files included.
+        Pages are keyset paginated by uuid
+
+        :param heat_below: heat threshold, see utils/heat.py
+        :type heat_below: float
+        :param created_before: newer files are not returned,
+            they had no time to be downloaded
+        :type created_before: datetime
+        :param after: uuid of the last file of the previous page,
+            None for the first page
+        :type after: UUID | None
+        :param limit: max number of files
+        :type limit: int
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: rows of uuid and path
+        :rtype: List[Row]
+        """
+        ...
+
+    @abstractmethod
+    async def get_hot(
+        self,
+        heat_above: float,
+        limit: int,
+        *,
+        session: AsyncSession = None,
+    ) -> List[File]:
+        """
+        Get files removed from disk that are saved to s3
+        and are hotter than given heat, hottest first
+
+        :param heat_above: heat threshold, see utils/heat.py
+        :type heat_above: float
+        :param limit: max number of files
+        :type limit: int
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: files
+        :rtype: List[File]
+        """
+        ...
+
+    @abstractmethod
+    async def get_rehydrated_size(self, *, session: AsyncSession = None) -> int:
+        """
+        Get total size of files brought back from s3 that are on disk
+
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: size in bytes
+        :rtype: int
+        """
+        ...
+
+    @abstractmethod
+    async def get_least_recently_used(
+        self,
+        limit: int,
+        *,
+        session: AsyncSession = None,
+    ) -> List[Row]:
+        """
+        Get original files on disk that are saved to s3, in order
+        they were last used in: by the last access, by the last update
+        for files never accessed
+
+        :param limit: max number of files
+        :type limit: int
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: rows of uuid, path and size
+        :rtype: List[Row]
+        """
+        ...
+
+    @abstractmethod
+    async def get_expiring(
+        self,
+        until: datetime,
+        limit: int,
+        *,
+        session: AsyncSession = None,
+    ) -> List[Row]:
+        """
+        Get files expiring until the given time, overdue ones included,
+        in order they expire in
+
+        :param until: time files expire until
+        :type until: datetime
+        :param limit: max number of files
+        :type limit: int
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: rows of uuid and expires_at
+        :rtype: List[Row]
+        """
+        ...
+
+    @abstractmethod
+    async def delete_expired(
+        self,
+        uuids: Sequence[str | UUID],
+        now: datetime,
+        *,
+        session: AsyncSession = None,
+    ) -> List[Row]:
+        """
+        Delete files that are expired by now together with their variants.
+        Expiry is checked again, so files whose ttl was extended are kept
+
+        :param uuids: uuids of files to delete
+        :type uuids: Sequence[str | UUID]
+        :param now: current time
+        :type now: datetime
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: rows of path, is_saved_to_s3 and is_removed_from_disk
+            of deleted files and variants
+        :rtype: List[Row]
+        """
+        ...
+
+
+class FileRepo(Repo[File], IFileRepo):
+    @handle_orm_error
+    @inject_session
+    async def get_page_by_path(
+        self,
+        after: str | None,
+        limit: int,
+        *,
+        session: AsyncSession = None,
+    ) -> List[Row]:
+        path = File.path.collate("C")
+        query = (
+            select(
+                File.uuid,
+                File.path,
+                File.is_saved_to_s3,
+                File.is_removed_from_disk,
+                File.updated_at,
+            )
+            .order_by(path)
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.filter(path > after)
+        return list(await session.execute(query))
+
+    @handle_orm_error
+    @inject_session
+    async def get_cold_page(
+        self,
+        heat_below: float,
+        created_before: datetime,
+        after: UUID | None,
+        limit: int,
+        *,
+        session: AsyncSession = None,
+    ) -> List[Row]:
+        query = (
+            select(File.uuid, File.path)
+            .outerjoin(FileAccess, FileAccess.file_uuid == File.uuid)
+            .filter(
+                File.is_saved_to_s3.is_(True),
+                File.is_removed_from_disk.is_(False),
+                # files brought back from s3 are evicted by the disk cache
+                File.rehydrated_at.is_(None),
+                File.created_at <= created_before,
+                or_(FileAccess.heat.is_(None), FileAccess.heat < heat_below),
+            )
+            .order_by(File.uuid)
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.filter(File.uuid > after)
+        return list(await session.execute(query))
+
+    @handle_orm_error
+    @inject_session
+    async def get_hot(
+        self,
+        heat_above: float,
+        limit: int,
+        *,
+        session: AsyncSession = None,
+    ) -> List[File]:
+        result = await session.scalars(
+            select(File)
+            .join(FileAccess, FileAccess.file_uuid == File.uuid)
+            .filter(
+                FileAccess.heat > heat_above,
+                File.is_removed_from_disk.is_(True),
+                File.is_saved_to_s3.is_(True),
+            )
+            .order_by(FileAccess.heat.desc())
+            .limit(limit)
+        )
+        return list(result)
+
+    @handle_orm_error
+    @inject_session
+    async def get_rehydrated_size(self, *, session: AsyncSession = None) -> int:
+        return await session.scalar(
+            select(func.coalesce(func.sum(File.size), 0)).filter(
+                File.is_removed_from_disk.is_(False),
+                File.rehydrated_at.is_not(None),
+            )
+        )
+
+    @handle_orm_error
+    @inject_session
+    async def get_least_recently_used(
+        self,
+        limit: int,
+        *,
+        session: AsyncSession = None,
+    ) -> List[Row]:
+        evictable = (
+            File.is_saved_to_s3.is_(True),
+            File.is_removed_from_disk.is_(False),
+            # files brought back from s3 are evicted by the disk cache
+            File.rehydrated_at.is_(None),
+        )
+        # ordering by coalesce(accessed_at, updated_at) of a join can not
+        # be read from an index, so each kind of files is read in order
+        # of its own index and only two pages are sorted
+        never_accessed = (
+            select(File.uuid, File.path, File.size, File.updated_at.label("used_at"))
+            .filter(
+                *evictable,
+                ~exists().where(FileAccess.file_uuid == File.uuid),
+            )
+            .order_by(File.updated_at)
+            .limit(limit)
+        )
+        accessed = (
+            select(
+                File.uuid,
+                File.path,
+                File.size,
+                FileAccess.accessed_at.label("used_at"),
+            )
+            .join(FileAccess, FileAccess.file_uuid == File.uuid)
+            .filter(*evictable)
+            .order_by(FileAccess.accessed_at)
+            .limit(limit)
+        )
+        files = union_all(never_accessed, accessed).subquery()
+        return list(
+            await session.execute(
+                select(files.c.uuid, files.c.path, files.c.size)
+                .order_by(files.c.used_at)
+                .limit(limit)
+            )
+        )
+
+    @handle_orm_error
+    @inject_session
+    async def get_expiring(
+        self,
+        until: datetime,
+        limit: int,
+        *,
+        session: AsyncSession = None,
+    ) -> List[Row]:
+        return list(
+            await session.execute(
+                select(File.uuid, File.expires_at)
+                .filter(File.expires_at <= until)
+                .order_by(File.expires_at)
+                .limit(limit)
+            )
+        )
+
+    @handle_orm_error
+    @inject_session
+    async def delete_expired(
+        self,
+        uuids: Sequence[str | UUID],
+        now: datetime,
+        *,
+        session: AsyncSession = None,
+    ) -> List[Row]:
+        if not uuids:
+            return []
+        expired = and_(File.uuid.in_(uuids), File.expires_at <= now)
+        # variants are removed by cascade too, but their paths are needed
+        variants = File.parent_uuid.in_(select(File.uuid).filter(expired))
+        return list(
+            await session.execute(
+                delete(File)
+                .filter(or_(expired, variants))
+                .returning(File.path, File.is_saved_to_s3, File.is_removed_from_disk),
+                execution_options={"synchronize_session": False},
+            )
+        )
@@ -0,0 +1,176 @@
+from abc import abstractmethod
+from datetime import timedelta
+from typing import Any, Dict
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.schedule import ScheduledJob
+from utils.decorators import handle_orm_error
+from utils.decorators import session as inject_session
+from utils.repo import IRepo, Repo
+
+
+class IScheduledJobRepo(IRepo[ScheduledJob]):
+    @abstractmethod
+    async def acquire(
+        self,
+        name: str,
+        owner: str,
+        every: timedelta,
+        lease: timedelta,
+        *,
+        session: AsyncSession = None,
+    ) -> bool:
+        """
+        Lease a job if it is due and nobody runs it.
+        Only one of concurrent callers gets the lease,
+        lease of a crashed process expires on its own
+
+        :param name: job name
+        :type name: str
+        :param owner: identifier of the calling process
+        :type owner: str
+        :param every: min time between starts of the job
+        :type every: timedelta
+        :param lease: time during which the job is not run by others
+        :type lease: timedelta
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: flag whether the lease is acquired
+        :rtype: bool
+        """
+        ...
+
+    @abstractmethod
+    async def renew(
+        self,
+        name: str,
+        owner: str,
+        lease: timedelta,
+        *,
+        session: AsyncSession = None,
+    ) -> bool:
+        """
+        Extend the lease of a running job
+
+        :param name: job name
+        :type name: str
+        :param owner: identifier of the calling process
+        :type owner: str
+        :param lease: time from now during which the job is not run by others
+        :type lease: timedelta
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: flag whether the lease is still owned
+        :rtype: bool
+        """
+        ...
+
+    @abstractmethod
+    async def release(
+        self,
+        name: str,
+        owner: str,
+        duration: float,
+        result: Dict[str, Any],
+        *,
+        session: AsyncSession = None,
+    ) -> None:
+        """
+        Release the lease and record the run
+
+        :param name: job name
+        :type name: str
+        :param owner: identifier of the calling process
+        :type owner: str
+        :param duration: run duration in seconds
+        :type duration: float
+        :param result: counts reported by the job or its error
+        :type result: Dict[str, Any]
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        """
+        ...
+
+
+class ScheduledJobRepo(Repo[ScheduledJob], IScheduledJobRepo):
+    @handle_orm_error
+    @inject_session
+    async def acquire(
+        self,
+        name: str,
+        owner: str,
+        every: timedelta,
+        lease: timedelta,
+        *,
+        session: AsyncSession = None,
+    ) -> bool:
+        await session.execute(
+            insert(ScheduledJob).values(name=name).on_conflict_do_nothing()
+        )
+        # row lock makes concurrent callers wait and recheck the conditions,
+        # so exactly one of them wins
+        result = await session.execute(
+            update(ScheduledJob)
+            .filter(
+                ScheduledJob.name == name,
+                or_(
+                    ScheduledJob.leased_until.is_(None),
+                    ScheduledJob.leased_until < func.now(),
+                ),
+                or_(
+                    ScheduledJob.started_at.is_(None),
+                    ScheduledJob.started_at <= func.now() - every,
+                ),
+            )
+            .values(
+                owner=owner,
+                leased_until=func.now() + lease,
+                started_at=func.now(),
+            )
+            .returning(ScheduledJob.name)
+        )
+        return result.first() is not None
+
+    @handle_orm_error
+    @inject_session
+    async def renew(
+        self,
+        name: str,
+        owner: str,
+        lease: timedelta,
+        *,
+        session: AsyncSession = None,
+    ) -> bool:
+        result = await session.execute(
+            update(ScheduledJob)
+            .filter(ScheduledJob.name == name, ScheduledJob.owner == owner)
+            .values(leased_until=func.now() + lease)
+            .returning(ScheduledJob.name)
+        )
+        return result.first() is not None
+
+    @handle_orm_error
+    @inject_session
+    async def release(
+        self,
+        name: str,
+        owner: str,
+        duration: float,
+        result: Dict[str, Any],
+        *,
+        session: AsyncSession = None,
+    ) -> None:
+        await session.execute(
+            update(ScheduledJob)
+            .filter(ScheduledJob.name == name, ScheduledJob.owner == owner)
+            .values(
+                owner=None,
+                leased_until=None,
+                finished_at=func.now(),
+                duration=duration,
+                result=result,
+            )
+        )
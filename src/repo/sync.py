@@ -0,0 +1,157 @@
+from abc import abstractmethod
+from datetime import timedelta
+from typing import List, Sequence
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.file import File
+from models.sync import S3SyncJob
+from utils.decorators import handle_orm_error
+from utils.decorators import session as inject_session
+from utils.repo import IRepo, Repo
+
+
+class ISyncJobRepo(IRepo[S3SyncJob]):
+    @abstractmethod
+    async def enqueue(
+        self,
+        uuids: Sequence[str | UUID],
+        *,
+        session: AsyncSession = None,
+    ) -> None:
+        """
+        Add sync jobs for files, existing jobs are left as they are
+
+        :param uuids: uuids of files to sync
+        :type uuids: Sequence[str | UUID]
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        """
+        ...
+
+    @abstractmethod
+    async def claim(
+        self,
+        limit: int,
+        lease: timedelta,
+        *,
+        session: AsyncSession = None,
+    ) -> List[S3SyncJob]:
+        """
+        Claim due jobs, skipping jobs locked by other workers.
+        Claimed jobs are hidden for the lease time and counted as attempted,
+        so jobs of crashed workers become due again after the lease
+
+        :param limit: max number of jobs to claim
+        :type limit: int
+        :param lease: time during which jobs are not claimed by others
+        :type lease: timedelta
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: claimed jobs
+        :rtype: List[S3SyncJob]
+        """
+        ...
+
+    @abstractmethod
+    async def count_pending(self, *, session: AsyncSession = None) -> int:
+        """
+        Count jobs waiting to be synced, exhausted ones are not counted
+
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: number of jobs
+        :rtype: int
+        """
+        ...
+
+    @abstractmethod
+    async def sweep(self, *, session: AsyncSession = None) -> int:
+        """
+        Add jobs for unsynced files without one and
+        make jobs with exhausted attempts due again
+
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: number of added or revived jobs
+        :rtype: int
+        """
+        ...
+
+
+class SyncJobRepo(Repo[S3SyncJob], ISyncJobRepo):
+    @handle_orm_error
+    @inject_session
+    async def enqueue(
+        self,
+        uuids: Sequence[str | UUID],
+        *,
+        session: AsyncSession = None,
+    ) -> None:
+        if not uuids:
+            return
+        await session.execute(
+            insert(S3SyncJob).on_conflict_do_nothing(),
+            [{"file_uuid": uuid} for uuid in uuids],
+        )
+
+    @handle_orm_error
+    @inject_session
+    async def claim(
+        self,
+        limit: int,
+        lease: timedelta,
+        *,
+        session: AsyncSession = None,
+    ) -> List[S3SyncJob]:
+        due = (
+            select(S3SyncJob.file_uuid)
+            .filter(S3SyncJob.next_attempt_at <= func.now())
+            .order_by(S3SyncJob.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await session.scalars(
+            update(S3SyncJob)
+            .filter(S3SyncJob.file_uuid.in_(due.scalar_subquery()))
+            .values(
+                attempts=S3SyncJob.attempts + 1,
+                next_attempt_at=func.now() + lease,
+            )
+            .returning(S3SyncJob),
+            execution_options={"synchronize_session": False},
+        )
+        return list(result)
+
+    @handle_orm_error
+    @inject_session
+    async def count_pending(self, *, session: AsyncSession = None) -> int:
+        return await session.scalar(
+            select(func.count()).filter(S3SyncJob.next_attempt_at.is_not(None))
+        )
+
+    @handle_orm_error
+    @inject_session
+    async def sweep(self, *, session: AsyncSession = None) -> int:
+        added = await session.execute(
+            insert(S3SyncJob)
+            .from_select(
+                ["file_uuid"],
+                select(File.uuid).filter(
+                    File.is_saved_to_s3.is_(False),
+                    File.is_removed_from_disk.is_(False),
+                    # variants are rendered from originals, never synced
+                    File.parent_uuid.is_(None),
+                ),
+            )
+            .on_conflict_do_nothing()
+        )
+        revived = await session.execute(
+            update(S3SyncJob)
+            .filter(S3SyncJob.next_attempt_at.is_(None))
+            .values(attempts=0, next_attempt_at=func.now())
+        )
+        return added.rowcount + revived.rowcount
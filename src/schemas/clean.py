@@ -0,0 +1,45 @@
+from pydantic import BaseModel
+
+
+class CleanupStats(BaseModel):
+    """Schema for results of disk cleanup"""
+
+    files: int = 0
+    removed: int = 0
+    missing: int = 0
+    accessed: int = 0
+
+
+class EvictionStats(BaseModel):
+    """Schema for results of eviction from disk under pressure"""
+
+    files: int = 0
+    bytes: int = 0
+    usage_before: float = 0
+    usage_after: float = 0
+
+
+class PlacementStats(BaseModel):
+    """Schema for results of file placement between disk and s3"""
+
+    demoted: int = 0
+    promoted: int = 0
+
+
+class ExpiryStats(BaseModel):
+    """Schema for results of removal of expired files"""
+
+    files: int = 0
+    objects: int = 0
+
+
+class DiskReconcileStats(BaseModel):
+    """Schema for results of disk reconciliation"""
+
+    entries: int = 0
+    files: int = 0
+    orphans: int = 0
+    orphan_bytes: int = 0
+    missing: int = 0
+    lost: int = 0
+    finished: bool = False
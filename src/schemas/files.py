@@ -1,6 +1,7 @@
 from datetime import datetime
+from typing import Any, Dict, List
 
-from pydantic import UUID4, BaseModel
+from pydantic import UUID4, BaseModel, Field, model_validator
 
 
 class UploadedFile(BaseModel):
@@ -14,6 +15,14 @@ class UploadedFile(BaseModel):
     ext: str
     created_at: datetime
     available_for_download: bool
+    attributes: Dict[str, Any] | None = None
+    expires_at: datetime | None = None
+
+
+class ArchiveManifest(BaseModel):
+    """Schema for files created from an uploaded archive"""
+
+    files: List[UploadedFile]
 
 
 class CreateFileSchema(BaseModel):
@@ -25,6 +34,12 @@ class CreateFileSchema(BaseModel):
     format: str
     name: str
     ext: str
+    encoding: str | None = None
+    parent_uuid: UUID4 | None = None
+    variant: str | None = None
+    is_saved_to_s3: bool = False
+    is_removed_from_disk: bool = False
+    expires_at: datetime | None = None
 
 
 class FileMetadata(BaseModel):
@@ -34,3 +49,64 @@ class FileMetadata(BaseModel):
     format: str
     name: str
     ext: str
+
+
+class ArchiveQuery(BaseModel):
+    """Schema for selecting files to download as an archive"""
+
+    uuids: List[UUID4] | None = Field(default=None, min_length=1)
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    compress: bool = False
+
+    @model_validator(mode="after")
+    def check_criteria(self) -> "ArchiveQuery":
+        if self.uuids is None and self.created_from is None and self.created_to is None:
+            raise ValueError("At least one of uuids or created range is required.")
+        return self
+
+
+class DirectUploadRequest(BaseModel):
+    """Schema for starting an upload straight to s3"""
+
+    name: str = Field(min_length=1, max_length=256)
+    size: int = Field(ge=0)
+    format: str = "application/octet-stream"
+
+
+class DirectUpload(BaseModel):
+    """
+    Schema for presigned urls of an upload straight to s3.
+    One url means a single PUT, several urls are parts of a multipart upload
+    """
+
+    key: str
+    upload_id: str | None = None
+    part_size: int | None = None
+    urls: List[str]
+    expires_at: datetime
+
+
+class DirectUploadPart(BaseModel):
+    """Schema for an uploaded part of a multipart upload"""
+
+    part_number: int = Field(ge=1)
+    etag: str
+
+
+class CompleteDirectUploadRequest(BaseModel):
+    """Schema for registering a file uploaded straight to s3"""
+
+    key: str
+    name: str = Field(min_length=1, max_length=256)
+    size: int = Field(ge=0)
+    format: str = "application/octet-stream"
+    etag: str | None = None
+    upload_id: str | None = None
+    parts: List[DirectUploadPart] | None = Field(default=None, min_length=1)
+
+    @model_validator(mode="after")
+    def check_parts(self) -> "CompleteDirectUploadRequest":
+        if (self.upload_id is None) != (self.parts is None):
+            raise ValueError("Upload id and parts are required together.")
+        return self
@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+
+
+class SyncStats(BaseModel):
+    """Schema for s3 sync queue metrics of the process"""
+
+    limit: float
+    in_flight: int
+    waiting: int
+    circuit: str
+    queue_depth: int
+
+
+class ReconcileStats(BaseModel):
+    """Schema for results of s3 reconciliation"""
+
+    objects: int = 0
+    files: int = 0
+    missing: int = 0
+    lost: int = 0
+    orphans: int = 0
@@ -1,4 +1,16 @@
+from .access import TrackAccess
+from .archive import ImportArchive, StreamArchive
+from .cache import DiskCache
 from .clean import CleanDisk
 from .create import CreateFile
-from .external import SaveFileToS3
-from .extract import ExtractMetadata
+from .derivatives import CreateDerivative
+from .direct import CompleteDirectUpload, PresignDownload, StartDirectUpload
+from .evict import EvictFromDisk
+from .expire import ExpireFiles
+from .external import SaveFileToS3, StreamFileFromS3
+from .extract import ExtractAttributes, ExtractMetadata
+from .orphans import ReconcileDisk
+from .placement import PlaceFiles
+from .reconcile import ReconcileS3
+from .schedule import RunScheduled
+from .sync import SyncFilesToS3
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from typing import Any, Dict, List
+from uuid import UUID
+
+from repo.access import IFileAccessRepo
+from services.interfaces import ITrackAccess
+from utils.heat import to_heat
+from utils.time import get_current_time
+
+logger = logging.getLogger("access")
+
+# postgres allows 32767 parameters per statement, each file binds 5:
+# uuid, accessed_at, reads, downloads and heat
+BATCH_SIZE = 32767 // 5
+
+
+class TrackAccess(ITrackAccess):
+    def __init__(
+        self,
+        flush_interval: int,
+        max_pending: int,
+        half_life: int,
+        repo: IFileAccessRepo,
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.half_life = half_life
+        self.repo = repo
+        self._pending: Dict[UUID, Dict[str, Any]] = {}
+        self._full = asyncio.Event()
+
+    def read(self, uuid: UUID) -> None:
+        self._hit(uuid)["reads"] += 1
+
+    def download(self, uuid: UUID) -> None:
+        self._hit(uuid)["downloads"] += 1
+
+    async def __call__(self) -> None:
+        try:
+            while True:
+                await self._wait()
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"Error flushing file accesses. - {str(e)}")
+        finally:
+            # accesses since the last flush are not lost on shutdown
+            await self.flush()
+
+    async def flush(self) -> int:
+        # requests keep recording into a new dict while this one is written
+        pending, self._pending = self._pending, {}
+        accesses = list(pending.values())
+        for access in accesses:
+            # downloads of a few seconds are counted as made at the last one
+            access["heat"] = (
+                to_heat(access["downloads"], access["accessed_at"], self.half_life)
+                if access["downloads"]
+                else None
+            )
+        recorded = 0
+        for start in range(0, len(accesses), BATCH_SIZE):
+            try:
+                recorded += await self.repo.record(
+                    accesses[start : start + BATCH_SIZE]  # noqa: E203
+                )
+            except Exception:
+                self._restore(accesses[start:])
+                raise
+        return recorded
+
+    def _hit(self, uuid: UUID) -> Dict[str, Any]:
+        access = self._pending.get(uuid)
+        if access is None:
+            access = self._pending[uuid] = {
+                "file_uuid": uuid,
+                "accessed_at": None,
+                "reads": 0,
+                "downloads": 0,
+            }
+            if len(self._pending) >= self.max_pending:
+                self._full.set()
+        access["accessed_at"] = get_current_time()
+        return access
+
+    def _restore(self, accesses: List[Dict[str, Any]]) -> None:
+        # failed accesses are retried with the next flush, unless memory is tight
+        if len(self._pending) + len(accesses) > self.max_pending:
+            logger.warning(f"File accesses are dropped - {len(accesses)}.")
+            return
+        for access in accesses:
+            current = self._pending.setdefault(access["file_uuid"], access)
+            if current is not access:
+                current["reads"] += access["reads"]
+                current["downloads"] += access["downloads"]
+
+    async def _wait(self) -> None:
+        try:
+            await asyncio.wait_for(self._full.wait(), self.flush_interval)
+        except TimeoutError:
+            pass
+        self._full.clear()
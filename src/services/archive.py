@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import mimetypes
+from pathlib import PurePath
+from tempfile import SpooledTemporaryFile
+from typing import AsyncGenerator, AsyncIterable, AsyncIterator, List, Type
+
+from aiofiles import os
+from fastapi import UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import Headers
+
+from models.file import File
+from repo.sync import ISyncJobRepo
+from schemas.files import ArchiveQuery, CreateFileSchema, UploadedFile
+from services.interfaces import (
+    ICreateFile,
+    IImportArchive,
+    IStreamArchive,
+    IStreamFileFromExternalStorage,
+)
+from utils.archive import ArchiveEntry, ArchiveError, stream_zip, unpack
+from utils.compression import decompress_stream
+from utils.decorators import session
+from utils.exceptions import Custom400Exception, Custom404Exception
+from utils.file import chunk_file
+from utils.repo import IRepo
+from utils.sqlalchemy import IFilter, IFilterSeq, mode, operator
+
+logger = logging.getLogger("archive")
+
+CHUNK_SIZE: int = 64 * 1024
+# entries larger than this are spooled to a temporary file,
+# the same threshold multipart uploads are spooled at
+SPOOL_SIZE: int = 1024 * 1024
+
+
+class StreamArchive(IStreamArchive):
+    def __init__(
+        self,
+        max_files: int,
+        repo: IRepo[File],
+        filter_class: Type[IFilter],
+        filter_seq_class: Type[IFilterSeq],
+        stream_from_s3: IStreamFileFromExternalStorage,
+    ) -> None:
+        self.max_files = max_files
+        self.repo = repo
+        self.filter_class = filter_class
+        self.filter_seq_class = filter_seq_class
+        self.stream_from_s3 = stream_from_s3
+
+    async def __call__(self, query: ArchiveQuery) -> AsyncIterator[bytes]:
+        files = await self._get_files(query)
+        if not files:
+            raise Custom404Exception("No files available for download.")
+        if len(files) > self.max_files:
+            raise Custom400Exception(
+                f"Too many files for one archive, max is {self.max_files}."
+            )
+        if query.uuids is not None:
+            found = {file.uuid for file in files}
+            if missing := [uuid for uuid in query.uuids if uuid not in found]:
+                raise Custom404Exception(
+                    "Files are not available for download: "
+                    + ", ".join(map(str, missing))
+                )
+        # files are looked up before the response is started,
+        # so errors above are still returned as regular responses
+        return stream_zip(self._entries(files), compress=query.compress)
+
+    async def _get_files(self, query: ArchiveQuery) -> List[File]:
+        filters: List[IFilter | IFilterSeq] = [
+            # files removed from disk are streamed from s3
+            self.filter_seq_class(
+                mode.or_,
+                self.filter_class(File, "is_removed_from_disk")(False, operator.is_),
+                self.filter_class(File, "is_saved_to_s3")(True, operator.is_),
+            ),
+            # variants are derived from originals, they are not user files
+            self.filter_class(File, "parent_uuid")(None, operator.is_),
+        ]
+        if query.uuids is not None:
+            filters.append(
+                self.filter_class(File, "uuid")(
+                    [str(uuid) for uuid in query.uuids], operator.in_
+                )
+            )
+        if query.created_from is not None:
+            filters.append(
+                self.filter_class(File, "created_at")(query.created_from, operator.ge)
+            )
+        if query.created_to is not None:
+            filters.append(
+                self.filter_class(File, "created_at")(query.created_to, operator.le)
+            )
+        result = await self.repo.get_by_filters(
+            filters=self.filter_seq_class(mode.and_, *filters),
+            order_by=("created_at", "uuid"),
+            # one extra row is enough to detect limit overflow
+            limit=self.max_files + 1,
+        )
+        return [row[0] for row in result]
+
+    async def _entries(self, files: List[File]) -> AsyncGenerator[ArchiveEntry, None]:
+        for file in files:
+            if file.is_removed_from_disk:
+                chunks = (await self.stream_from_s3(file)).chunks
+            else:
+                chunks = chunk_file(file.path, chunk_size=CHUNK_SIZE)
+            if file.encoding:
+                chunks = decompress_stream(chunks)
+            yield ArchiveEntry(
+                name=file.name,
+                size=file.size,
+                modified_at=file.created_at,
+                chunks=chunks,
+            )
+
+
+class ImportArchive(IImportArchive):
+    def __init__(
+        self,
+        max_files: int,
+        max_bytes: int,
+        max_workers: int,
+        create_file: ICreateFile,
+        repo: IRepo[File],
+        sync_repo: ISyncJobRepo,
+    ) -> None:
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self.create_file = create_file
+        self.repo = repo
+        self.sync_repo = sync_repo
+
+    @session
+    async def __call__(
+        self,
+        chunks: AsyncIterable[bytes],
+        content_type: str,
+        *,
+        session: AsyncSession = None,
+    ) -> List[UploadedFile]:
+        entries: List[CreateFileSchema] = []
+        try:
+            await self._write(chunks, content_type, entries)
+            instances = await self.repo.multi_create(entries, session=session)
+            await self.sync_repo.enqueue(
+                [instance.uuid for instance in instances], session=session
+            )
+        except BaseException:
+            await self._cleanup(entries)
+            raise
+        return [
+            UploadedFile(
+                uuid=instance.uuid,
+                path=instance.path,
+                size=instance.size,
+                format=instance.format,
+                name=instance.name,
+                ext=instance.ext,
+                created_at=instance.created_at,
+                available_for_download=instance.is_removed_from_disk is False,
+            )
+            for instance in instances
+        ]
+
+    async def _write(
+        self,
+        chunks: AsyncIterable[bytes],
+        content_type: str,
+        entries: List[CreateFileSchema],
+    ) -> None:
+        # archive is parsed sequentially, while entries
+        # are written to disk by a fixed number of workers.
+        # Bounded queue keeps memory usage bounded too.
+        queue: asyncio.Queue[UploadFile | None] = asyncio.Queue(self.max_workers)
+
+        async def worker() -> None:
+            while (file := await queue.get()) is not None:
+                try:
+                    entries.append(await self.create_file.write(file))
+                finally:
+                    await file.close()
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                for _ in range(self.max_workers):
+                    group.create_task(worker())
+                files = 0
+                async for name, data in unpack(chunks, content_type):
+                    files += 1
+                    if files > self.max_files:
+                        raise Custom400Exception(
+                            f"Too many files in archive, max is {self.max_files}."
+                        )
+                    await queue.put(await self._read_entry(name, data))
+                for _ in range(self.max_workers):
+                    await queue.put(None)
+        except ExceptionGroup as group:
+            # the first error is the cause, the rest are consequences
+            error = group.exceptions[0]
+            if isinstance(error, ArchiveError):
+                raise Custom400Exception(str(error))
+            raise error
+
+    async def _read_entry(self, name: str, data: AsyncIterator[bytes]) -> UploadFile:
+        name = PurePath(name).name
+        content_type, _ = mimetypes.guess_type(name)
+        file = UploadFile(
+            file=SpooledTemporaryFile(max_size=SPOOL_SIZE),
+            size=0,
+            filename=name,
+            headers=Headers({"content-type": content_type} if content_type else {}),
+        )
+        try:
+            async for chunk in data:
+                await file.write(chunk)
+                if file.size > self.max_bytes:
+                    raise Custom400Exception(f"Exceeded file limit - {name}.")
+            await file.seek(0)
+        except BaseException:
+            await file.close()
+            raise
+        return file
+
+    async def _cleanup(self, entries: List[CreateFileSchema]) -> None:
+        for entry in entries:
+            try:
+                await os.remove(entry.path)
+            except OSError:
+                logger.error(
+                    "Error removing file of failed archive import.",
+                    extra={"path": entry.path},
+                )
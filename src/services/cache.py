@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Sequence, Set, Type
+
+from aiobotocore.client import AioBaseClient
+from aiofiles import os as aios
+from sqlalchemy import Row
+
+from models.file import File
+from repo.file import IFileRepo
+from services.interfaces import IDiskCache
+from utils.asyncio import Hedger, SingleFlight
+from utils.s3 import S3ClientProvider
+from utils.sqlalchemy import IFilter, IFilterSeq, mode, operator
+from utils.time import get_current_time
+
+logger = logging.getLogger("cache")
+
+# max number of rehydrated files evicted at once
+BATCH_SIZE: int = 100
+
+
+class DiskCache(IDiskCache):
+    def __init__(
+        self,
+        max_bytes: int,
+        max_object_bytes: int,
+        part_size: int,
+        concurrency: int,
+        s3: S3ClientProvider,
+        bucket: str,
+        repo: IFileRepo,
+        rehydrated_at_filter: IFilter[File],
+        is_removed_from_disk_filter: IFilter[File],
+        filter_seq_class: Type[IFilterSeq],
+        hedge: Hedger[Dict[str, Any]],
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.s3 = s3
+        self.bucket = bucket
+        self.repo = repo
+        self.rehydrated_at_filter = rehydrated_at_filter
+        self.is_removed_from_disk_filter = is_removed_from_disk_filter
+        self.filter_seq_class = filter_seq_class
+        self.hedge = hedge
+        self._single_flight: SingleFlight[bool] = SingleFlight()
+        # references to background rehydrations, so they are not collected
+        self._tasks: Set[asyncio.Task[File]] = set()
+
+    async def __call__(self, file: File) -> File:
+        if not self._is_cacheable(file):
+            return file
+        # concurrent reads and promotions of the same file
+        # wait for one download
+        if await self._single_flight(file.uuid, lambda: self._rehydrate(file)):
+            file.is_removed_from_disk = False
+        return file
+
+    def warm(self, file: File) -> None:
+        if not self._is_cacheable(file):
+            return
+        task = asyncio.create_task(self(file))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _is_cacheable(self, file: File) -> bool:
+        return bool(
+            self.max_bytes
+            and file.is_removed_from_disk
+            and file.is_saved_to_s3
+            and file.size
+            and file.size <= self.max_object_bytes
+        )
+
+    async def _rehydrate(self, file: File) -> bool:
+        s3 = await self.s3()
+        path = f"{file.path}.part"
+        try:
+            # first part tells the size, the rest is fetched in parallel
+            first = await self._get_part(s3, file, 0, self.part_size - 1)
+            size = int(first["ContentRange"].rsplit("/", 1)[-1])
+            if size > self.max_bytes:
+                return False
+            await self._reserve(size)
+            fd = await asyncio.to_thread(
+                os.open, path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644
+            )
+            try:
+                await asyncio.to_thread(os.ftruncate, fd, size)
+                await self._write_part(fd, first, 0)
+                await self._download_rest(s3, file, fd, size, first["ETag"])
+                await asyncio.to_thread(os.fsync, fd)
+            finally:
+                os.close(fd)
+            await aios.replace(path, file.path)
+            await self.repo.update(
+                file,
+                values={
+                    "is_removed_from_disk": False,
+                    "rehydrated_at": get_current_time(),
+                },
+            )
+        except Exception as e:
+            logger.error(
+                f"Error rehydrating a file from s3. - {str(e)}",
+                extra={"uuid": file.uuid, "path": file.path},
+            )
+            # row still says the file is not on disk
+            await self._remove(path)
+            await self._remove(file.path)
+            return False
+        return True
+
+    async def _download_rest(
+        self,
+        s3: AioBaseClient,
+        file: File,
+        fd: int,
+        size: int,
+        etag: str,
+    ) -> None:
+        # parts are written in place, so at most
+        # `concurrency` parts are in memory
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def download_part(offset: int) -> None:
+            async with semaphore:
+                end = min(offset + self.part_size, size) - 1
+                part = await self._get_part(s3, file, offset, end, etag)
+                await self._write_part(fd, part, offset)
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                for offset in range(self.part_size, size, self.part_size):
+                    group.create_task(download_part(offset))
+        except ExceptionGroup as group:
+            # the first error is the cause, the rest are consequences
+            raise group.exceptions[0]
+
+    async def _get_part(
+        self,
+        s3: AioBaseClient,
+        file: File,
+        start: int,
+        end: int,
+        etag: str | None = None,
+    ) -> Dict[str, Any]:
+        return await self.hedge(
+            lambda: s3.get_object(
+                Bucket=self.bucket,
+                Key=file.path.strip("/"),
+                Range=f"bytes={start}-{end}",
+                # object must not change between parts
+                **({"IfMatch": etag} if etag else {}),
+            )
+        )
+
+    async def _write_part(self, fd: int, part: Dict[str, Any], offset: int) -> None:
+        data = await part["Body"].read()
+        if len(data) != part["ContentLength"]:
+            raise ValueError("Unexpected part size.")
+        await asyncio.to_thread(os.pwrite, fd, data, offset)
+
+    async def _reserve(self, size: int) -> None:
+        # budget is shared by all processes, so it is counted in db.
+        # Files downloaded at the same time are not counted yet,
+        # the next reservation makes room for them
+        excess = await self.repo.get_rehydrated_size() + size - self.max_bytes
+        while excess > 0:
+            files = await self.repo.get_by_filters(
+                filters=self.filter_seq_class(
+                    mode.and_,
+                    self.is_removed_from_disk_filter(False, operator.is_),
+                    self.rehydrated_at_filter(None, operator.is_not),
+                ),
+                # earliest rehydrated first
+                order_by=("rehydrated_at",),
+                limit=BATCH_SIZE,
+                columns=("uuid", "path", "size"),
+            )
+            if not files:
+                return
+            batch: List[Row] = []
+            for file in files:
+                batch.append(file)
+                excess -= file.size
+                if excess <= 0:
+                    break
+            await self._evict(batch)
+
+    async def _evict(self, batch: Sequence[Row]) -> None:
+        # row is updated first, so nobody is sent to a missing file
+        await self.repo.multi_update(
+            [file.uuid for file in batch],
+            values={"is_removed_from_disk": True, "rehydrated_at": None},
+        )
+        for file in batch:
+            await self._remove(file.path)
+
+    async def _remove(self, path: str) -> None:
+        try:
+            await aios.remove(path)
+        except FileNotFoundError:
+            pass
@@ -1,14 +1,16 @@
 import asyncio
 import logging
-from datetime import timedelta
-from typing import List, Type
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Sequence, Type
+from uuid import UUID
 
-from aiofiles import os
-from sqlalchemy import Result
+from sqlalchemy import Row
 
 from models.file import File
+from repo.access import IFileAccessRepo
+from schemas.clean import CleanupStats
 from services.interfaces import ICleanDisk
-from utils.asyncio import gather_with_concurrency
+from utils.file import remove_files
 from utils.repo import IRepo
 from utils.sqlalchemy import IFilter, IFilterSeq, mode, operator
 from utils.time import get_current_time
@@ -21,59 +23,130 @@ class CleanDisk(ICleanDisk):
         self,
         max_days: int,
         max_days_unused: int,
+        batch_size: int,
+        max_workers: int,
         repo: IRepo[File],
+        access_repo: IFileAccessRepo,
+        uuid_filter: IFilter[File],
         created_at_filter: IFilter[File],
         updated_at_filter: IFilter[File],
         is_removed_from_disk_filter: IFilter[File],
+        rehydrated_at_filter: IFilter[File],
         filter_seq_class: Type[IFilterSeq],
     ) -> None:
         self.max_days = max_days
         self.max_days_unused = max_days_unused
+        self.batch_size = batch_size
+        self.max_workers = max_workers
         self.repo = repo
+        self.access_repo = access_repo
+        self.uuid_filter = uuid_filter
         self.created_at_filter = created_at_filter
         self.updated_at_filter = updated_at_filter
         self.is_removed_from_disk_filter = is_removed_from_disk_filter
+        self.rehydrated_at_filter = rehydrated_at_filter
         self.filter_seq_class = filter_seq_class
 
-    async def __call__(self) -> None:
-        tasks: List[asyncio.Task[str | None]] = []
-        for file in await self._get_files_for_cleanup():
-            tasks.append(asyncio.Task(self._delete_from_disk(file[0])))
-
-        # no need to do it in specific order synchronously,
-        # just gather and get all results
-        result = await gather_with_concurrency(tasks)
-        if result:
-            await self._update_in_db(list(uuid for uuid in result if uuid is not None))
+    async def __call__(self) -> CleanupStats:
+        # bounded queue keeps at most a batch per worker in memory,
+        # fetching waits while workers are busy
+        queue: asyncio.Queue[Sequence[Row] | None] = asyncio.Queue(self.max_workers)
+        stats = CleanupStats()
+        try:
+            async with asyncio.TaskGroup() as group:
+                for _ in range(self.max_workers):
+                    group.create_task(self._worker(queue, stats))
+                async for batch in self._get_files_for_cleanup(stats):
+                    await queue.put(batch)
+                for _ in range(self.max_workers):
+                    await queue.put(None)
+        except ExceptionGroup as group:
+            # the first error is the cause, the rest are consequences
+            raise group.exceptions[0]
+        return stats
 
-    async def _get_files_for_cleanup(self) -> Result[File]:
-        return await self.repo.get_by_filters(
-            filters=self.filter_seq_class(
-                mode.and_,
-                self.is_removed_from_disk_filter(False, operator.is_),
-                self.filter_seq_class(
-                    mode.or_,
-                    self.created_at_filter(
-                        get_current_time() - timedelta(days=self.max_days), operator.le
-                    ),
-                    self.updated_at_filter(
-                        get_current_time() - timedelta(days=self.max_days_unused),
-                        operator.le,
-                    ),
-                ),
+    async def _get_files_for_cleanup(
+        self, stats: CleanupStats
+    ) -> AsyncIterator[Sequence[Row]]:
+        now = get_current_time()
+        after: UUID | None = None
+        while True:
+            # keyset pagination, so every batch is as cheap as the first one
+            batch = list(
+                await self.repo.get_by_filters(
+                    filters=self._get_filters(now, after),
+                    order_by=("uuid",),
+                    limit=self.batch_size,
+                    columns=("uuid", "path", "created_at"),
+                )
             )
+            if kept := await self._skip_accessed(batch, now, stats):
+                yield kept
+            if len(batch) < self.batch_size:
+                return
+            after = batch[-1].uuid
+
+    async def _skip_accessed(
+        self,
+        batch: List[Row],
+        now: datetime,
+        stats: CleanupStats,
+    ) -> List[Row]:
+        # updated_at changes on writes only, downloads are tracked separately
+        # and keep a file on disk until max_days after creation
+        created_after = now - timedelta(days=self.max_days)
+        accessed = await self.access_repo.get_accessed_since(
+            [file.uuid for file in batch if file.created_at > created_after],
+            now - timedelta(days=self.max_days_unused),
         )
+        stats.accessed += len(accessed)
+        return [file for file in batch if file.uuid not in accessed]
 
-    async def _delete_from_disk(self, file: File) -> str | None:
-        try:
-            await os.remove(file.path)
-            return str(file.uuid)
-        except FileNotFoundError:
-            logger.error(
-                "Error cleaning disk from file.",
-                extra={"uuid": file.uuid, "path": file.path},
-            )
-            return None
+    def _get_filters(self, now: datetime, after: UUID | None) -> IFilterSeq:
+        filters = [
+            self.is_removed_from_disk_filter(False, operator.is_),
+            # files brought back from s3 are evicted by the disk cache
+            self.rehydrated_at_filter(None, operator.is_),
+            self.filter_seq_class(
+                mode.or_,
+                self.created_at_filter(
+                    now - timedelta(days=self.max_days), operator.le
+                ),
+                self.updated_at_filter(
+                    now - timedelta(days=self.max_days_unused),
+                    operator.le,
+                ),
+            ),
+        ]
+        if after is not None:
+            filters.append(self.uuid_filter(after, operator.gt))
+        return self.filter_seq_class(mode.and_, *filters)
+
+    async def _worker(
+        self,
+        queue: asyncio.Queue[Sequence[Row] | None],
+        stats: CleanupStats,
+    ) -> None:
+        while (batch := await queue.get()) is not None:
+            await self._clean_batch(batch, stats)
+
+    async def _clean_batch(self, batch: Sequence[Row], stats: CleanupStats) -> None:
+        removed = await asyncio.to_thread(remove_files, [file.path for file in batch])
+        stats.files += len(batch)
+        stats.removed += sum(removed)
+        stats.missing += len(batch) - sum(removed)
+        for file, is_removed in zip(batch, removed):
+            if not is_removed:
+                logger.error(
+                    "Error cleaning disk from file.",
+                    extra={"uuid": file.uuid, "path": file.path},
+                )
+        # every batch is committed on its own,
+        # so an interrupted cleanup keeps its progress
+        await self._update_in_db(
+            [str(file.uuid) for file, is_removed in zip(batch, removed) if is_removed]
+        )
 
     async def _update_in_db(self, uuids: List[str]) -> None:
-        await self.repo.multi_update(uuids, values={"is_removed_from_disk": True})
+        if uuids:
+            await self.repo.multi_update(uuids, values={"is_removed_from_disk": True})
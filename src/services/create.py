@@ -1,17 +1,33 @@
+import asyncio
+import logging
 import uuid
 from pathlib import Path
+from typing import AsyncIterator, Tuple
 
 import aiofiles
+from aiofiles import os
+from aiofiles.threadpool.binary import AsyncBufferedIOBase
 from fastapi import UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.file import File
+from repo.sync import ISyncJobRepo
 from schemas.files import CreateFileSchema, FileMetadata, UploadedFile
-from services.interfaces import ICreateFile, IExtractMetadata
+from services.interfaces import (
+    ICreateFile,
+    IExtractMetadata,
+    ISaveFileToExternalStorage,
+)
+from utils.compression import GZIP, compress, is_compressible
 from utils.decorators import session
-from utils.exceptions import Custom400Exception
+from utils.exceptions import Custom400Exception, Custom503Exception
 from utils.random import random_string
 from utils.repo import IRepo
+from utils.time import get_current_time_with_delta
+
+logger = logging.getLogger("s3")
+
+CHUNK_SIZE: int = 1024 * 1024
 
 
 class CreateFile(ICreateFile):
@@ -19,12 +35,20 @@ class CreateFile(ICreateFile):
         self,
         base_path: str,
         max_bytes: int,
+        compression_enabled: bool,
+        compression_min_size: int,
         repo: IRepo[File],
+        sync_repo: ISyncJobRepo,
+        save_to_s3: ISaveFileToExternalStorage,
         extract_metadata: IExtractMetadata,
     ) -> None:
         self.base_path = base_path
         self.max_bytes = max_bytes
+        self.compression_enabled = compression_enabled
+        self.compression_min_size = compression_min_size
         self.repo = repo
+        self.sync_repo = sync_repo
+        self.save_to_s3 = save_to_s3
         self.extract_metadata = extract_metadata
 
     @session
@@ -32,12 +56,13 @@ class CreateFile(ICreateFile):
         self,
         file: UploadFile,
         *,
+        durable: bool = False,
+        ttl: int | None = None,
         session: AsyncSession = None,
     ) -> UploadedFile:
-        metadata = self._extract_metadata(file)
-        self._validate_metadata(metadata)
-        path = await self._save_to_disk(file, metadata)
-        instance = await self._create(path, metadata, session)
+        instance = await self._create(
+            await self.write(file, durable=durable, ttl=ttl), session
+        )
         return UploadedFile(
             uuid=instance.uuid,
             path=instance.path,
@@ -47,6 +72,29 @@ class CreateFile(ICreateFile):
             ext=instance.ext,
             created_at=instance.created_at,
             available_for_download=instance.is_removed_from_disk is False,
+            expires_at=instance.expires_at,
+        )
+
+    async def write(
+        self,
+        file: UploadFile,
+        *,
+        durable: bool = False,
+        ttl: int | None = None,
+    ) -> CreateFileSchema:
+        metadata = self._extract_metadata(file)
+        self._validate_metadata(metadata)
+        path, encoding = await self._save_to_disk(file, metadata, durable)
+        return CreateFileSchema(
+            uuid=str(uuid.uuid4()),
+            path=path,
+            size=metadata.size,
+            format=metadata.format,
+            name=metadata.name,
+            ext=metadata.ext,
+            encoding=encoding,
+            is_saved_to_s3=durable,
+            expires_at=get_current_time_with_delta(seconds=ttl) if ttl else None,
         )
 
     def _extract_metadata(self, file: UploadFile) -> FileMetadata:
@@ -56,26 +104,76 @@ class CreateFile(ICreateFile):
         if metadata.size > self.max_bytes:
             raise Custom400Exception("Exceeded file limit.")
 
-    async def _save_to_disk(self, file: UploadFile, metadata: FileMetadata) -> str:
+    async def _save_to_disk(
+        self,
+        file: UploadFile,
+        metadata: FileMetadata,
+        durable: bool,
+    ) -> Tuple[str, str | None]:
         path = str(Path(self.base_path, f"{random_string()}.{metadata.ext}"))
-        async with aiofiles.open(path, "wb") as stream:
-            await stream.write(file.file.read())
-        return path
+        content, encoding = await self._compress(file.file.read(), metadata)
+        try:
+            async with aiofiles.open(path, "wb") as stream:
+                if not durable:
+                    await stream.write(content)
+                    return path, encoding
+                try:
+                    await self.save_to_s3.upload_stream(
+                        path, self._tee(content, stream), len(content), encoding
+                    )
+                except Exception as e:
+                    logger.critical(
+                        f"Error uploading a file to s3. - {str(e)}",
+                        extra={"path": path},
+                    )
+                    raise Custom503Exception("File could not be saved durably.") from e
+            return path, encoding
+        except BaseException:
+            # failed and cancelled uploads and imports leave no partial files
+            try:
+                await os.remove(path)
+            except FileNotFoundError:
+                pass
+            raise
 
-    async def _create(
+    async def _tee(
+        self,
+        content: bytes,
+        stream: AsyncBufferedIOBase,
+    ) -> AsyncIterator[bytes]:
+        # every chunk goes to disk before it is handed to s3 uploader,
+        # so both copies are written in one pass
+        view = memoryview(content)
+        for offset in range(0, len(content), CHUNK_SIZE):
+            chunk = view[offset : offset + CHUNK_SIZE]  # noqa: E203
+            await stream.write(chunk)
+            yield chunk
+
+    async def _compress(
         self,
-        path: str,
+        content: bytes,
         metadata: FileMetadata,
+    ) -> Tuple[bytes, str | None]:
+        if (
+            not self.compression_enabled
+            or len(content) < self.compression_min_size
+            or not is_compressible(metadata.format, metadata.ext, content)
+        ):
+            return content, None
+
+        # compression is cpu-bound, so keep it off the event loop
+        compressed = await asyncio.to_thread(compress, content)
+        if len(compressed) >= len(content):
+            return content, None
+        return compressed, GZIP
+
+    async def _create(
+        self,
+        entry: CreateFileSchema,
         session: AsyncSession,
     ) -> File:
-        return await self.repo.create(
-            entry=CreateFileSchema(
-                uuid=str(uuid.uuid4()),
-                path=path,
-                size=metadata.size,
-                format=metadata.format,
-                name=metadata.name,
-                ext=metadata.ext,
-            ),
-            session=session,
-        )
+        instance = await self.repo.create(entry=entry, session=session)
+        if not entry.is_saved_to_s3:
+            # job is committed together with the file, so it is never lost
+            await self.sync_repo.enqueue([instance.uuid], session=session)
+        return instance
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import uuid
+from concurrent.futures import Executor
+from pathlib import Path, PurePath
+from typing import Dict, Type
+from uuid import UUID
+
+from aiofiles import os
+from sqlalchemy.exc import IntegrityError
+
+from models.file import File
+from schemas.files import CreateFileSchema
+from services.interfaces import ICreateDerivative
+from utils.asyncio import SingleFlight
+from utils.exceptions import Custom400Exception
+from utils.image import ImageVariant, resize_image
+from utils.random import random_string
+from utils.repo import IRepo
+from utils.sqlalchemy import IFilter, IFilterSeq, mode
+
+logger = logging.getLogger("derivatives")
+
+
+class CreateDerivative(ICreateDerivative):
+    def __init__(
+        self,
+        base_path: str,
+        variants: Dict[str, ImageVariant],
+        on_upload: bool,
+        repo: IRepo[File],
+        executor: Executor,
+        filter_class: Type[IFilter],
+        filter_seq_class: Type[IFilterSeq],
+    ) -> None:
+        self.base_path = base_path
+        self.variants = variants
+        self.on_upload = on_upload
+        self.repo = repo
+        self.executor = executor
+        self.filter_class = filter_class
+        self.filter_seq_class = filter_seq_class
+        self._single_flight: SingleFlight[File] = SingleFlight()
+
+    async def __call__(self, uuid: str | UUID, variant: str) -> File:
+        if variant not in self.variants:
+            raise Custom400Exception(
+                f"Unknown variant, available are: {', '.join(self.variants)}."
+            )
+        # concurrent requests for the same cold variant share one resize
+        return await self._single_flight(
+            (str(uuid), variant),
+            lambda: self._get_or_create(str(uuid), self.variants[variant]),
+        )
+
+    async def create_all(self, uuid: str | UUID) -> None:
+        if not self.on_upload:
+            return
+        for variant in self.variants:
+            try:
+                await self(uuid, variant)
+            except Exception as e:
+                logger.error(
+                    f"Error creating file variant. - {str(e)}",
+                    extra={"uuid": uuid, "variant": variant},
+                )
+
+    async def _get_or_create(self, uuid: str, variant: ImageVariant) -> File:
+        derivative = await self._get(uuid, variant)
+        if derivative is not None and not derivative.is_removed_from_disk:
+            return derivative
+
+        source = await self.repo.get_by_id(uuid)
+        self._validate_source(source)
+        if derivative is not None:
+            # variant was evicted from disk, render it again in place
+            size = await self._resize(source, derivative.path, variant)
+            values = {"size": size, "is_removed_from_disk": False}
+            await self.repo.update(derivative, values=values)
+            for field, value in values.items():
+                setattr(derivative, field, value)
+            return derivative
+
+        path = str(Path(self.base_path, f"{random_string()}.{variant.ext}"))
+        size = await self._resize(source, path, variant)
+        try:
+            return await self._create(source, path, size, variant)
+        except IntegrityError:
+            # variant was created by another process meanwhile
+            await os.remove(path)
+            if (derivative := await self._get(uuid, variant)) is None:
+                raise
+            return derivative
+
+    async def _get(self, uuid: str, variant: ImageVariant) -> File | None:
+        result = await self.repo.get_by_filters(
+            filters=self.filter_seq_class(
+                mode.and_,
+                self.filter_class(File, "parent_uuid")(uuid),
+                self.filter_class(File, "variant")(variant.name),
+            ),
+            limit=1,
+        )
+        for row in result:
+            return row[0]
+        return None
+
+    def _validate_source(self, source: File) -> None:
+        if source.parent_uuid is not None:
+            raise Custom400Exception("File is a variant itself.")
+        if not source.format.startswith("image/"):
+            raise Custom400Exception("File is not an image.")
+        if source.is_removed_from_disk:
+            raise Custom400Exception("File is not available for processing.")
+
+    async def _resize(self, source: File, path: str, variant: ImageVariant) -> int:
+        loop = asyncio.get_running_loop()
+        try:
+            # decoding and resizing are cpu-bound,
+            # so they must never run on the event loop
+            return await loop.run_in_executor(
+                self.executor,
+                resize_image,
+                source.path,
+                path,
+                variant,
+            )
+        except Exception as e:
+            logger.error(
+                f"Error resizing image. - {str(e)}",
+                extra={"uuid": source.uuid, "variant": variant.name},
+            )
+            raise Custom400Exception("File can not be processed as an image.")
+
+    async def _create(
+        self,
+        source: File,
+        path: str,
+        size: int,
+        variant: ImageVariant,
+    ) -> File:
+        return await self.repo.create(
+            entry=CreateFileSchema(
+                uuid=str(uuid.uuid4()),
+                path=path,
+                size=size,
+                format=variant.content_type,
+                name=f"{PurePath(source.name).stem}_{variant.name}.{variant.ext}",
+                ext=variant.ext,
+                parent_uuid=source.uuid,
+                variant=variant.name,
+            ),
+        )
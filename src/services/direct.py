@@ -0,0 +1,249 @@
+import math
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path, PurePosixPath
+from typing import Tuple
+
+from botocore.exceptions import ClientError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.file import File
+from schemas.files import (
+    CompleteDirectUploadRequest,
+    CreateFileSchema,
+    DirectUpload,
+    DirectUploadRequest,
+    UploadedFile,
+)
+from services.interfaces import (
+    ICompleteDirectUpload,
+    IPresignDownload,
+    IStartDirectUpload,
+)
+from utils.decorators import session
+from utils.exceptions import Custom400Exception
+from utils.http import safe_filename
+from utils.random import random_string
+from utils.repo import IRepo
+from utils.s3 import S3ClientProvider, get_part_size
+from utils.time import get_current_time_with_delta
+
+# cached download url is valid at least that long, in seconds
+URL_MIN_LIFETIME: int = 30
+MAX_CACHED_URLS: int = 10000
+
+
+class StartDirectUpload(IStartDirectUpload):
+    def __init__(
+        self,
+        base_path: str,
+        max_bytes: int,
+        multipart_threshold: int,
+        multipart_part_size: int,
+        expiration: int,
+        s3: S3ClientProvider,
+        bucket: str,
+    ) -> None:
+        self.base_path = base_path
+        self.max_bytes = max_bytes
+        self.multipart_threshold = multipart_threshold
+        self.multipart_part_size = multipart_part_size
+        self.expiration = expiration
+        self.s3 = s3
+        self.bucket = bucket
+
+    async def __call__(self, request: DirectUploadRequest) -> DirectUpload:
+        if request.size > self.max_bytes:
+            raise Custom400Exception("Exceeded file limit.")
+
+        ext = request.name.split(".")[-1]
+        # key is chosen the same way as for files saved on disk,
+        # so all files are found in s3 by their path
+        key = str(Path(self.base_path, f"{random_string()}.{ext}")).strip("/")
+        expires_at = get_current_time_with_delta(seconds=self.expiration)
+        s3 = await self.s3()
+        if request.size < self.multipart_threshold:
+            url = await s3.generate_presigned_url(
+                "put_object",
+                Params={
+                    "Bucket": self.bucket,
+                    "Key": key,
+                    "ContentType": request.format,
+                    # signed, so the client can not upload more than declared
+                    "ContentLength": request.size,
+                },
+                ExpiresIn=self.expiration,
+            )
+            return DirectUpload(key=key, urls=[url], expires_at=expires_at)
+
+        part_size = get_part_size(request.size, self.multipart_part_size)
+        upload = await s3.create_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            ContentType=request.format,
+        )
+        urls = []
+        for number in range(1, math.ceil(request.size / part_size) + 1):
+            offset = (number - 1) * part_size
+            urls.append(
+                await s3.generate_presigned_url(
+                    "upload_part",
+                    Params={
+                        "Bucket": self.bucket,
+                        "Key": key,
+                        "UploadId": upload["UploadId"],
+                        "PartNumber": number,
+                        "ContentLength": min(part_size, request.size - offset),
+                    },
+                    ExpiresIn=self.expiration,
+                )
+            )
+        return DirectUpload(
+            key=key,
+            upload_id=upload["UploadId"],
+            part_size=part_size,
+            urls=urls,
+            expires_at=expires_at,
+        )
+
+
+class CompleteDirectUpload(ICompleteDirectUpload):
+    def __init__(
+        self,
+        base_path: str,
+        max_bytes: int,
+        s3: S3ClientProvider,
+        bucket: str,
+        repo: IRepo[File],
+    ) -> None:
+        self.base_path = base_path
+        self.max_bytes = max_bytes
+        self.s3 = s3
+        self.bucket = bucket
+        self.repo = repo
+
+    @session
+    async def __call__(
+        self,
+        upload: CompleteDirectUploadRequest,
+        *,
+        session: AsyncSession = None,
+    ) -> UploadedFile:
+        path = f"/{upload.key}"
+        await self._validate(upload, path, session)
+
+        s3 = await self.s3()
+        try:
+            if upload.upload_id is not None:
+                await s3.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=upload.key,
+                    UploadId=upload.upload_id,
+                    MultipartUpload={
+                        "Parts": [
+                            {"PartNumber": part.part_number, "ETag": part.etag}
+                            for part in sorted(
+                                upload.parts or (), key=lambda part: part.part_number
+                            )
+                        ]
+                    },
+                )
+            head = await s3.head_object(Bucket=self.bucket, Key=upload.key)
+        except ClientError:
+            raise Custom400Exception("Uploaded file is not found or incomplete.")
+        if head["ContentLength"] != upload.size or (
+            upload.etag is not None
+            and head["ETag"].strip('"') != upload.etag.strip('"')
+        ):
+            await s3.delete_object(Bucket=self.bucket, Key=upload.key)
+            raise Custom400Exception("Uploaded file does not match.")
+
+        try:
+            instance = await self.repo.create(
+                entry=CreateFileSchema(
+                    uuid=str(uuid.uuid4()),
+                    path=path,
+                    size=upload.size,
+                    format=upload.format,
+                    name=upload.name,
+                    ext=upload.name.split(".")[-1],
+                    # file lives in s3 only, it never touched the disk
+                    is_saved_to_s3=True,
+                    is_removed_from_disk=True,
+                ),
+                session=session,
+            )
+        except IntegrityError:
+            # same key was registered by a concurrent request meanwhile
+            raise Custom400Exception("File is already registered.")
+        return UploadedFile(
+            uuid=instance.uuid,
+            path=instance.path,
+            size=instance.size,
+            format=instance.format,
+            name=instance.name,
+            ext=instance.ext,
+            created_at=instance.created_at,
+            available_for_download=instance.is_removed_from_disk is False,
+        )
+
+    async def _validate(
+        self,
+        upload: CompleteDirectUploadRequest,
+        path: str,
+        session: AsyncSession,
+    ) -> None:
+        if upload.size > self.max_bytes:
+            raise Custom400Exception("Exceeded file limit.")
+        # only keys given out by the start endpoint may be registered
+        if PurePosixPath(path).parent != PurePosixPath(self.base_path):
+            raise Custom400Exception("Invalid key.")
+        if await self.repo.exists_by_field("path", path, session=session):
+            raise Custom400Exception("File is already registered.")
+
+
+class PresignDownload(IPresignDownload):
+    def __init__(
+        self,
+        enabled: bool,
+        expiration: int,
+        s3: S3ClientProvider,
+        bucket: str,
+    ) -> None:
+        self.enabled = enabled
+        self.expiration = expiration
+        self.s3 = s3
+        self.bucket = bucket
+        # oldest urls first
+        self.urls: OrderedDict[uuid.UUID, Tuple[str, float]] = OrderedDict()
+
+    async def __call__(self, file: File) -> str | None:
+        if not self.enabled or not file.is_saved_to_s3:
+            return None
+        now = time.monotonic()
+        cached = self.urls.get(file.uuid)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        url = await self._presign(file)
+        self.urls[file.uuid] = (url, now + self.expiration - URL_MIN_LIFETIME)
+        self.urls.move_to_end(file.uuid)
+        while len(self.urls) > MAX_CACHED_URLS:
+            self.urls.popitem(last=False)
+        return url
+
+    async def _presign(self, file: File) -> str:
+        s3 = await self.s3()
+        return await s3.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": file.path.strip("/"),
+                "ResponseContentType": "application/octet-stream",
+                "ResponseContentDisposition": (
+                    f'attachment; filename="{safe_filename(file.name)}"'
+                ),
+            },
+            ExpiresIn=self.expiration,
+        )
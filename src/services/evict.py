@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from typing import List, Sequence, Type
+
+from sqlalchemy import Row
+
+from models.file import File
+from repo.file import IFileRepo
+from schemas.clean import EvictionStats
+from services.interfaces import IEvictFromDisk
+from utils.file import DiskUsage, get_disk_usage, remove_files
+from utils.sqlalchemy import IFilter, IFilterSeq, mode, operator
+
+logger = logging.getLogger("cleanup")
+
+# least recently used first, or largest first, so fewer files are evicted
+ORDERS = ("lru", "size")
+
+
+class EvictFromDisk(IEvictFromDisk):
+    def __init__(
+        self,
+        path: str,
+        high_watermark: float,
+        low_watermark: float,
+        batch_size: int,
+        order: str,
+        repo: IFileRepo,
+        is_saved_to_s3_filter: IFilter[File],
+        is_removed_from_disk_filter: IFilter[File],
+        rehydrated_at_filter: IFilter[File],
+        filter_seq_class: Type[IFilterSeq],
+    ) -> None:
+        assert order in ORDERS, f"Unknown eviction order {order}."
+        self.path = path
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.batch_size = batch_size
+        self.order = order
+        self.repo = repo
+        self.is_saved_to_s3_filter = is_saved_to_s3_filter
+        self.is_removed_from_disk_filter = is_removed_from_disk_filter
+        self.rehydrated_at_filter = rehydrated_at_filter
+        self.filter_seq_class = filter_seq_class
+
+    async def is_needed(self) -> bool:
+        if not self.high_watermark:
+            return False
+        return (await self._get_usage()).ratio >= self.high_watermark
+
+    async def __call__(self) -> EvictionStats:
+        usage = await self._get_usage()
+        stats = EvictionStats(usage_before=round(usage.ratio, 4))
+        # computed once, usage may not drop after eviction: other data
+        # can fill the filesystem and files still open for downloads
+        # are freed only once closed. The next check evicts more if needed
+        excess = usage.used - int(self.low_watermark * usage.total)
+        while excess > 0:
+            batch = await self._get_files_for_eviction(excess)
+            if not batch:
+                logger.critical(
+                    "Disk is full of files not saved to s3.",
+                    extra={"usage": round(usage.ratio, 4)},
+                )
+                break
+            await self._evict(batch)
+            evicted = sum(file.size for file in batch)
+            stats.files += len(batch)
+            stats.bytes += evicted
+            excess -= evicted
+        stats.usage_after = round((await self._get_usage()).ratio, 4)
+        return stats
+
+    async def _get_usage(self) -> DiskUsage:
+        return await asyncio.to_thread(get_disk_usage, self.path)
+
+    async def _get_files_for_eviction(self, excess: int) -> List[Row]:
+        if self.order == "lru":
+            # accesses are kept apart from files, so they are joined
+            files = await self.repo.get_least_recently_used(self.batch_size)
+        else:
+            files = await self.repo.get_by_filters(
+                filters=self.filter_seq_class(
+                    mode.and_,
+                    # files not saved to s3 would be lost
+                    self.is_saved_to_s3_filter(True, operator.is_),
+                    self.is_removed_from_disk_filter(False, operator.is_),
+                    # files brought back from s3 are evicted by the disk cache
+                    self.rehydrated_at_filter(None, operator.is_),
+                ),
+                order_by=("-size",),
+                limit=self.batch_size,
+                columns=("uuid", "path", "size"),
+            )
+        # no more than needed to get below the low watermark
+        batch: List[Row] = []
+        for file in files:
+            batch.append(file)
+            excess -= file.size
+            if excess <= 0:
+                break
+        return batch
+
+    async def _evict(self, batch: Sequence[Row]) -> None:
+        # row is updated first, so nobody is sent to a missing file
+        await self.repo.multi_update(
+            [file.uuid for file in batch],
+            values={"is_removed_from_disk": True},
+        )
+        await asyncio.to_thread(remove_files, [file.path for file in batch])
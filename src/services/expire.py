@@ -0,0 +1,98 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import List, Sequence, Tuple
+from uuid import UUID
+
+from aiobotocore.client import AioBaseClient
+
+from repo.file import IFileRepo
+from schemas.clean import ExpiryStats
+from services.interfaces import IExpireFiles
+from utils.file import remove_files
+from utils.s3 import S3ClientProvider
+from utils.time import get_current_time
+
+logger = logging.getLogger("cleanup")
+
+# max number of keys of one DeleteObjects request
+S3_BATCH_SIZE: int = 1000
+
+
+class ExpireFiles(IExpireFiles):
+    def __init__(
+        self,
+        window: int,
+        batch_size: int,
+        s3: S3ClientProvider,
+        bucket: str,
+        repo: IFileRepo,
+    ) -> None:
+        self.window = timedelta(seconds=window)
+        self.batch_size = batch_size
+        self.s3 = s3
+        self.bucket = bucket
+        self.repo = repo
+
+    async def __call__(self) -> ExpiryStats:
+        stats = ExpiryStats()
+        # only files expiring within the window are kept in memory,
+        # the next run refills the heap from the index
+        heap: List[Tuple[datetime, UUID]] = [
+            (file.expires_at, file.uuid)
+            for file in await self.repo.get_expiring(
+                get_current_time() + self.window, self.batch_size
+            )
+        ]
+        heapq.heapify(heap)
+        while heap:
+            now = get_current_time()
+            if heap[0][0] > now:
+                await asyncio.sleep((heap[0][0] - now).total_seconds())
+                continue
+            due: List[UUID] = []
+            while heap and heap[0][0] <= now:
+                due.append(heapq.heappop(heap)[1])
+            await self._expire(due, now, stats)
+        return stats
+
+    async def _expire(
+        self,
+        uuids: Sequence[UUID],
+        now: datetime,
+        stats: ExpiryStats,
+    ) -> None:
+        # rows go first, so nobody is sent to a removed file
+        files = await self.repo.delete_expired(uuids, now)
+        await asyncio.to_thread(
+            remove_files,
+            [file.path for file in files if not file.is_removed_from_disk],
+        )
+        stats.files += len(files)
+        keys = [file.path.strip("/") for file in files if file.is_saved_to_s3]
+        if not keys:
+            return
+        s3 = await self.s3()
+        for start in range(0, len(keys), S3_BATCH_SIZE):
+            stats.objects += await self._delete(
+                s3, keys[start : start + S3_BATCH_SIZE]  # noqa: E203
+            )
+
+    async def _delete(self, s3: AioBaseClient, keys: List[str]) -> int:
+        try:
+            response = await s3.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+            )
+        except Exception as e:
+            # objects left behind are removed by s3 reconciliation
+            logger.error(f"Error deleting expired objects from s3. - {str(e)}")
+            return 0
+        errors = response.get("Errors", [])
+        for error in errors:
+            logger.error(
+                f"Error deleting an expired object from s3. - {error.get('Message')}",
+                extra={"key": error.get("Key")},
+            )
+        return len(keys) - len(errors)
@@ -1,27 +1,65 @@
+import asyncio
 import logging
+import math
+import os
+from typing import Any, AsyncGenerator, AsyncIterable, Awaitable, Callable, Dict, List
 
 import aiofiles
-from aioboto3 import Session
+from aiobotocore.client import AioBaseClient
+from aiobotocore.response import StreamingBody
+from botocore.exceptions import ClientError
 
 from models.file import File
-from services.interfaces import ISaveFileToExternalStorage
+from services.interfaces import (
+    ISaveFileToExternalStorage,
+    IStreamFileFromExternalStorage,
+)
+from utils.asyncio import AIMDLimiter, CircuitBreaker, CircuitOpenError, Hedger
+from utils.exceptions import (
+    Custom400Exception,
+    Custom404Exception,
+    Custom416Exception,
+    Custom503Exception,
+)
 from utils.repo import IRepo
+from utils.s3 import (
+    MB,
+    S3ClientProvider,
+    S3Object,
+    get_checksum,
+    get_part_size,
+    read_part,
+)
 
 logger = logging.getLogger("s3")
 
+CHUNK_SIZE: int = 64 * 1024
+
 
 class SaveFileToS3(ISaveFileToExternalStorage):
     def __init__(
         self,
         repo: IRepo[File],
-        boto3: Session,
-        endpoint_url: str,
+        s3: S3ClientProvider,
         bucket: str,
+        multipart_threshold: int,
+        multipart_part_size: int,
+        multipart_concurrency: int,
+        limiter: AIMDLimiter,
+        hedge: Hedger[Dict[str, Any]],
+        hedge_max_size: int,
+        breaker: CircuitBreaker,
     ) -> None:
         self.repo = repo
-        self.boto3 = boto3
-        self.endpoint_url = endpoint_url
+        self.s3 = s3
         self.bucket = bucket
+        self.multipart_threshold = multipart_threshold
+        self.multipart_part_size = multipart_part_size
+        self.multipart_concurrency = multipart_concurrency
+        self.limiter = limiter
+        self.hedge = hedge
+        self.hedge_max_size = hedge_max_size
+        self.breaker = breaker
 
     async def __call__(self, uuid: str) -> bool:
         file = await self._get_file(uuid)
@@ -35,14 +73,28 @@ class SaveFileToS3(ISaveFileToExternalStorage):
 
     async def _save_to_s3(self, file: File) -> bool:
         try:
-            async with self.boto3.client("s3", endpoint_url=self.endpoint_url) as s3:
-                async with aiofiles.open(file.path, "rb") as stream:
-                    await s3.upload_fileobj(
-                        stream,
-                        self.bucket,
-                        file.path.strip("/"),
-                    )
+            # fails fast while s3 is unhealthy,
+            # number of files uploaded at once adapts to s3 latency and throttling
+            async with self.breaker(), self.limiter(file.size / MB):
+                s3 = await self.s3()
+                # file is uploaded as it is stored on disk,
+                # so compressed files stay compressed in s3 too
+                if file.size >= self.multipart_threshold:
+                    await self._multipart_upload(s3, file)
+                elif self.hedge.enabled and file.size <= self.hedge_max_size:
+                    await self._hedged_upload(s3, file)
+                else:
+                    async with aiofiles.open(file.path, "rb") as stream:
+                        await s3.upload_fileobj(
+                            stream,
+                            self.bucket,
+                            file.path.strip("/"),
+                            **self._extra_args(file),
+                        )
             return True
+        except CircuitOpenError:
+            # not a failed attempt, the caller defers the file
+            raise
         except Exception as e:
             logger.critical(
                 f"Error saving a file to s3. - {str(e)}",
@@ -50,5 +102,285 @@ class SaveFileToS3(ISaveFileToExternalStorage):
             )
             return False
 
+    async def _hedged_upload(self, s3: AioBaseClient, file: File) -> None:
+        # content is in memory, so a duplicate put can be sent
+        # if the first one is slow, same content makes it idempotent
+        async with aiofiles.open(file.path, "rb") as stream:
+            data = await stream.read()
+        await self.hedge(
+            lambda: s3.put_object(
+                Bucket=self.bucket,
+                Key=file.path.strip("/"),
+                Body=data,
+                **self._content_args(file.encoding),
+            )
+        )
+
+    async def upload_stream(
+        self,
+        path: str,
+        chunks: AsyncIterable[bytes],
+        size: int,
+        encoding: str | None = None,
+    ) -> None:
+        async with self.breaker():
+            s3 = await self.s3()
+            part_size = get_part_size(size, self.multipart_part_size)
+            await self._multipart(
+                s3,
+                path.strip("/"),
+                encoding,
+                lambda key, upload_id: self._upload_chunks(
+                    s3, key, upload_id, chunks, part_size
+                ),
+            )
+
+    async def _multipart_upload(self, s3: AioBaseClient, file: File) -> None:
+        fd = await asyncio.to_thread(os.open, file.path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            part_size = get_part_size(size, self.multipart_part_size)
+            await self._multipart(
+                s3,
+                file.path.strip("/"),
+                file.encoding,
+                lambda key, upload_id: self._upload_parts(
+                    s3, key, upload_id, fd, size, part_size
+                ),
+            )
+        finally:
+            os.close(fd)
+
+    async def _multipart(
+        self,
+        s3: AioBaseClient,
+        key: str,
+        encoding: str | None,
+        upload_parts: Callable[[str, str], Awaitable[List[Dict[str, Any]]]],
+    ) -> None:
+        upload = await s3.create_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            ChecksumAlgorithm="SHA256",
+            **self._content_args(encoding),
+        )
+        try:
+            try:
+                parts = await upload_parts(key, upload["UploadId"])
+            except ExceptionGroup as group:
+                # the first error is the cause, the rest are consequences
+                raise group.exceptions[0]
+            await s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload["UploadId"],
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            # uploaded parts are billed until the upload is aborted
+            await s3.abort_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload["UploadId"],
+            )
+            raise
+
+    async def _upload_parts(
+        self,
+        s3: AioBaseClient,
+        key: str,
+        upload_id: str,
+        fd: int,
+        size: int,
+        part_size: int,
+    ) -> List[Dict[str, Any]]:
+        # parts are read inside the semaphore,
+        # so at most `multipart_concurrency` parts are in memory
+        semaphore = asyncio.Semaphore(self.multipart_concurrency)
+
+        async def upload_part(number: int, offset: int) -> Dict[str, Any]:
+            async with semaphore:
+                data, checksum = await asyncio.to_thread(
+                    read_part, fd, offset, part_size
+                )
+                return await self._upload_part(
+                    s3, key, upload_id, number, data, checksum
+                )
+
+        async with asyncio.TaskGroup() as group:
+            tasks = [
+                group.create_task(upload_part(number, offset))
+                for number, offset in enumerate(range(0, size or 1, part_size), 1)
+            ]
+        return [task.result() for task in tasks]
+
+    async def _upload_chunks(
+        self,
+        s3: AioBaseClient,
+        key: str,
+        upload_id: str,
+        chunks: AsyncIterable[bytes],
+        part_size: int,
+    ) -> List[Dict[str, Any]]:
+        # parts are uploaded while next chunks are still coming,
+        # producer waits when `multipart_concurrency` parts are in flight
+        semaphore = asyncio.Semaphore(self.multipart_concurrency)
+        tasks: List[asyncio.Task[Dict[str, Any]]] = []
+
+        async def upload_part(number: int, data: bytes) -> Dict[str, Any]:
+            try:
+                checksum = await asyncio.to_thread(get_checksum, data)
+                return await self._upload_part(
+                    s3, key, upload_id, number, data, checksum
+                )
+            finally:
+                semaphore.release()
+
+        async with asyncio.TaskGroup() as group:
+            buffer = bytearray()
+            async for chunk in chunks:
+                buffer += chunk
+                while len(buffer) >= part_size:
+                    await semaphore.acquire()
+                    data = bytes(buffer[:part_size])
+                    del buffer[:part_size]
+                    tasks.append(group.create_task(upload_part(len(tasks) + 1, data)))
+            if buffer or not tasks:
+                await semaphore.acquire()
+                tasks.append(
+                    group.create_task(upload_part(len(tasks) + 1, bytes(buffer)))
+                )
+        return [task.result() for task in tasks]
+
+    async def _upload_part(
+        self,
+        s3: AioBaseClient,
+        key: str,
+        upload_id: str,
+        number: int,
+        data: bytes,
+        checksum: str,
+    ) -> Dict[str, Any]:
+        response = await s3.upload_part(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=data,
+            ChecksumAlgorithm="SHA256",
+            ChecksumSHA256=checksum,
+        )
+        return {
+            "PartNumber": number,
+            "ETag": response["ETag"],
+            "ChecksumSHA256": checksum,
+        }
+
+    def _content_args(self, encoding: str | None) -> Dict[str, Any]:
+        if not encoding:
+            return {}
+        return {"ContentEncoding": encoding}
+
+    def _extra_args(self, file: File) -> Dict[str, Any]:
+        if not file.encoding:
+            return {}
+        return {"ExtraArgs": self._content_args(file.encoding)}
+
     async def _update_file(self, file: File) -> None:
         await self.repo.update(file, values={"is_saved_to_s3": True})
+
+
+class StreamFileFromS3(IStreamFileFromExternalStorage):
+    def __init__(
+        self,
+        s3: S3ClientProvider,
+        bucket: str,
+        max_streams: int,
+        wait_timeout: float,
+        hedge: Hedger[Dict[str, Any]],
+    ) -> None:
+        self.s3 = s3
+        self.bucket = bucket
+        self.wait_timeout = wait_timeout
+        self.hedge = hedge
+        self.semaphore = asyncio.Semaphore(max_streams)
+
+    async def __call__(self, file: File, range: str | None = None) -> S3Object:
+        if not file.is_saved_to_s3:
+            raise Custom400Exception("File is not available for download.")
+        await self._acquire()
+        try:
+            response = await self._get_object(file, range)
+        except BaseException:
+            self.semaphore.release()
+            raise
+        chunks = self._chunks(response["Body"])
+        # first chunk is awaited here, so the generator is started
+        # and releases the slot even if the response is never sent
+        first = await anext(chunks, b"")
+        return S3Object(
+            status_code=response["ResponseMetadata"]["HTTPStatusCode"],
+            headers=self._headers(response),
+            chunks=_prepend(first, chunks),
+        )
+
+    async def _acquire(self) -> None:
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.wait_timeout)
+        except TimeoutError:
+            raise Custom503Exception(
+                "Too many downloads in progress, try again later.",
+                headers={"Retry-After": str(math.ceil(self.wait_timeout))},
+            )
+
+    async def _get_object(self, file: File, range: str | None) -> Dict[str, Any]:
+        s3 = await self.s3()
+        try:
+            return await self.hedge(
+                lambda: s3.get_object(
+                    Bucket=self.bucket,
+                    Key=file.path.strip("/"),
+                    **({"Range": range} if range else {}),
+                )
+            )
+        except ClientError as e:
+            error = e.response.get("Error", {})
+            if error.get("Code") == "InvalidRange":
+                size = error.get("ActualObjectSize")
+                raise Custom416Exception(
+                    "Requested range is not satisfiable.",
+                    headers={"Content-Range": f"bytes */{size}"} if size else None,
+                )
+            if error.get("Code") in ("NoSuchKey", "404"):
+                raise Custom404Exception("File is not available for download.")
+            raise
+
+    async def _chunks(self, body: StreamingBody) -> AsyncGenerator[bytes, None]:
+        try:
+            async for chunk in body.iter_chunks(CHUNK_SIZE):
+                yield chunk
+        finally:
+            # unread body can not go back to the pool, connection is dropped
+            body.close()
+            self.semaphore.release()
+
+    def _headers(self, response: Dict[str, Any]) -> Dict[str, str]:
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(response["ContentLength"]),
+        }
+        if "ContentRange" in response:
+            headers["Content-Range"] = response["ContentRange"]
+        if "ETag" in response:
+            headers["ETag"] = response["ETag"]
+        return headers
+
+
+async def _prepend(
+    first: bytes,
+    chunks: AsyncIterable[bytes],
+) -> AsyncGenerator[bytes, None]:
+    if first:
+        yield first
+    async for chunk in chunks:
+        yield chunk
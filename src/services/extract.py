@@ -1,7 +1,19 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Any, Dict
+from uuid import UUID
+
 from fastapi import UploadFile
 
-from services.interfaces import IExtractMetadata
+from models.file import File
 from schemas.files import FileMetadata
+from services.interfaces import IExtractAttributes, IExtractMetadata
+from utils.asyncio import SingleFlight
+from utils.attributes import extract_attributes
+from utils.repo import IRepo
+
+logger = logging.getLogger("extract")
 
 
 class ExtractMetadata(IExtractMetadata):
@@ -12,3 +24,46 @@ class ExtractMetadata(IExtractMetadata):
             name=file.filename,
             ext=file.filename.split(".")[-1],
         )
+
+
+class ExtractAttributes(IExtractAttributes):
+    def __init__(self, repo: IRepo[File], executor: Executor) -> None:
+        self.repo = repo
+        self.executor = executor
+        self._single_flight: SingleFlight[Dict[str, Any] | None] = SingleFlight()
+
+    async def __call__(self, file: File) -> Dict[str, Any] | None:
+        if file.attributes is not None or file.is_removed_from_disk:
+            return file.attributes
+        # background extraction and the first read may race,
+        # the file is read only once either way
+        return await self._single_flight(str(file.uuid), lambda: self._extract(file))
+
+    async def extract(self, uuid: str | UUID) -> None:
+        try:
+            await self(await self.repo.get_by_id(uuid))
+        except Exception as e:
+            logger.error(
+                f"Error extracting file attributes. - {str(e)}",
+                extra={"uuid": uuid},
+            )
+
+    async def _extract(self, file: File) -> Dict[str, Any] | None:
+        loop = asyncio.get_running_loop()
+        try:
+            attributes = await loop.run_in_executor(
+                self.executor,
+                extract_attributes,
+                file.path,
+                file.encoding,
+            )
+        except OSError as e:
+            # file is gone from disk, nothing to extract from
+            logger.warning(
+                f"Error reading file for attributes. - {str(e)}",
+                extra={"uuid": file.uuid},
+            )
+            return None
+        await self.repo.update(file, values={"attributes": attributes})
+        file.attributes = attributes
+        return attributes
@@ -1,15 +1,50 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Type,
+)
+from uuid import UUID
 
-from boto3 import Session
 from fastapi import UploadFile
+from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.file import File
-from schemas.files import FileMetadata, UploadedFile
+from repo.access import IFileAccessRepo
+from repo.file import IFileRepo
+from repo.schedule import IScheduledJobRepo
+from repo.sync import ISyncJobRepo
+from schemas.clean import (
+    CleanupStats,
+    DiskReconcileStats,
+    EvictionStats,
+    ExpiryStats,
+    PlacementStats,
+)
+from schemas.files import (
+    ArchiveQuery,
+    CompleteDirectUploadRequest,
+    CreateFileSchema,
+    DirectUpload,
+    DirectUploadRequest,
+    FileMetadata,
+    UploadedFile,
+)
+from schemas.sync import ReconcileStats, SyncStats
+from utils.asyncio import AIMDLimiter, CircuitBreaker, Hedger
+from utils.image import ImageVariant
 from utils.repo import IRepo
-from utils.sqlalchemy import IFilter
+from utils.s3 import S3ClientProvider, S3Object
+from utils.sqlalchemy import IFilter, IFilterSeq
 
 
 class ICreateFile(ABC):
@@ -17,14 +52,30 @@ class ICreateFile(ABC):
     def __init__(
         self,
         base_path: str,
+        max_bytes: int,
+        compression_enabled: bool,
+        compression_min_size: int,
         repo: IRepo[File],
+        sync_repo: ISyncJobRepo,
+        save_to_s3: ISaveFileToExternalStorage,
         extract_metadata: IExtractMetadata,
     ) -> None:
         """
         :param base_path: base path for all files
         :type base_path: str
+        :param max_bytes: max size of a file in bytes
+        :type max_bytes: int
+        :param compression_enabled: flag whether compressible files
+            should be stored compressed
+        :type compression_enabled: bool
+        :param compression_min_size: min size in bytes of a file to compress
+        :type compression_min_size: int
         :param repo: file repository
         :type repo: IRepo[File]
+        :param sync_repo: s3 sync job repository
+        :type sync_repo: ISyncJobRepo
+        :param save_to_s3: s3 storage service for durable uploads
+        :type save_to_s3: ISaveFileToExternalStorage
         :param extract_metadata: metadata extractor
         :type extract_metadata: IExtractMetadata
         """
@@ -35,11 +86,18 @@ class ICreateFile(ABC):
         self,
         file: UploadFile,
         *,
+        durable: bool = False,
+        ttl: int | None = None,
         session: AsyncSession = None,
     ) -> UploadedFile:
         """
         :param file: file to create
         :type file: UploadFile
+        :param durable: flag whether file is uploaded to s3 while
+            it is written to disk, instead of syncing it later, defaults to False
+        :type durable: bool, optional
+        :param ttl: seconds after which file is removed, defaults to None
+        :type ttl: int | None, optional
         :param session: database session, defaults to None
         :type session: AsyncSession, optional
         :return: uploaded file data
@@ -47,6 +105,29 @@ class ICreateFile(ABC):
         """
         ...
 
+    @abstractmethod
+    async def write(
+        self,
+        file: UploadFile,
+        *,
+        durable: bool = False,
+        ttl: int | None = None,
+    ) -> CreateFileSchema:
+        """
+        Validate file and write it to disk without creating a row
+
+        :param file: file to write
+        :type file: UploadFile
+        :param durable: flag whether file is uploaded to s3 too, defaults to False
+        :type durable: bool, optional
+        :param ttl: seconds after which file is removed, defaults to None
+        :type ttl: int | None, optional
+        :raises Custom503Exception: durable upload to s3 failed
+        :return: data of the row to create
+        :rtype: CreateFileSchema
+        """
+        ...
+
 
 class IExtractMetadata(ABC):
     @abstractmethod
@@ -60,24 +141,77 @@ class IExtractMetadata(ABC):
         ...
 
 
+class IExtractAttributes(ABC):
+    @abstractmethod
+    def __init__(self, repo: IRepo[File], executor: Executor) -> None:
+        """
+        :param repo: file repository
+        :type repo: IRepo[File]
+        :param executor: executor for blocking file reads
+        :type executor: Executor
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self, file: File) -> Dict[str, Any] | None:
+        """
+        Get attributes of a file, extracting and saving them if needed
+
+        :param file: file to get attributes of
+        :type file: File
+        :return: file attributes, None if file is not available on disk
+        :rtype: Dict[str, Any] | None
+        """
+        ...
+
+    @abstractmethod
+    async def extract(self, uuid: str | UUID) -> None:
+        """
+        Extract and save attributes of an uploaded file, errors are logged
+
+        :param uuid: uuid of the file
+        :type uuid: str | UUID
+        """
+        ...
+
+
 class ISaveFileToExternalStorage(ABC):
     @abstractmethod
     def __init__(
         self,
         repo: IRepo[File],
-        boto3: Session,
-        endpoint_url: str,
+        s3: S3ClientProvider,
         bucket: str,
+        multipart_threshold: int,
+        multipart_part_size: int,
+        multipart_concurrency: int,
+        limiter: AIMDLimiter,
+        hedge: Hedger[Dict[str, Any]],
+        hedge_max_size: int,
+        breaker: CircuitBreaker,
     ) -> None:
         """
         :param repo: file repository
         :type repo: IRepo[File]
-        :param boto3: boto3 initialized session
-        :type boto3: Session
-        :param endpoint_url: bucket endpoint url
-        :type endpoint_url: str
+        :param s3: provider of the shared s3 client
+        :type s3: S3ClientProvider
         :param bucket: bucket name
         :type bucket: str
+        :param multipart_threshold: min file size in bytes for multipart upload
+        :type multipart_threshold: int
+        :param multipart_part_size: min part size in bytes,
+            bigger files get bigger parts
+        :type multipart_part_size: int
+        :param multipart_concurrency: number of parts uploaded concurrently
+        :type multipart_concurrency: int
+        :param limiter: adaptive limit of files synced at once
+        :type limiter: AIMDLimiter
+        :param hedge: hedging of small puts
+        :type hedge: Hedger[Dict[str, Any]]
+        :param hedge_max_size: max size in bytes of a file uploaded with hedging
+        :type hedge_max_size: int
+        :param breaker: circuit breaker failing uploads fast while s3 is down
+        :type breaker: CircuitBreaker
         """
         ...
 
@@ -86,11 +220,322 @@ class ISaveFileToExternalStorage(ABC):
         """
         :param uuid: uuid of a file
         :type uuid: str
+        :raises CircuitOpenError: s3 is unavailable, file is not sent
         :return: flat whether file is saved to s3 or not
         :rtype: bool
         """
         ...
 
+    @abstractmethod
+    async def upload_stream(
+        self,
+        path: str,
+        chunks: AsyncIterable[bytes],
+        size: int,
+        encoding: str | None = None,
+    ) -> None:
+        """
+        Upload file to s3 while its content is still being received
+
+        :param path: path of the file on disk, used as a key
+        :type path: str
+        :param chunks: file content
+        :type chunks: AsyncIterable[bytes]
+        :param size: expected file size in bytes, to choose part size
+        :type size: int
+        :param encoding: content encoding of the file, defaults to None
+        :type encoding: str | None, optional
+        """
+        ...
+
+
+class IStreamFileFromExternalStorage(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        s3: S3ClientProvider,
+        bucket: str,
+        max_streams: int,
+        wait_timeout: float,
+        hedge: Hedger[Dict[str, Any]],
+    ) -> None:
+        """
+        :param s3: provider of the shared s3 client
+        :type s3: S3ClientProvider
+        :param bucket: bucket name
+        :type bucket: str
+        :param max_streams: max number of concurrent streams from s3
+        :type max_streams: int
+        :param wait_timeout: seconds to wait for a free stream
+        :type wait_timeout: float
+        :param hedge: hedging of gets
+        :type hedge: Hedger[Dict[str, Any]]
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self, file: File, range: str | None = None) -> S3Object:
+        """
+        Stream file from s3 as it arrives, range is passed to s3 as is
+
+        :param file: file saved to s3
+        :type file: File
+        :param range: value of Range header, defaults to None
+        :type range: str | None, optional
+        :raises Custom400Exception: file is not saved to s3
+        :raises Custom404Exception: file is missing in s3
+        :raises Custom416Exception: range is not satisfiable
+        :raises Custom503Exception: no free stream in time
+        :return: response status, headers and content
+        :rtype: S3Object
+        """
+        ...
+
+
+class IDiskCache(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        max_bytes: int,
+        max_object_bytes: int,
+        part_size: int,
+        concurrency: int,
+        s3: S3ClientProvider,
+        bucket: str,
+        repo: IFileRepo,
+        rehydrated_at_filter: IFilter[File],
+        is_removed_from_disk_filter: IFilter[File],
+        filter_seq_class: Type[IFilterSeq],
+        hedge: Hedger[Dict[str, Any]],
+    ) -> None:
+        """
+        :param max_bytes: disk budget for rehydrated files in bytes,
+            shared by all processes, 0 disables the cache
+        :type max_bytes: int
+        :param max_object_bytes: max size of a rehydrated file in bytes
+        :type max_object_bytes: int
+        :param part_size: size of a ranged get in bytes
+        :type part_size: int
+        :param concurrency: number of ranged gets of one file in parallel
+        :type concurrency: int
+        :param s3: provider of the shared s3 client
+        :type s3: S3ClientProvider
+        :param bucket: bucket name
+        :type bucket: str
+        :param repo: file repository
+        :type repo: IFileRepo
+        :param rehydrated_at_filter: filter by rehydration time
+        :type rehydrated_at_filter: IFilter[File]
+        :param is_removed_from_disk_filter: filter by removal from disk
+        :type is_removed_from_disk_filter: IFilter[File]
+        :param filter_seq_class: filter sequence class
+        :type filter_seq_class: Type[IFilterSeq]
+        :param hedge: hedging of ranged gets
+        :type hedge: Hedger[Dict[str, Any]]
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self, file: File) -> File:
+        """
+        Bring file removed from disk back from s3, earliest rehydrated
+        files are removed from disk to stay within the budget.
+        Downloads the whole file, so it is meant for background jobs,
+        requests use `warm`
+
+        :param file: file to read
+        :type file: File
+        :return: same file, `is_removed_from_disk` is reset if it was rehydrated
+        :rtype: File
+        """
+        ...
+
+    @abstractmethod
+    def warm(self, file: File) -> None:
+        """
+        Start bringing file removed from disk back from s3 in background,
+        so the next reads are served from disk. Concurrent calls for
+        the same file share one download
+
+        :param file: file being read from s3
+        :type file: File
+        """
+        ...
+
+
+class ISyncFiles(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        repo: ISyncJobRepo,
+        save_to_s3: ISaveFileToExternalStorage,
+        max_workers: int,
+        max_attempts: int,
+        backoff: int,
+        max_backoff: int,
+        lease: int,
+        poll_interval: int,
+        limiter: AIMDLimiter,
+        breaker: CircuitBreaker,
+        stats_interval: int,
+    ) -> None:
+        """
+        :param repo: sync job repository
+        :type repo: ISyncJobRepo
+        :param save_to_s3: service that saves one file
+        :type save_to_s3: ISaveFileToExternalStorage
+        :param max_workers: number of workers, max number of concurrent syncs
+        :type max_workers: int
+        :param max_attempts: attempts before a job is left until the next sweep
+        :type max_attempts: int
+        :param backoff: delay in seconds before the first retry,
+            doubled on every next one
+        :type backoff: int
+        :param max_backoff: max delay in seconds between retries
+        :type max_backoff: int
+        :param lease: seconds a claimed job is hidden from other workers
+        :type lease: int
+        :param poll_interval: seconds between polls of an empty queue
+        :type poll_interval: int
+        :param limiter: adaptive limit of concurrent syncs, shared with save_to_s3
+        :type limiter: AIMDLimiter
+        :param breaker: circuit breaker shared with save_to_s3,
+            jobs are not claimed while it is open and one job is claimed
+            to probe s3, jobs rejected by it are deferred without an attempt
+        :type breaker: CircuitBreaker
+        :param stats_interval: seconds between stats log records
+        :type stats_interval: int
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self) -> None:
+        """
+        Sweep unsynced files and process the queue until cancelled
+        """
+        ...
+
+    @abstractmethod
+    async def sweep(self) -> None:
+        """
+        Queue unsynced files without a job and revive exhausted jobs
+        """
+        ...
+
+    @abstractmethod
+    async def stats(self) -> SyncStats:
+        """
+        Current concurrency limit, syncs in flight and waiting for a slot,
+        circuit state and the number of queued jobs
+
+        :return: stats of this process
+        :rtype: SyncStats
+        """
+        ...
+
+    @abstractmethod
+    def notify(self) -> None:
+        """
+        Wake up idle workers of this process, new jobs were queued
+        """
+        ...
+
+    @abstractmethod
+    async def process(self) -> bool:
+        """
+        Claim and process one due job
+
+        :return: flag whether there was a job to process
+        :rtype: bool
+        """
+        ...
+
+
+class IReconcileExternalStorage(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        prefix: str,
+        page_size: int,
+        orphan_age: int,
+        s3: S3ClientProvider,
+        bucket: str,
+        repo: IFileRepo,
+        sync_repo: ISyncJobRepo,
+    ) -> None:
+        """
+        :param prefix: prefix of keys of the service in the bucket
+        :type prefix: str
+        :param page_size: number of files read from db at once
+        :type page_size: int
+        :param orphan_age: seconds after which an object without a file is deleted,
+            so objects of direct uploads in progress are kept
+        :type orphan_age: int
+        :param s3: s3 client provider
+        :type s3: S3ClientProvider
+        :param bucket: s3 bucket name
+        :type bucket: str
+        :param repo: file repository
+        :type repo: IFileRepo
+        :param sync_repo: sync job repository, missing objects are queued
+        :type sync_repo: ISyncJobRepo
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self) -> ReconcileStats:
+        """
+        Compare bucket listing with files, queue files missing
+        from the bucket for sync and delete objects without files
+
+        :return: numbers of compared and fixed entries
+        :rtype: ReconcileStats
+        """
+        ...
+
+
+class IReconcileDisk(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        base_path: str,
+        max_entries: int,
+        page_size: int,
+        orphan_age: int,
+        quarantine: str,
+        repo: IFileRepo,
+    ) -> None:
+        """
+        :param base_path: directory files are stored in
+        :type base_path: str
+        :param max_entries: max number of directory entries compared in one run,
+            the next run continues after the last of them
+        :type max_entries: int
+        :param page_size: number of files read from db at once
+        :type page_size: int
+        :param orphan_age: seconds after which an entry without a file is removed,
+            so files of uploads in progress are kept
+        :type orphan_age: int
+        :param quarantine: directory orphans are moved to,
+            empty string to delete them
+        :type quarantine: str
+        :param repo: file repository
+        :type repo: IFileRepo
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self) -> DiskReconcileStats:
+        """
+        Compare a slice of directory entries with files, flag files
+        missing from disk as removed from it and move aside entries
+        without files
+
+        :return: numbers of compared and fixed entries
+        :rtype: DiskReconcileStats
+        """
+        ...
+
 
 class ICleanDisk(ABC):
     @abstractmethod
@@ -98,28 +543,585 @@ class ICleanDisk(ABC):
         self,
         max_days: int,
         max_days_unused: int,
+        batch_size: int,
+        max_workers: int,
         repo: IRepo[File],
+        access_repo: IFileAccessRepo,
+        uuid_filter: IFilter[File],
         created_at_filter: IFilter[File],
         updated_at_filter: IFilter[File],
         is_removed_from_disk_filter: IFilter[File],
+        rehydrated_at_filter: IFilter[File],
     ) -> None:
         """
         :param max_days: max number of days that
             file can be keeped on disk after creation
         :type max_days: int
         :param max_days_unused: max number of days
-            that file can be keeped on disk after last update
+            that file can be keeped on disk after last update or access
         :type max_days_unused: int
+        :param batch_size: number of files removed and updated at once
+        :type batch_size: int
+        :param max_workers: number of batches processed concurrently
+        :type max_workers: int
         :param repo: file repository
         :type repo: IRepo[File]
+        :param access_repo: file access repository,
+            recently accessed files are kept until max_days
+        :type access_repo: IFileAccessRepo
+        :param uuid_filter: filter by uuid, used for keyset pagination
+        :type uuid_filter: IFilter[File]
         :param created_at_filter: _description_
         :type created_at_filter: IFilter[File]
         :param updated_at_filter: _description_
         :type updated_at_filter: IFilter[File]
         :param is_removed_from_disk_filter: _description_
         :type is_removed_from_disk_filter: IFilter[File]
+        :param rehydrated_at_filter: filter by rehydration time,
+            rehydrated files are left to the disk cache
+        :type rehydrated_at_filter: IFilter[File]
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self) -> CleanupStats:
+        """
+        Remove expired files from disk batch by batch
+
+        :return: numbers of checked, removed, missing
+            and kept because of recent access files
+        :rtype: CleanupStats
+        """
+        ...
+
+
+class IEvictFromDisk(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        path: str,
+        high_watermark: float,
+        low_watermark: float,
+        batch_size: int,
+        order: str,
+        repo: IFileRepo,
+        is_saved_to_s3_filter: IFilter[File],
+        is_removed_from_disk_filter: IFilter[File],
+        rehydrated_at_filter: IFilter[File],
+        filter_seq_class: Type[IFilterSeq],
+    ) -> None:
+        """
+        :param path: path on the filesystem files are stored on
+        :type path: str
+        :param high_watermark: share of used disk space eviction starts at,
+            0 disables eviction
+        :type high_watermark: float
+        :param low_watermark: share of used disk space eviction stops at
+        :type low_watermark: float
+        :param batch_size: max number of files evicted at once
+        :type batch_size: int
+        :param order: `lru` to evict files least recently accessed
+            or updated first, `size` to evict largest files first
+        :type order: str
+        :param repo: file repository
+        :type repo: IFileRepo
+        :param is_saved_to_s3_filter: filter by s3 flag,
+            only files saved to s3 are evicted
+        :type is_saved_to_s3_filter: IFilter[File]
+        :param is_removed_from_disk_filter: filter by disk flag
+        :type is_removed_from_disk_filter: IFilter[File]
+        :param rehydrated_at_filter: filter by rehydration time,
+            rehydrated files are left to the disk cache
+        :type rehydrated_at_filter: IFilter[File]
+        :param filter_seq_class: filter sequence class
+        :type filter_seq_class: Type[IFilterSeq]
+        """
+        ...
+
+    @abstractmethod
+    async def is_needed(self) -> bool:
+        """
+        Check whether disk usage is above the high watermark
+
+        :return: flag whether files have to be evicted
+        :rtype: bool
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self) -> EvictionStats:
+        """
+        Evict files saved to s3 from disk, as many bytes as usage
+        is above the low watermark when the run starts
+
+        :return: number of evicted files and bytes, usage before and after
+        :rtype: EvictionStats
+        """
+        ...
+
+
+class IExpireFiles(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        window: int,
+        batch_size: int,
+        s3: S3ClientProvider,
+        bucket: str,
+        repo: IFileRepo,
+    ) -> None:
+        """
+        :param window: seconds ahead files expiring in are loaded for
+        :type window: int
+        :param batch_size: max number of files loaded for a window
+        :type batch_size: int
+        :param s3: provider of the shared s3 client
+        :type s3: S3ClientProvider
+        :param bucket: bucket name
+        :type bucket: str
+        :param repo: file repository
+        :type repo: IFileRepo
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self) -> ExpiryStats:
+        """
+        Load files expiring within the window and remove each of them
+        from db, disk and s3 at its deadline. Returns once all of them
+        are removed
+
+        :return: numbers of removed files and s3 objects
+        :rtype: ExpiryStats
+        """
+        ...
+
+
+class IPlaceFiles(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        half_life: int,
+        demote_below: float,
+        promote_above: float,
+        min_age: int,
+        batch_size: int,
+        max_promotions: int,
+        repo: IFileRepo,
+        disk_cache: IDiskCache,
+    ) -> None:
+        """
+        :param half_life: seconds after which a download counts half,
+            same as the one heat is tracked with
+        :type half_life: int
+        :param demote_below: decayed number of downloads below which
+            a file saved to s3 is removed from disk, 0 disables demotion
+        :type demote_below: float
+        :param promote_above: decayed number of downloads above which
+            a file is brought back from s3, 0 disables promotion
+        :type promote_above: float
+        :param min_age: seconds after upload during which a file is not demoted
+        :type min_age: int
+        :param batch_size: number of files demoted at once
+        :type batch_size: int
+        :param max_promotions: max number of files promoted in one run
+        :type max_promotions: int
+        :param repo: file repository
+        :type repo: IFileRepo
+        :param disk_cache: disk cache promoted files are brought back by
+        :type disk_cache: IDiskCache
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self) -> PlacementStats:
+        """
+        Remove cold files from disk and bring hot ones back from s3
+
+        :return: numbers of demoted and promoted files
+        :rtype: PlacementStats
+        """
+        ...
+
+
+class ITrackAccess(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        flush_interval: int,
+        max_pending: int,
+        half_life: int,
+        repo: IFileAccessRepo,
+    ) -> None:
+        """
+        :param flush_interval: seconds between writes of aggregated accesses
+        :type flush_interval: int
+        :param max_pending: number of accessed files that triggers
+            an early write, accesses of a failed write are dropped above it
+        :type max_pending: int
+        :param half_life: seconds after which a download counts half
+            towards the heat of a file
+        :type half_life: int
+        :param repo: file access repository
+        :type repo: IFileAccessRepo
         """
         ...
 
     @abstractmethod
-    async def __call__(self) -> None: ...
+    def read(self, uuid: UUID) -> None:
+        """
+        Record read of file info in memory
+
+        :param uuid: file uuid
+        :type uuid: UUID
+        """
+        ...
+
+    @abstractmethod
+    def download(self, uuid: UUID) -> None:
+        """
+        Record download of a file in memory
+
+        :param uuid: file uuid
+        :type uuid: UUID
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self) -> None:
+        """
+        Write aggregated accesses to db periodically, until cancelled.
+        Pending accesses are written on cancellation
+        """
+        ...
+
+    @abstractmethod
+    async def flush(self) -> int:
+        """
+        Write accesses recorded since the last flush to db in batches
+
+        :return: number of recorded files
+        :rtype: int
+        """
+        ...
+
+
+class IRunScheduled(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        name: str,
+        every: int,
+        poll_interval: int,
+        lease: int,
+        repo: IScheduledJobRepo,
+        job: Callable[[], Awaitable[BaseModel]],
+        is_due: Callable[[], Awaitable[bool]] | None = None,
+    ) -> None:
+        """
+        :param name: job name, unique across the cluster
+        :type name: str
+        :param every: min seconds between starts of the job across the cluster
+        :type every: int
+        :param poll_interval: average seconds between checks if the job is due
+        :type poll_interval: int
+        :param lease: seconds the job is not run by others,
+            renewed while the job is running
+        :type lease: int
+        :param repo: scheduled job repository
+        :type repo: IScheduledJobRepo
+        :param job: job to run, its result is recorded
+        :type job: Callable[[], Awaitable[BaseModel]]
+        :param is_due: additional check whether the job has to be run,
+            defaults to None
+        :type is_due: Callable[[], Awaitable[bool]] | None, optional
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self) -> None:
+        """
+        Run the job when it is due and nobody else runs it, until cancelled
+        """
+        ...
+
+    @abstractmethod
+    async def run_once(self, force: bool = False) -> bool:
+        """
+        Run the job if it is due and nobody else runs it
+
+        :param force: run the job even if it is not due yet, defaults to False
+        :type force: bool, optional
+        :raises LeaseLostError: lease was lost during the run, the job is cancelled
+        :return: flag whether the job was run
+        :rtype: bool
+        """
+        ...
+
+
+class IStreamArchive(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        max_files: int,
+        repo: IRepo[File],
+        filter_class: Type[IFilter],
+        filter_seq_class: Type[IFilterSeq],
+        stream_from_s3: IStreamFileFromExternalStorage,
+    ) -> None:
+        """
+        :param max_files: max number of files in one archive
+        :type max_files: int
+        :param repo: file repository
+        :type repo: IRepo[File]
+        :param filter_class: filter class to select files
+        :type filter_class: Type[IFilter]
+        :param filter_seq_class: filter sequence class
+        :type filter_seq_class: Type[IFilterSeq]
+        :param stream_from_s3: streaming of files removed from disk
+        :type stream_from_s3: IStreamFileFromExternalStorage
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self, query: ArchiveQuery) -> AsyncIterator[bytes]:
+        """
+        :param query: files selection
+        :type query: ArchiveQuery
+        :raises Custom404Exception: no files were found or some of
+            requested files are not available
+        :raises Custom400Exception: too many files were found
+        :return: zip archive stream, built on the fly
+        :rtype: AsyncIterator[bytes]
+        """
+        ...
+
+
+class IImportArchive(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        max_files: int,
+        max_bytes: int,
+        max_workers: int,
+        create_file: ICreateFile,
+        repo: IRepo[File],
+        sync_repo: ISyncJobRepo,
+    ) -> None:
+        """
+        :param max_files: max number of files in one archive
+        :type max_files: int
+        :param max_bytes: max size of one archive entry in bytes
+        :type max_bytes: int
+        :param max_workers: number of concurrent disk writers
+        :type max_workers: int
+        :param create_file: file creation service
+        :type create_file: ICreateFile
+        :param repo: file repository
+        :type repo: IRepo[File]
+        :param sync_repo: s3 sync job repository
+        :type sync_repo: ISyncJobRepo
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(
+        self,
+        chunks: AsyncIterable[bytes],
+        content_type: str,
+        *,
+        session: AsyncSession = None,
+    ) -> List[UploadedFile]:
+        """
+        :param chunks: zip/tar archive stream
+        :type chunks: AsyncIterable[bytes]
+        :param content_type: content type of the archive
+        :type content_type: str
+        :param session: database session, defaults to None
+        :type session: AsyncSession, optional
+        :raises Custom400Exception: archive is malformed or exceeds limits
+        :return: files created from archive entries
+        :rtype: List[UploadedFile]
+        """
+        ...
+
+
+class ICreateDerivative(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        base_path: str,
+        variants: Dict[str, ImageVariant],
+        on_upload: bool,
+        repo: IRepo[File],
+        executor: Executor,
+        filter_class: Type[IFilter],
+        filter_seq_class: Type[IFilterSeq],
+    ) -> None:
+        """
+        :param base_path: base path for all files
+        :type base_path: str
+        :param variants: configured image variants by name
+        :type variants: Dict[str, ImageVariant]
+        :param on_upload: flag whether variants are created right after upload
+        :type on_upload: bool
+        :param repo: file repository
+        :type repo: IRepo[File]
+        :param executor: executor for cpu-bound image processing
+        :type executor: Executor
+        :param filter_class: filter class to select files
+        :type filter_class: Type[IFilter]
+        :param filter_seq_class: filter sequence class
+        :type filter_seq_class: Type[IFilterSeq]
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self, uuid: str | UUID, variant: str) -> File:
+        """
+        Get variant of an image, creating it if needed
+
+        :param uuid: uuid of the original file
+        :type uuid: str | UUID
+        :param variant: name of the variant
+        :type variant: str
+        :raises Custom400Exception: variant can not be created
+        :return: variant file
+        :rtype: File
+        """
+        ...
+
+    @abstractmethod
+    async def create_all(self, uuid: str | UUID) -> None:
+        """
+        Create all configured variants of an uploaded image,
+        if variants are configured to be created on upload
+
+        :param uuid: uuid of the original file
+        :type uuid: str | UUID
+        """
+        ...
+
+
+class IStartDirectUpload(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        base_path: str,
+        max_bytes: int,
+        multipart_threshold: int,
+        multipart_part_size: int,
+        expiration: int,
+        s3: S3ClientProvider,
+        bucket: str,
+    ) -> None:
+        """
+        :param base_path: base path for all files, used as a key prefix
+        :type base_path: str
+        :param max_bytes: max size of a file in bytes
+        :type max_bytes: int
+        :param multipart_threshold: min file size in bytes for multipart upload
+        :type multipart_threshold: int
+        :param multipart_part_size: min part size in bytes
+        :type multipart_part_size: int
+        :param expiration: presigned urls lifetime in seconds
+        :type expiration: int
+        :param s3: provider of the shared s3 client
+        :type s3: S3ClientProvider
+        :param bucket: bucket name
+        :type bucket: str
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self, request: DirectUploadRequest) -> DirectUpload:
+        """
+        Presign urls for uploading a file straight to s3
+
+        :param request: file to upload
+        :type request: DirectUploadRequest
+        :raises Custom400Exception: file is too big
+        :return: key and presigned urls
+        :rtype: DirectUpload
+        """
+        ...
+
+
+class ICompleteDirectUpload(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        base_path: str,
+        max_bytes: int,
+        s3: S3ClientProvider,
+        bucket: str,
+        repo: IRepo[File],
+    ) -> None:
+        """
+        :param base_path: base path for all files, used as a key prefix
+        :type base_path: str
+        :param max_bytes: max size of a file in bytes
+        :type max_bytes: int
+        :param s3: provider of the shared s3 client
+        :type s3: S3ClientProvider
+        :param bucket: bucket name
+        :type bucket: str
+        :param repo: file repository
+        :type repo: IRepo[File]
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(
+        self,
+        upload: CompleteDirectUploadRequest,
+        *,
+        session: AsyncSession = None,
+    ) -> UploadedFile:
+        """
+        Verify a file uploaded straight to s3 and create its row
+
+        :param upload: uploaded file
+        :type upload: CompleteDirectUploadRequest
+        :param session: database session, defaults to None
+        :type session: AsyncSession, optional
+        :raises Custom400Exception: file is missing, incomplete or does not match
+        :return: uploaded file data
+        :rtype: UploadedFile
+        """
+        ...
+
+
+class IPresignDownload(ABC):
+    @abstractmethod
+    def __init__(
+        self,
+        enabled: bool,
+        expiration: int,
+        s3: S3ClientProvider,
+        bucket: str,
+    ) -> None:
+        """
+        :param enabled: whether files are downloaded straight from s3
+        :type enabled: bool
+        :param expiration: presigned urls lifetime in seconds
+        :type expiration: int
+        :param s3: provider of the shared s3 client
+        :type s3: S3ClientProvider
+        :param bucket: bucket name
+        :type bucket: str
+        """
+        ...
+
+    @abstractmethod
+    async def __call__(self, file: File) -> str | None:
+        """
+        Presign url for downloading a file straight from s3,
+        urls are reused until shortly before they expire
+
+        :param file: file saved to s3
+        :type file: File
+        :return: url or None if disabled or file is not saved to s3
+        :rtype: str | None
+        """
+        ...
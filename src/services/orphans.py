@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import AsyncIterator, List
+from uuid import UUID
+
+from sqlalchemy import Row
+
+from repo.file import IFileRepo
+from schemas.clean import DiskReconcileStats
+from services.interfaces import IReconcileDisk
+from utils.file import DirEntry, move_files, remove_files, scan_directory
+from utils.time import get_current_time
+
+logger = logging.getLogger("cleanup")
+
+# name of the last reconciled file, so the next run continues after it.
+# Hidden, so it is not taken for an orphan itself
+CURSOR_FILE = ".reconcile"
+
+
+class ReconcileDisk(IReconcileDisk):
+    def __init__(
+        self,
+        base_path: str,
+        max_entries: int,
+        page_size: int,
+        orphan_age: int,
+        quarantine: str,
+        repo: IFileRepo,
+    ) -> None:
+        self.base_path = base_path
+        self.max_entries = max_entries
+        self.page_size = page_size
+        self.orphan_age = orphan_age
+        self.quarantine = quarantine
+        self.repo = repo
+        self.prefix = f"{Path(base_path)}/"
+
+    async def __call__(self) -> DiskReconcileStats:
+        started_at = get_current_time()
+        orphaned_before = started_at.timestamp() - self.orphan_age
+        stats = DiskReconcileStats()
+        orphans: List[DirEntry] = []
+        missing: List[UUID] = []
+
+        cursor = await asyncio.to_thread(self._read_cursor)
+        # a run covers a slice of names, the last one covers the rest
+        entries, last = await asyncio.to_thread(
+            scan_directory, self.base_path, cursor, self.max_entries
+        )
+        # both are sorted by name, so they are merge-joined
+        # a page at a time instead of checking files one by one
+        files = self._list_files(cursor, last)
+        file = await anext(files, None)
+        index = 0
+        matched = False
+        while index < len(entries) or file is not None:
+            entry = entries[index] if index < len(entries) else None
+            name = None if file is None else file.path[len(self.prefix) :]  # noqa: E203
+            if name is None or (entry is not None and entry.name < name):
+                stats.entries += 1
+                # recent files could be written before their rows are created
+                if not matched and entry.mtime < orphaned_before:
+                    orphans.append(entry)
+                index += 1
+                matched = False
+            else:
+                stats.files += 1
+                if entry is not None and entry.name == name:
+                    # rows flagged as removed do not keep bytes on disk
+                    matched = matched or not file.is_removed_from_disk
+                # files updated since the start could be written
+                # after the directory was scanned
+                elif not file.is_removed_from_disk and file.updated_at < started_at:
+                    if file.is_saved_to_s3:
+                        missing.append(file.uuid)
+                    else:
+                        stats.lost += 1
+                        logger.critical(
+                            "File is missing from both disk and s3.",
+                            extra={"uuid": file.uuid, "path": file.path},
+                        )
+                file = await anext(files, None)
+
+            if len(orphans) >= self.page_size:
+                await self._remove(orphans, stats)
+                orphans = []
+            if len(missing) >= self.page_size:
+                stats.missing += await self._flag(missing)
+                missing = []
+        if orphans:
+            await self._remove(orphans, stats)
+        if missing:
+            stats.missing += await self._flag(missing)
+
+        # interrupted run is repeated from the same cursor, which is harmless
+        stats.finished = last is None
+        await asyncio.to_thread(self._write_cursor, last or "")
+        logger.info("Disk reconciled.", extra=stats.model_dump())
+        return stats
+
+    async def _list_files(self, after: str, until: str | None) -> AsyncIterator[Row]:
+        path = f"{self.prefix}{after}"
+        while True:
+            page = await self.repo.get_page_by_path(path, self.page_size)
+            for file in page:
+                if not file.path.startswith(self.prefix) or (
+                    until is not None and file.path > f"{self.prefix}{until}"
+                ):
+                    return
+                yield file
+            if len(page) < self.page_size:
+                return
+            path = page[-1].path
+
+    async def _remove(self, orphans: List[DirEntry], stats: DiskReconcileStats) -> None:
+        paths = [os.path.join(self.base_path, entry.name) for entry in orphans]
+        if self.quarantine:
+            removed = await asyncio.to_thread(move_files, paths, self.quarantine)
+        else:
+            removed = await asyncio.to_thread(remove_files, paths)
+        for entry, is_removed in zip(orphans, removed):
+            if is_removed:
+                stats.orphans += 1
+                stats.orphan_bytes += entry.size
+        logger.warning(
+            "Files without rows are removed from disk.",
+            extra={"count": sum(removed), "quarantine": self.quarantine},
+        )
+
+    async def _flag(self, uuids: List[UUID]) -> int:
+        # files are served from s3 from now on
+        await self.repo.multi_update(uuids, values={"is_removed_from_disk": True})
+        logger.warning("Files missing from disk are flagged as removed.")
+        return len(uuids)
+
+    def _read_cursor(self) -> str:
+        try:
+            with open(os.path.join(self.base_path, CURSOR_FILE)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ""
+
+    def _write_cursor(self, cursor: str) -> None:
+        path = os.path.join(self.base_path, CURSOR_FILE)
+        # written aside and renamed, so a crash never leaves half a cursor
+        with open(f"{path}.tmp", "w") as f:
+            f.write(cursor)
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from repo.file import IFileRepo
+from schemas.clean import PlacementStats
+from services.interfaces import IDiskCache, IPlaceFiles
+from utils.file import remove_files
+from utils.heat import to_heat
+from utils.time import get_current_time
+
+logger = logging.getLogger("cleanup")
+
+
+class PlaceFiles(IPlaceFiles):
+    def __init__(
+        self,
+        half_life: int,
+        demote_below: float,
+        promote_above: float,
+        min_age: int,
+        batch_size: int,
+        max_promotions: int,
+        repo: IFileRepo,
+        disk_cache: IDiskCache,
+    ) -> None:
+        # files between the thresholds stay where they are,
+        # so a file does not go back and forth on every run
+        assert (
+            not promote_above or demote_below < promote_above
+        ), "Files must be demoted below the promotion threshold."
+        self.half_life = half_life
+        self.demote_below = demote_below
+        self.promote_above = promote_above
+        self.min_age = timedelta(seconds=min_age)
+        self.batch_size = batch_size
+        self.max_promotions = max_promotions
+        self.repo = repo
+        self.disk_cache = disk_cache
+
+    async def __call__(self) -> PlacementStats:
+        now = get_current_time()
+        stats = PlacementStats()
+        if self.demote_below:
+            stats.demoted = await self._demote(now)
+        if self.promote_above:
+            stats.promoted = await self._promote(now)
+        return stats
+
+    async def _demote(self, now: datetime) -> int:
+        heat_below = to_heat(self.demote_below, now, self.half_life)
+        after: UUID | None = None
+        demoted = 0
+        while True:
+            batch = await self.repo.get_cold_page(
+                heat_below, now - self.min_age, after, self.batch_size
+            )
+            if batch:
+                # row is updated first, so nobody is sent to a missing file
+                await self.repo.multi_update(
+                    [file.uuid for file in batch],
+                    values={"is_removed_from_disk": True},
+                )
+                await asyncio.to_thread(remove_files, [file.path for file in batch])
+                demoted += len(batch)
+            if len(batch) < self.batch_size:
+                return demoted
+            after = batch[-1].uuid
+
+    async def _promote(self, now: datetime) -> int:
+        files = await self.repo.get_hot(
+            to_heat(self.promote_above, now, self.half_life), self.max_promotions
+        )
+        promoted = 0
+        for file in files:
+            # promoted files are rehydrated, so the disk cache keeps them
+            # within its budget and drops them once they are not used
+            try:
+                file = await self.disk_cache(file)
+            except Exception as e:
+                logger.error(
+                    f"Error promoting a file to disk. - {str(e)}",
+                    extra={"uuid": file.uuid},
+                )
+                continue
+            promoted += not file.is_removed_from_disk
+        return promoted
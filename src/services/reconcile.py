@@ -0,0 +1,136 @@
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Tuple
+from uuid import UUID
+
+from aiobotocore.client import AioBaseClient
+from sqlalchemy import Row
+
+from repo.file import IFileRepo
+from repo.sync import ISyncJobRepo
+from schemas.sync import ReconcileStats
+from services.interfaces import IReconcileExternalStorage
+from utils.s3 import S3ClientProvider
+from utils.time import get_current_time
+
+logger = logging.getLogger("s3")
+
+# max number of keys of one DeleteObjects request
+BATCH_SIZE: int = 1000
+
+
+class ReconcileS3(IReconcileExternalStorage):
+    def __init__(
+        self,
+        prefix: str,
+        page_size: int,
+        orphan_age: int,
+        s3: S3ClientProvider,
+        bucket: str,
+        repo: IFileRepo,
+        sync_repo: ISyncJobRepo,
+    ) -> None:
+        self.prefix = prefix
+        self.page_size = page_size
+        self.orphan_age = timedelta(seconds=orphan_age)
+        self.s3 = s3
+        self.bucket = bucket
+        self.repo = repo
+        self.sync_repo = sync_repo
+
+    async def __call__(self) -> ReconcileStats:
+        started_at = get_current_time()
+        orphaned_before = started_at - self.orphan_age
+        stats = ReconcileStats()
+        missing: List[UUID] = []
+        orphans: List[str] = []
+
+        s3 = await self.s3()
+        # both streams are sorted by key, so they are merge-joined
+        # a page at a time instead of checking objects one by one
+        objects = self._list_objects(s3)
+        files = self._list_files()
+        obj = await anext(objects, None)
+        file = await anext(files, None)
+        matched = False
+        while obj is not None or file is not None:
+            key = file.path.strip("/") if file is not None else None
+            if key is None or (obj is not None and obj[0] < key):
+                stats.objects += 1
+                if not matched and obj[1] < orphaned_before:
+                    orphans.append(obj[0])
+                obj = await anext(objects, None)
+                matched = False
+            else:
+                stats.files += 1
+                if obj is not None and obj[0] == key:
+                    matched = True
+                # files updated since the start could be saved
+                # after their keys were listed
+                elif file.is_saved_to_s3 and file.updated_at < started_at:
+                    if file.is_removed_from_disk:
+                        stats.lost += 1
+                        logger.critical(
+                            "File is missing from both disk and s3.",
+                            extra={"uuid": file.uuid, "path": file.path},
+                        )
+                    else:
+                        missing.append(file.uuid)
+                file = await anext(files, None)
+
+            if len(orphans) >= BATCH_SIZE:
+                stats.orphans += await self._delete(s3, orphans)
+                orphans = []
+            if len(missing) >= BATCH_SIZE:
+                stats.missing += await self._requeue(missing)
+                missing = []
+        if orphans:
+            stats.orphans += await self._delete(s3, orphans)
+        if missing:
+            stats.missing += await self._requeue(missing)
+
+        logger.info("S3 reconciled.", extra=stats.model_dump())
+        return stats
+
+    async def _list_objects(
+        self,
+        s3: AioBaseClient,
+    ) -> AsyncIterator[Tuple[str, datetime]]:
+        kwargs = {"Bucket": self.bucket, "Prefix": self.prefix}
+        while True:
+            page = await s3.list_objects_v2(**kwargs)
+            for obj in page.get("Contents", ()):
+                yield obj["Key"], obj["LastModified"]
+            if not page.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+    async def _list_files(self) -> AsyncIterator[Row]:
+        after = None
+        while True:
+            page = await self.repo.get_page_by_path(after, self.page_size)
+            for file in page:
+                yield file
+            if len(page) < self.page_size:
+                return
+            after = page[-1].path
+
+    async def _requeue(self, uuids: List[UUID]) -> int:
+        # unsynced files left without a job are queued by the next sweep
+        await self.repo.multi_update(uuids, values={"is_saved_to_s3": False})
+        await self.sync_repo.enqueue(uuids)
+        logger.warning("Files missing from s3 are queued for sync.")
+        return len(uuids)
+
+    async def _delete(self, s3: AioBaseClient, keys: List[str]) -> int:
+        response = await s3.delete_objects(
+            Bucket=self.bucket,
+            Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+        )
+        errors = response.get("Errors", [])
+        for error in errors:
+            logger.error(
+                f"Error deleting an orphaned object from s3. - {error.get('Message')}",
+                extra={"key": error.get("Key")},
+            )
+        return len(keys) - len(errors)
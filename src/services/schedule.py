@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict
+
+from pydantic import BaseModel
+
+from repo.schedule import IScheduledJobRepo
+from services.interfaces import IRunScheduled
+
+logger = logging.getLogger("scheduler")
+
+
+class LeaseLostError(Exception):
+    pass
+
+
+class RunScheduled(IRunScheduled):
+    def __init__(
+        self,
+        name: str,
+        every: int,
+        poll_interval: int,
+        lease: int,
+        repo: IScheduledJobRepo,
+        job: Callable[[], Awaitable[BaseModel]],
+        is_due: Callable[[], Awaitable[bool]] | None = None,
+    ) -> None:
+        self.name = name
+        self.every = timedelta(seconds=every)
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease)
+        self.repo = repo
+        self.job = job
+        self.is_due = is_due
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def __call__(self) -> None:
+        while True:
+            # processes started together do not poll in lockstep
+            await asyncio.sleep(self.poll_interval * random.uniform(0.5, 1.5))
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Error running scheduled job {self.name}. - {str(e)}")
+
+    async def run_once(self, force: bool = False) -> bool:
+        # local check is cheap, the lease is not even requested if it fails
+        if not force and self.is_due is not None and not await self.is_due():
+            return False
+        every = timedelta() if force else self.every
+        if not await self.repo.acquire(self.name, self.owner, every, self.lease):
+            return False
+
+        logger.info(f"Scheduled job {self.name} started.")
+        started_at = time.monotonic()
+        result: Dict[str, Any] = {"error": "Interrupted."}
+        job = asyncio.create_task(self.job())
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            await asyncio.wait((job, heartbeat), return_when=asyncio.FIRST_COMPLETED)
+            if not job.done():
+                # heartbeat returns once the lease is lost, another process
+                # may take the job over, so it must not go on running here
+                raise LeaseLostError(f"Lease of scheduled job {self.name} is lost.")
+            result = job.result().model_dump()
+        except Exception as e:
+            result = {"error": str(e)}
+            raise
+        finally:
+            heartbeat.cancel()
+            job.cancel()
+            await asyncio.wait((job,))
+            duration = round(time.monotonic() - started_at, 3)
+            await self.repo.release(self.name, self.owner, duration, result)
+            logger.info(
+                f"Scheduled job {self.name} finished.",
+                extra={"duration": duration, **result},
+            )
+        return True
+
+    async def _heartbeat(self) -> None:
+        # long runs keep the lease, so nobody starts the job again meanwhile
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            try:
+                if not await self.repo.renew(self.name, self.owner, self.lease):
+                    logger.warning(f"Lease of scheduled job {self.name} is lost.")
+                    return
+            except Exception as e:
+                logger.error(f"Error renewing scheduled job {self.name}. - {str(e)}")
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from models.sync import S3SyncJob
+from repo.sync import ISyncJobRepo
+from schemas.sync import SyncStats
+from services.interfaces import ISaveFileToExternalStorage, ISyncFiles
+from utils.asyncio import AIMDLimiter, CircuitBreaker, CircuitOpenError
+from utils.time import get_current_time_with_delta
+
+logger = logging.getLogger("s3")
+
+
+class SyncFilesToS3(ISyncFiles):
+    def __init__(
+        self,
+        repo: ISyncJobRepo,
+        save_to_s3: ISaveFileToExternalStorage,
+        max_workers: int,
+        max_attempts: int,
+        backoff: int,
+        max_backoff: int,
+        lease: int,
+        poll_interval: int,
+        limiter: AIMDLimiter,
+        breaker: CircuitBreaker,
+        stats_interval: int,
+    ) -> None:
+        self.repo = repo
+        self.save_to_s3 = save_to_s3
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = timedelta(seconds=lease)
+        self.poll_interval = poll_interval
+        self.limiter = limiter
+        self.breaker = breaker
+        self.stats_interval = stats_interval
+        self._wakeup = asyncio.Event()
+        self._probing = False
+
+    async def __call__(self) -> None:
+        await self.sweep()
+        async with asyncio.TaskGroup() as group:
+            for _ in range(self.max_workers):
+                group.create_task(self._worker())
+            group.create_task(self._report())
+
+    async def sweep(self) -> None:
+        count = await self.repo.sweep()
+        if count:
+            logger.warning(f"Unsynced files queued on startup - {count}.")
+
+    async def stats(self) -> SyncStats:
+        return SyncStats(
+            limit=round(self.limiter.limit, 2),
+            in_flight=self.limiter.in_flight,
+            waiting=self.limiter.waiting,
+            circuit=self.breaker.state,
+            queue_depth=await self.repo.count_pending(),
+        )
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def process(self) -> bool:
+        if not self.breaker.available():
+            # jobs stay queued until s3 can be probed again
+            return False
+        if self.breaker.state != CircuitBreaker.HALF_OPEN:
+            return await self._process()
+        # only one call probes s3, jobs claimed by others would be deferred
+        if self._probing:
+            return False
+        self._probing = True
+        try:
+            return await self._process()
+        finally:
+            self._probing = False
+
+    async def _process(self) -> bool:
+        jobs = await self.repo.claim(1, self.lease)
+        for job in jobs:
+            await self._sync(job)
+        return bool(jobs)
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                if await self.process():
+                    continue
+            except Exception as e:
+                # database is unavailable, try again later
+                logger.error(f"Error processing s3 sync queue. - {str(e)}")
+            await self._wait()
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            try:
+                logger.info("S3 sync stats.", extra=(await self.stats()).model_dump())
+            except Exception as e:
+                logger.error(f"Error collecting s3 sync stats. - {str(e)}")
+
+    async def _wait(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+        except TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _sync(self, job: S3SyncJob) -> None:
+        try:
+            saved = await self.save_to_s3(str(job.file_uuid))
+        except CircuitOpenError:
+            await self._defer(job)
+            return
+        except Exception as e:
+            logger.critical(
+                f"Error syncing a file to s3. - {str(e)}",
+                extra={"uuid": job.file_uuid},
+            )
+            saved = False
+        if saved:
+            await self.repo.delete(job)
+            return
+
+        if job.attempts >= self.max_attempts:
+            logger.critical(
+                "File sync to s3 attempts are exhausted.",
+                extra={"uuid": job.file_uuid, "attempts": job.attempts},
+            )
+            await self.repo.update(job, values={"next_attempt_at": None})
+            return
+
+        delay = min(self.backoff * 2 ** (job.attempts - 1), self.max_backoff)
+        await self.repo.update(
+            job,
+            values={"next_attempt_at": get_current_time_with_delta(seconds=delay)},
+        )
+
+    async def _defer(self, job: S3SyncJob) -> None:
+        # s3 was not called, so the attempt counted by the claim is given back
+        delay = self.breaker.retry_in()
+        logger.warning(
+            "S3 is unavailable, file sync is deferred.",
+            extra={"uuid": job.file_uuid, "delay": delay},
+        )
+        await self.repo.update(
+            job,
+            values={
+                "attempts": job.attempts - 1,
+                "next_attempt_at": get_current_time_with_delta(seconds=delay),
+            },
+        )
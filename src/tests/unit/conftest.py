@@ -1,4 +1,5 @@
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from unittest import mock
 
@@ -6,11 +7,27 @@ import pytest
 
 from config.di import get_di_test_container
 from models.file import File
+from schemas.clean import CleanupStats
 from schemas.files import FileMetadata
+from services.access import TrackAccess
+from services.archive import ImportArchive, StreamArchive
+from services.cache import DiskCache
 from services.clean import CleanDisk
 from services.create import CreateFile
-from services.external import SaveFileToS3
-from services.extract import ExtractMetadata
+from services.derivatives import CreateDerivative
+from services.direct import CompleteDirectUpload, PresignDownload, StartDirectUpload
+from services.evict import EvictFromDisk
+from services.expire import ExpireFiles
+from services.external import SaveFileToS3, StreamFileFromS3
+from services.extract import ExtractAttributes, ExtractMetadata
+from services.orphans import ReconcileDisk
+from services.placement import PlaceFiles
+from services.reconcile import ReconcileS3
+from services.schedule import RunScheduled
+from services.sync import SyncFilesToS3
+from utils.asyncio import AIMDLimiter, CircuitBreaker, Hedger
+from utils.image import ImageVariant
+from utils.s3 import is_overload_error, is_unavailable_error
 
 __container = get_di_test_container()
 
@@ -58,6 +75,7 @@ def repo_mock_factory():
         repo.get_by_filters.return_value = rows
         repo.exists_by_field.return_value = True
         repo.create.return_value = instance
+        repo.multi_create.return_value = [instance]
         repo.update.return_value = None
         repo.multi_update.return_value = None
         repo.delete.return_value = None
@@ -136,17 +154,8 @@ def s3_mock():
 
 
 @pytest.fixture
-def boto3_mock(s3_mock):
-    class mockedasynccontextmanager:
-        async def __aenter__(self, *args, **kwargs):
-            return s3_mock
-
-        async def __aexit__(self, *args, **kwargs):
-            return
-
-    boto3 = mock.Mock()
-    boto3.client.return_value = mockedasynccontextmanager()
-    return boto3
+def s3_client_mock(s3_mock):
+    return mock.AsyncMock(return_value=s3_mock)
 
 
 @pytest.fixture
@@ -161,16 +170,42 @@ def clean_disk(
         CleanDisk(
             max_days=10,
             max_days_unused=10,
+            batch_size=2,
+            max_workers=2,
             repo=repo_mock_factory(file),
+            access_repo=mock.AsyncMock(
+                get_accessed_since=mock.AsyncMock(return_value=set())
+            ),
+            uuid_filter=filter_mock_factory(File),
             created_at_filter=filter_mock_factory(File),
             updated_at_filter=filter_mock_factory(File),
             is_removed_from_disk_filter=filter_mock_factory(File),
+            rehydrated_at_filter=filter_mock_factory(File),
             filter_seq_class=filter_seq_mock,
         )
     ):
         return container.clean_disk()
 
 
+@pytest.fixture
+def evict_from_disk(filter_mock_factory, filter_seq_mock, container, tmp_path):
+    with container.evict_from_disk.override(
+        EvictFromDisk(
+            path=str(tmp_path),
+            high_watermark=0.9,
+            low_watermark=0.8,
+            batch_size=2,
+            order="lru",
+            repo=mock.AsyncMock(),
+            is_saved_to_s3_filter=filter_mock_factory(File),
+            is_removed_from_disk_filter=filter_mock_factory(File),
+            rehydrated_at_filter=filter_mock_factory(File),
+            filter_seq_class=filter_seq_mock,
+        )
+    ):
+        return container.evict_from_disk()
+
+
 @pytest.fixture
 def create_file(
     file,
@@ -182,32 +217,343 @@ def create_file(
         CreateFile(
             base_path="/path",
             max_bytes=2048,
+            compression_enabled=True,
+            compression_min_size=16,
             repo=repo_mock_factory(file),
+            sync_repo=mock.AsyncMock(),
+            save_to_s3=mock.AsyncMock(),
             extract_metadata=extract_metadata_mock,
         )
     ):
         return container.create_file()
 
 
+@pytest.fixture
+def hedger():
+    return Hedger(enabled=False, percentile=95, budget=0.05)
+
+
+@pytest.fixture
+def limiter():
+    return AIMDLimiter(
+        min_limit=1,
+        max_limit=4,
+        latency_target=1.0,
+        is_overload=is_overload_error,
+    )
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker(
+        failure_threshold=2,
+        reset_timeout=30,
+        is_failure=is_unavailable_error,
+    )
+
+
 @pytest.fixture
 def save_file_to_s3(
     file,
     repo_mock_factory,
-    boto3_mock,
+    s3_client_mock,
+    limiter,
+    hedger,
+    breaker,
     container,
 ):
     with container.save_file_to_s3.override(
         SaveFileToS3(
             repo=repo_mock_factory(file),
-            boto3=boto3_mock,
-            endpoint_url="s3://example.com",
+            s3=s3_client_mock,
             bucket="bucker",
+            multipart_threshold=4096,
+            multipart_part_size=1024 * 1024,
+            multipart_concurrency=2,
+            limiter=limiter,
+            hedge=hedger,
+            hedge_max_size=1024,
+            breaker=breaker,
         )
     ):
         return container.save_file_to_s3()
 
 
+@pytest.fixture
+def stream_file_from_s3(s3_client_mock, hedger, container):
+    with container.stream_file_from_s3.override(
+        StreamFileFromS3(
+            s3=s3_client_mock,
+            bucket="bucket",
+            max_streams=1,
+            wait_timeout=0.01,
+            hedge=hedger,
+        )
+    ):
+        return container.stream_file_from_s3()
+
+
+@pytest.fixture
+def disk_cache(
+    file,
+    repo_mock_factory,
+    filter_mock_factory,
+    filter_seq_mock,
+    s3_client_mock,
+    hedger,
+    container,
+):
+    repo = repo_mock_factory(file)
+    repo.get_rehydrated_size.return_value = 0
+    repo.get_by_filters.return_value = []
+    with container.disk_cache.override(
+        DiskCache(
+            max_bytes=4096,
+            max_object_bytes=4096,
+            part_size=1024,
+            concurrency=2,
+            s3=s3_client_mock,
+            bucket="bucket",
+            repo=repo,
+            rehydrated_at_filter=filter_mock_factory(File),
+            is_removed_from_disk_filter=filter_mock_factory(File),
+            filter_seq_class=filter_seq_mock,
+            hedge=hedger,
+        )
+    ):
+        return container.disk_cache()
+
+
+@pytest.fixture
+def sync_files_to_s3(limiter, breaker, container):
+    with container.sync_files_to_s3.override(
+        SyncFilesToS3(
+            repo=mock.AsyncMock(),
+            save_to_s3=mock.AsyncMock(return_value=True),
+            max_workers=2,
+            max_attempts=3,
+            backoff=5,
+            max_backoff=15,
+            lease=60,
+            poll_interval=1,
+            limiter=limiter,
+            breaker=breaker,
+            stats_interval=60,
+        )
+    ):
+        return container.sync_files_to_s3()
+
+
+@pytest.fixture
+def reconcile_s3(s3_client_mock, container):
+    with container.reconcile_s3.override(
+        ReconcileS3(
+            prefix="media/",
+            page_size=2,
+            orphan_age=3600,
+            s3=s3_client_mock,
+            bucket="bucket",
+            repo=mock.AsyncMock(),
+            sync_repo=mock.AsyncMock(),
+        )
+    ):
+        return container.reconcile_s3()
+
+
+@pytest.fixture
+def track_access(container):
+    with container.track_access.override(
+        TrackAccess(
+            flush_interval=0.01,
+            max_pending=3,
+            half_life=3600,
+            repo=mock.AsyncMock(),
+        )
+    ):
+        return container.track_access()
+
+
+@pytest.fixture
+def expire_files(s3_client_mock, container):
+    with container.expire_files.override(
+        ExpireFiles(
+            window=60,
+            batch_size=100,
+            s3=s3_client_mock,
+            bucket="bucket",
+            repo=mock.AsyncMock(),
+        )
+    ):
+        return container.expire_files()
+
+
+@pytest.fixture
+def reconcile_disk(tmp_path, container):
+    (tmp_path / "media").mkdir()
+    with container.reconcile_disk.override(
+        ReconcileDisk(
+            base_path=str(tmp_path / "media"),
+            max_entries=4,
+            page_size=2,
+            orphan_age=3600,
+            quarantine=str(tmp_path / "orphans"),
+            repo=mock.AsyncMock(),
+        )
+    ):
+        return container.reconcile_disk()
+
+
+@pytest.fixture
+def place_files(container):
+    with container.place_files.override(
+        PlaceFiles(
+            half_life=3600,
+            demote_below=0.5,
+            promote_above=2,
+            min_age=60,
+            batch_size=2,
+            max_promotions=2,
+            repo=mock.AsyncMock(),
+            disk_cache=mock.AsyncMock(side_effect=lambda file: file),
+        )
+    ):
+        return container.place_files()
+
+
+@pytest.fixture
+def disk_cleanup_scheduler(container):
+    with container.disk_cleanup_scheduler.override(
+        RunScheduled(
+            name="disk_cleanup",
+            every=3600,
+            poll_interval=0.01,
+            lease=0.03,
+            repo=mock.AsyncMock(),
+            job=mock.AsyncMock(return_value=CleanupStats(files=2, removed=1)),
+        )
+    ):
+        return container.disk_cleanup_scheduler()
+
+
+@pytest.fixture
+def start_direct_upload(s3_client_mock, container):
+    with container.start_direct_upload.override(
+        StartDirectUpload(
+            base_path="/media",
+            max_bytes=1024 * 1024 * 1024,
+            multipart_threshold=64 * 1024 * 1024,
+            multipart_part_size=8 * 1024 * 1024,
+            expiration=3600,
+            s3=s3_client_mock,
+            bucket="bucket",
+        )
+    ):
+        return container.start_direct_upload()
+
+
+@pytest.fixture
+def presign_download(s3_client_mock, container):
+    with container.presign_download.override(
+        PresignDownload(
+            enabled=True,
+            expiration=300,
+            s3=s3_client_mock,
+            bucket="bucket",
+        )
+    ):
+        return container.presign_download()
+
+
+@pytest.fixture
+def complete_direct_upload(file, repo_mock_factory, s3_client_mock, container):
+    repo = repo_mock_factory(file)
+    repo.exists_by_field.return_value = False
+    with container.complete_direct_upload.override(
+        CompleteDirectUpload(
+            base_path="/media",
+            max_bytes=1024 * 1024 * 1024,
+            s3=s3_client_mock,
+            bucket="bucket",
+            repo=repo,
+        )
+    ):
+        return container.complete_direct_upload()
+
+
+@pytest.fixture
+def stream_archive(
+    file,
+    repo_mock_factory,
+    filter_mock_factory,
+    filter_seq_mock,
+    container,
+):
+    with container.stream_archive.override(
+        StreamArchive(
+            max_files=2,
+            repo=repo_mock_factory(file),
+            filter_class=mock.Mock(return_value=filter_mock_factory(File)),
+            filter_seq_class=filter_seq_mock,
+            stream_from_s3=mock.AsyncMock(),
+        )
+    ):
+        return container.stream_archive()
+
+
+@pytest.fixture
+def import_archive(
+    file,
+    repo_mock_factory,
+    container,
+):
+    create_file = mock.AsyncMock()
+    with container.import_archive.override(
+        ImportArchive(
+            max_files=3,
+            max_bytes=1024,
+            max_workers=2,
+            create_file=create_file,
+            repo=repo_mock_factory(file),
+            sync_repo=mock.AsyncMock(),
+        )
+    ):
+        return container.import_archive()
+
+
+@pytest.fixture
+def create_derivative(
+    file,
+    repo_mock_factory,
+    filter_mock_factory,
+    filter_seq_mock,
+    container,
+    tmp_path,
+):
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with container.create_derivative.override(
+            CreateDerivative(
+                base_path=str(tmp_path),
+                variants={"thumbnail": ImageVariant("thumbnail", 64, 32, "webp")},
+                on_upload=True,
+                repo=repo_mock_factory(file),
+                executor=executor,
+                filter_class=mock.Mock(return_value=filter_mock_factory(File)),
+                filter_seq_class=filter_seq_mock,
+            )
+        ):
+            yield container.create_derivative()
+
+
 @pytest.fixture
 def extract_metadata(container):
     with container.extract_metadata.override(ExtractMetadata()):
         return container.extract_metadata()
+
+
+@pytest.fixture
+def extract_attributes(file, repo_mock_factory, container):
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with container.extract_attributes.override(
+            ExtractAttributes(repo=repo_mock_factory(file), executor=executor)
+        ):
+            yield container.extract_attributes()
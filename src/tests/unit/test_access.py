@@ -0,0 +1,102 @@
+import asyncio
+import uuid
+
+import pytest
+
+from services import access
+from utils.heat import to_heat
+
+
+@pytest.mark.asyncio
+class TestTrackAccess:
+    async def test_flush(self, track_access):
+        first, second = uuid.uuid4(), uuid.uuid4()
+        track_access.repo.record.return_value = 2
+        track_access.read(first)
+        track_access.download(first)
+        track_access.download(first)
+        track_access.download(second)
+
+        assert await track_access.flush() == 2
+
+        # one row per file, however many times it is accessed
+        (accesses,) = track_access.repo.record.call_args.args
+        assert [(a["file_uuid"], a["reads"], a["downloads"]) for a in accesses] == [
+            (first, 1, 2),
+            (second, 0, 1),
+        ]
+        assert all(a["accessed_at"] is not None for a in accesses)
+        # heat is tracked for downloads only
+        assert accesses[0]["heat"] == pytest.approx(
+            to_heat(2, accesses[0]["accessed_at"], 3600)
+        )
+        # flushed accesses are not written again
+        assert await track_access.flush() == 0
+        track_access.repo.record.assert_called_once()
+
+    async def test_reads_only(self, track_access):
+        track_access.read(uuid.uuid4())
+
+        await track_access.flush()
+
+        (accesses,) = track_access.repo.record.call_args.args
+        assert accesses[0]["heat"] is None
+
+    async def test_batches(self, track_access, mocker):
+        mocker.patch.object(access, "BATCH_SIZE", 2)
+        mocker.patch.object(track_access, "max_pending", 10)
+        for _ in range(5):
+            track_access.read(uuid.uuid4())
+
+        await track_access.flush()
+
+        assert [
+            len(call.args[0]) for call in track_access.repo.record.call_args_list
+        ] == [2, 2, 1]
+
+    async def test_failure(self, track_access, mocker):
+        mocker.patch.object(access, "BATCH_SIZE", 1)
+        first, second = uuid.uuid4(), uuid.uuid4()
+        track_access.read(first)
+        track_access.read(second)
+        track_access.repo.record.side_effect = [1, Exception("db is down")]
+
+        with pytest.raises(Exception, match="db is down"):
+            await track_access.flush()
+        track_access.read(second)
+
+        # accesses of the failed batch are merged into the next flush
+        track_access.repo.record.side_effect = None
+        await track_access.flush()
+        (accesses,) = track_access.repo.record.call_args.args
+        assert [(a["file_uuid"], a["reads"]) for a in accesses] == [(second, 2)]
+
+    async def test_failure_memory_bound(self, track_access):
+        track_access.repo.record.side_effect = Exception("db is down")
+        for _ in range(4):
+            track_access.read(uuid.uuid4())
+
+        with pytest.raises(Exception, match="db is down"):
+            await track_access.flush()
+        track_access.read(uuid.uuid4())
+
+        track_access.repo.record.side_effect = None
+        await track_access.flush()
+        assert len(track_access.repo.record.call_args.args[0]) == 1
+
+    async def test_call(self, track_access, mocker):
+        mocker.patch.object(track_access, "flush_interval", 60)
+        task = asyncio.create_task(track_access())
+        await asyncio.sleep(0)
+
+        # too many pending files trigger an early flush
+        for _ in range(3):
+            track_access.read(uuid.uuid4())
+        await asyncio.sleep(0.01)
+        assert track_access.repo.record.call_count == 1
+
+        # pending accesses are written on cancellation
+        track_access.download(uuid.uuid4())
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert track_access.repo.record.call_count == 2
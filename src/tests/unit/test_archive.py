@@ -0,0 +1,213 @@
+import gzip
+import io
+import tarfile
+import uuid
+import zipfile
+from unittest import mock
+
+import pytest
+
+from models.file import File
+from schemas.files import ArchiveQuery, CreateFileSchema
+from utils.exceptions import Custom400Exception, Custom404Exception
+from utils.s3 import S3Object
+from utils.sqlalchemy import mode, operator
+
+
+@pytest.mark.asyncio
+class TestStreamArchive:
+    async def _read(self, stream):
+        return b"".join([chunk async for chunk in stream])
+
+    @pytest.mark.parametrize("compress", (True, False))
+    async def test_archive(self, compress, now, tmp_path, stream_archive):
+        files = []
+        for i, (name, content, encoding, on_disk) in enumerate(
+            (
+                ("a.txt", b"text " * 100, "gzip", True),
+                ("a.txt", b"\x89PNG binary", None, True),
+                ("A.TXT", b"evicted " * 10, "gzip", False),
+            )
+        ):
+            path = tmp_path / f"file{i}"
+            stored = gzip.compress(content) if encoding else content
+            if on_disk:
+                path.write_bytes(stored)
+            files.append(
+                File(
+                    uuid=uuid.uuid4(),
+                    path=str(path),
+                    size=len(content),
+                    format="format",
+                    name=name,
+                    ext="txt",
+                    encoding=encoding,
+                    is_removed_from_disk=not on_disk,
+                    is_saved_to_s3=True,
+                    created_at=now,
+                    updated_at=now,
+                )
+            )
+        stream_archive.max_files = 3
+        stream_archive.repo.get_by_filters.return_value = [[file] for file in files]
+        stream_archive.stream_from_s3.return_value = S3Object(
+            status_code=200,
+            headers={},
+            chunks=chunked(gzip.compress(b"evicted " * 10)),
+        )
+        query = ArchiveQuery(uuids=[file.uuid for file in files], compress=compress)
+
+        result = await self._read(await stream_archive(query))
+
+        with zipfile.ZipFile(io.BytesIO(result)) as archive:
+            # names differing in case only are made unique too
+            assert archive.namelist() == ["a.txt", "a (1).txt", "A (2).TXT"]
+            assert archive.read("a.txt") == b"text " * 100
+            assert archive.read("a (1).txt") == b"\x89PNG binary"
+            assert archive.read("A (2).TXT") == b"evicted " * 10
+            expected_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            for info in archive.infolist():
+                assert info.compress_type == expected_type
+        stream_archive.stream_from_s3.assert_awaited_once_with(files[2])
+        filter_mock = stream_archive.filter_class.return_value
+        filter_mock.assert_any_call(False, operator.is_)
+        filter_mock.assert_any_call(True, operator.is_)
+        filter_mock.assert_any_call(None, operator.is_)
+        filter_mock.assert_any_call([str(file.uuid) for file in files], operator.in_)
+        stream_archive.filter_seq_class.assert_any_call(
+            mode.or_, filter_mock, filter_mock
+        )
+        stream_archive.filter_seq_class.assert_called_with(
+            mode.and_,
+            stream_archive.filter_seq_class.return_value,
+            filter_mock,
+            filter_mock,
+        )
+        stream_archive.repo.get_by_filters.assert_called_once_with(
+            filters=stream_archive.filter_seq_class.return_value,
+            order_by=("created_at", "uuid"),
+            limit=stream_archive.max_files + 1,
+        )
+
+    async def test_missing(self, file, stream_archive):
+        stream_archive.repo.get_by_filters.return_value = [[file]]
+        missing = uuid.uuid4()
+
+        with pytest.raises(Custom404Exception) as e:
+            await stream_archive(ArchiveQuery(uuids=[file.uuid, missing]))
+
+        assert str(missing) in e.value.detail
+
+    @pytest.mark.parametrize(
+        "rows,expected_error",
+        (
+            ([], Custom404Exception),
+            ([[None]] * 3, Custom400Exception),
+        ),
+    )
+    async def test_invalid(self, rows, expected_error, now, stream_archive):
+        stream_archive.repo.get_by_filters.return_value = rows
+
+        with pytest.raises(expected_error):
+            await stream_archive(ArchiveQuery(created_from=now))
+
+
+def zip_archive(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.mkdir("dir")
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue(), "application/zip"
+
+
+def tar_archive(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue(), "application/gzip"
+
+
+async def chunked(data, size=100):
+    while data:
+        yield data[:size]
+        data = data[size:]
+
+
+@pytest.mark.asyncio
+class TestImportArchive:
+    @pytest.fixture(autouse=True)
+    def written(self, import_archive):
+        written = {}
+
+        async def write(file):
+            # entries are closed once written
+            written[file.filename] = (
+                file.file.read(),
+                file.headers.get("content-type"),
+            )
+            return CreateFileSchema(
+                uuid=uuid.uuid4(),
+                path=f"/media/{file.filename}",
+                size=file.size,
+                format=file.headers.get("content-type", "unknown"),
+                name=file.filename,
+                ext=file.filename.split(".")[-1],
+            )
+
+        import_archive.create_file.write.side_effect = write
+        return written
+
+    @pytest.mark.parametrize("archive_factory", (zip_archive, tar_archive))
+    async def test_import(
+        self, archive_factory, file, import_archive, session, written
+    ):
+        files = {"a.txt": b"text", "dir/b.png": b"\x89PNG", "c.json": b"{}"}
+        data, content_type = archive_factory(files)
+
+        result = await import_archive(chunked(data), content_type, session=session)
+
+        assert [item.uuid for item in result] == [file.uuid]
+        assert written == {
+            "a.txt": (b"text", "text/plain"),
+            "b.png": (b"\x89PNG", "image/png"),
+            "c.json": (b"{}", "application/json"),
+        }
+        for call in import_archive.create_file.write.call_args_list:
+            assert call.args[0].file.closed
+        entries = import_archive.repo.multi_create.call_args.args[0]
+        assert sorted(entry.name for entry in entries) == ["a.txt", "b.png", "c.json"]
+        import_archive.repo.multi_create.assert_called_once_with(
+            entries, session=session
+        )
+        import_archive.sync_repo.enqueue.assert_called_once_with(
+            [file.uuid], session=session
+        )
+
+    @pytest.mark.parametrize(
+        "data,content_type",
+        (
+            zip_archive({f"{i}.txt": b"text" for i in range(4)}),
+            zip_archive({"a.txt": b"text", "big.txt": b"x" * 2048}),
+            tar_archive({"a.txt": b"text", "big.txt": b"x" * 2048}),
+            (zip_archive({"a.txt": b"text" * 100})[0][:80], "application/zip"),
+            (b"not an archive", "application/x-tar"),
+        ),
+        ids=("too-many-files", "too-big-zip", "too-big-tar", "truncated", "malformed"),
+    )
+    async def test_invalid(self, data, content_type, import_archive, session, mocker):
+        os_mock = mocker.patch("services.archive.os", mock.AsyncMock())
+
+        with pytest.raises(Custom400Exception):
+            await import_archive(chunked(data), content_type, session=session)
+
+        import_archive.repo.multi_create.assert_not_called()
+        removed = {call.args[0] for call in os_mock.remove.call_args_list}
+        written = {
+            f"/media/{call.args[0].filename}"
+            for call in import_archive.create_file.write.call_args_list
+        }
+        assert removed == written
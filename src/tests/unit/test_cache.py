@@ -0,0 +1,160 @@
+import asyncio
+import os
+from unittest import mock
+
+import pytest
+
+from utils.sqlalchemy import mode, operator
+
+
+class S3Error(Exception):
+    pass
+
+
+def get_object_factory(content, calls=None):
+    async def get_object(Bucket, Key, Range, **kwargs):
+        start, end = map(int, Range.removeprefix("bytes=").split("-"))
+        data = content[start : end + 1]  # noqa: E203
+        if calls is not None:
+            calls.append(start)
+        await asyncio.sleep(0)
+        return {
+            "Body": mock.Mock(read=mock.AsyncMock(return_value=data)),
+            "ContentLength": len(data),
+            "ContentRange": f"bytes {start}-{start + len(data) - 1}/{len(content)}",
+            "ETag": '"etag"',
+        }
+
+    return get_object
+
+
+@pytest.mark.asyncio
+class TestDiskCache:
+    async def test_rehydrate(self, file, s3_mock, disk_cache, tmp_path):
+        content = os.urandom(2 * 1024 + 512)
+        file.path, file.is_removed_from_disk = str(tmp_path / "file"), True
+        calls = []
+        s3_mock.get_object.side_effect = get_object_factory(content, calls)
+
+        # concurrent requests are coalesced into one download
+        results = await asyncio.gather(disk_cache(file), disk_cache(file))
+
+        assert all(result.is_removed_from_disk is False for result in results)
+        assert sorted(calls) == [0, 1024, 2048]
+        assert (tmp_path / "file").read_bytes() == content
+        assert not (tmp_path / "file.part").exists()
+        for call in s3_mock.get_object.call_args_list[1:]:
+            assert call.kwargs["IfMatch"] == '"etag"'
+        disk_cache.repo.update.assert_called_once()
+        values = disk_cache.repo.update.call_args.kwargs["values"]
+        assert values["is_removed_from_disk"] is False
+        assert values["rehydrated_at"] is not None
+        # budget is not exceeded, nothing is evicted
+        disk_cache.repo.get_rehydrated_size.assert_called_once_with()
+        disk_cache.repo.get_by_filters.assert_not_called()
+
+    async def test_warm(self, file, s3_mock, disk_cache, tmp_path):
+        content = os.urandom(2 * 1024)
+        file.path, file.is_removed_from_disk = str(tmp_path / "file"), True
+        s3_mock.get_object.side_effect = get_object_factory(content)
+
+        # reads do not wait, concurrent ones start one download
+        disk_cache.warm(file)
+        disk_cache.warm(file)
+        assert len(disk_cache._tasks) == 2
+        await asyncio.gather(*disk_cache._tasks)
+
+        assert (tmp_path / "file").read_bytes() == content
+        assert s3_mock.get_object.call_count == 2
+        disk_cache.repo.update.assert_called_once()
+        assert file.is_removed_from_disk is False
+        assert not disk_cache._tasks
+
+    async def test_warm_bypass(self, file, s3_mock, disk_cache):
+        file.is_removed_from_disk = False
+
+        disk_cache.warm(file)
+
+        assert not disk_cache._tasks
+        s3_mock.get_object.assert_not_called()
+
+    async def test_evict(self, file, s3_mock, disk_cache, tmp_path):
+        old, older, recent = tmp_path / "old", tmp_path / "older", tmp_path / "recent"
+        for path in (old, older, recent):
+            path.write_bytes(b"0" * 1024)
+        # rehydrated by other processes too
+        disk_cache.repo.get_rehydrated_size.return_value = 4096
+        disk_cache.repo.get_by_filters.return_value = [
+            mock.Mock(uuid=path.name, path=str(path), size=1024)
+            for path in (older, old, recent)
+        ]
+        file.path, file.is_removed_from_disk = str(tmp_path / "file"), True
+        s3_mock.get_object.side_effect = get_object_factory(b"1" * 2048)
+
+        await disk_cache(file)
+
+        assert not old.exists()
+        assert not older.exists()
+        assert recent.exists()
+        disk_cache.repo.multi_update.assert_called_once_with(
+            ["older", "old"],
+            values={"is_removed_from_disk": True, "rehydrated_at": None},
+        )
+        disk_cache.filter_seq_class.assert_called_once_with(
+            mode.and_,
+            disk_cache.is_removed_from_disk_filter.return_value,
+            disk_cache.rehydrated_at_filter.return_value,
+        )
+        disk_cache.rehydrated_at_filter.assert_called_once_with(None, operator.is_not)
+        kwargs = disk_cache.repo.get_by_filters.call_args.kwargs
+        assert kwargs["order_by"] == ("rehydrated_at",)
+        assert kwargs["columns"] == ("uuid", "path", "size")
+
+    async def test_failure(self, file, s3_mock, disk_cache, tmp_path):
+        file.path, file.is_removed_from_disk = str(tmp_path / "file"), True
+        get_object = get_object_factory(os.urandom(2048))
+
+        async def failing_get_object(**kwargs):
+            if kwargs["Range"] != "bytes=0-1023":
+                raise S3Error
+            return await get_object(**kwargs)
+
+        s3_mock.get_object.side_effect = failing_get_object
+
+        result = await disk_cache(file)
+
+        assert result.is_removed_from_disk is True
+        assert list(tmp_path.iterdir()) == []
+        disk_cache.repo.update.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "is_removed_from_disk,is_saved_to_s3,size,max_bytes",
+        (
+            (False, True, 1024, 4096),
+            (True, False, 1024, 4096),
+            (True, True, 8192, 4096),
+            (True, True, 0, 4096),
+            (True, True, 1024, 0),
+        ),
+    )
+    async def test_bypass(
+        self,
+        is_removed_from_disk,
+        is_saved_to_s3,
+        size,
+        max_bytes,
+        file,
+        s3_mock,
+        disk_cache,
+    ):
+        file.is_removed_from_disk, file.is_saved_to_s3 = (
+            is_removed_from_disk,
+            is_saved_to_s3,
+        )
+        file.size, disk_cache.max_bytes = size, max_bytes
+
+        result = await disk_cache(file)
+
+        assert result.is_removed_from_disk is is_removed_from_disk
+        s3_mock.get_object.assert_not_called()
+        disk_cache.repo.get_rehydrated_size.assert_not_called()
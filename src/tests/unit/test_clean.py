@@ -1,4 +1,6 @@
-from datetime import timedelta
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 from unittest import mock
 
 import pytest
@@ -6,24 +8,21 @@ import pytest
 from utils.sqlalchemy import mode, operator
 
 
+def row(path, created_at=datetime(2000, 1, 1, tzinfo=timezone.utc)):
+    return SimpleNamespace(uuid=uuid.uuid4(), path=str(path), created_at=created_at)
+
+
 @pytest.mark.asyncio
 class TestCleanDisk:
-    @pytest.mark.parametrize("file_exists", (True, False))
-    async def test_clean(
+    async def test_filters(
         self,
-        file_exists,
         now,
-        file,
         clean_disk,
-        os_mock,
         get_current_time_mock,
         mocker,
     ):
-        mocker.patch("services.clean.os", os_mock)
         mocker.patch("services.clean.get_current_time", get_current_time_mock)
-
-        if not file_exists:
-            os_mock.remove.side_effect = FileNotFoundError
+        clean_disk.repo.get_by_filters.return_value = []
 
         await clean_disk()
 
@@ -37,6 +36,7 @@ class TestCleanDisk:
                 mock.call(
                     mode.and_,
                     clean_disk.is_removed_from_disk_filter.return_value,
+                    clean_disk.rehydrated_at_filter.return_value,
                     clean_disk.filter_seq_class.return_value,  # not perfect :/
                 ),
             ]
@@ -45,6 +45,7 @@ class TestCleanDisk:
             False,
             operator.is_,
         )
+        clean_disk.rehydrated_at_filter.assert_called_once_with(None, operator.is_)
         clean_disk.created_at_filter.assert_called_once_with(
             now - timedelta(days=clean_disk.max_days),
             operator.le,
@@ -53,11 +54,95 @@ class TestCleanDisk:
             now - timedelta(days=clean_disk.max_days_unused),
             operator.le,
         )
+        clean_disk.uuid_filter.assert_not_called()
         clean_disk.repo.get_by_filters.assert_called_once_with(
-            filters=clean_disk.filter_seq_class.return_value
-        ),
+            filters=clean_disk.filter_seq_class.return_value,
+            order_by=("uuid",),
+            limit=clean_disk.batch_size,
+            columns=("uuid", "path", "created_at"),
+        )
+        clean_disk.repo.multi_update.assert_not_called()
+
+    async def test_clean(self, clean_disk, tmp_path):
+        files = [row(tmp_path / name) for name in ("a", "b", "c")]
+        for file in files[:2]:
+            (tmp_path / file.path).write_bytes(b"data")
+        # third file is already gone
+        clean_disk.repo.get_by_filters.side_effect = [files[:2], files[2:]]
+
+        stats = await clean_disk()
+
+        assert stats.model_dump() == {
+            "files": 3,
+            "removed": 2,
+            "missing": 1,
+            "accessed": 0,
+        }
+        assert list(tmp_path.iterdir()) == []
+        # next batch starts after the last file of the previous one
+        clean_disk.uuid_filter.assert_called_once_with(files[1].uuid, operator.gt)
+        assert clean_disk.repo.get_by_filters.call_count == 2
         clean_disk.repo.multi_update.assert_called_once_with(
-            [str(file.uuid)] if file_exists else [],
+            [str(file.uuid) for file in files[:2]],
             values={"is_removed_from_disk": True},
         )
-        os_mock.remove.assert_called_once_with(file.path)
+
+    async def test_accessed(
+        self,
+        now,
+        clean_disk,
+        get_current_time_mock,
+        mocker,
+        tmp_path,
+    ):
+        mocker.patch("services.clean.get_current_time", get_current_time_mock)
+        mocker.patch.object(clean_disk, "batch_size", 4)
+        unused = row(tmp_path / "a", created_at=now - timedelta(days=1))
+        accessed = row(tmp_path / "b", created_at=now - timedelta(days=1))
+        old = row(tmp_path / "c", created_at=now - timedelta(days=365))
+        for file in (unused, accessed, old):
+            (tmp_path / file.path).write_bytes(b"data")
+        clean_disk.repo.get_by_filters.side_effect = [[unused, accessed, old]]
+        clean_disk.access_repo.get_accessed_since.return_value = {accessed.uuid}
+
+        stats = await clean_disk()
+
+        assert (stats.removed, stats.accessed) == (2, 1)
+        assert [path.name for path in tmp_path.iterdir()] == ["b"]
+        # files older than max_days are removed even if they are accessed
+        clean_disk.access_repo.get_accessed_since.assert_called_once_with(
+            [unused.uuid, accessed.uuid],
+            now - timedelta(days=clean_disk.max_days_unused),
+        )
+
+    async def test_batches(self, clean_disk, tmp_path):
+        files = [row(tmp_path / str(i)) for i in range(5)]
+        for file in files:
+            (tmp_path / file.path).write_bytes(b"data")
+        clean_disk.repo.get_by_filters.side_effect = [
+            files[:2],
+            files[2:4],
+            files[4:],
+        ]
+
+        await clean_disk()
+
+        assert list(tmp_path.iterdir()) == []
+        # every batch is committed with its own update
+        assert sorted(
+            call.args[0] for call in clean_disk.repo.multi_update.call_args_list
+        ) == sorted(
+            [str(file.uuid) for file in files[i : i + 2]]  # noqa: E203
+            for i in range(0, 5, 2)
+        )
+
+    async def test_error(self, clean_disk, tmp_path):
+        clean_disk.repo.get_by_filters.side_effect = [
+            [row(tmp_path / "a"), row(tmp_path / "b")],
+            [row(tmp_path / "c")],
+        ]
+        clean_disk.repo.multi_update.side_effect = Exception("db is down")
+        (tmp_path / "a").write_bytes(b"data")
+
+        with pytest.raises(Exception, match="db is down"):
+            await clean_disk()
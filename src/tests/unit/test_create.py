@@ -1,3 +1,5 @@
+import asyncio
+import gzip
 import io
 import uuid
 from pathlib import Path
@@ -7,7 +9,7 @@ import pytest
 from fastapi import UploadFile
 
 from schemas.files import CreateFileSchema, UploadedFile
-from utils.exceptions import Custom400Exception
+from utils.exceptions import Custom400Exception, Custom503Exception
 
 
 @pytest.mark.asyncio
@@ -97,3 +99,172 @@ class TestCreateFile:
             ),
             session=session,
         )
+        create_file.sync_repo.enqueue.assert_called_once_with(
+            [create_file.repo.create.return_value.uuid], session=session
+        )
+
+    @pytest.mark.parametrize(
+        "format,content,expected_encoding",
+        (
+            ("text/plain", b"line of text\n" * 128, "gzip"),
+            ("unknown", b"line of text\n" * 128, "gzip"),
+            ("text/plain", b"short", None),
+            ("image/png", b"\x89PNG" * 128, None),
+            ("unknown", b"\x00\x01" * 128, None),
+        ),
+    )
+    async def test_create_compressed(
+        self,
+        format,
+        content,
+        expected_encoding,
+        extract_metadata_mock,
+        create_file,
+        aiofiles_mock,
+        aiostream_mock,
+        session,
+        mocker,
+    ):
+        mocker.patch("services.create.aiofiles", aiofiles_mock)
+        extract_metadata_mock.return_value.format = format
+        extract_metadata_mock.return_value.size = len(content)
+
+        upload_file = UploadFile(
+            file=io.BytesIO(content),
+            size=len(content),
+            filename="filename",
+            headers=None,
+        )
+        await create_file(upload_file, session=session)
+
+        written = aiostream_mock.write.call_args.args[0]
+        if expected_encoding is None:
+            assert written == content
+        else:
+            assert gzip.decompress(written) == content
+            assert len(written) < len(content)
+        entry = create_file.repo.create.call_args.kwargs["entry"]
+        assert entry.encoding == expected_encoding
+
+    async def test_create_durable(
+        self,
+        extract_metadata_mock,
+        create_file,
+        aiofiles_mock,
+        aiostream_mock,
+        session,
+        mocker,
+    ):
+        mocker.patch("services.create.aiofiles", aiofiles_mock)
+        mocker.patch("services.create.CHUNK_SIZE", 1000)
+        content = bytes(range(256)) * 8
+        extract_metadata_mock.return_value.format = "image/png"
+        extract_metadata_mock.return_value.size = len(content)
+        uploaded = []
+
+        async def upload_stream(path, chunks, size, encoding):
+            async for chunk in chunks:
+                uploaded.append(bytes(chunk))
+
+        create_file.save_to_s3.upload_stream.side_effect = upload_stream
+
+        upload_file = UploadFile(
+            file=io.BytesIO(content),
+            size=len(content),
+            filename="filename",
+            headers=None,
+        )
+        await create_file(upload_file, durable=True, session=session)
+
+        written = [bytes(call.args[0]) for call in aiostream_mock.write.call_args_list]
+        assert written == uploaded
+        assert [len(chunk) for chunk in uploaded] == [1000, 1000, 48]
+        assert b"".join(uploaded) == content
+        entry = create_file.repo.create.call_args.kwargs["entry"]
+        assert entry.is_saved_to_s3 is True
+        create_file.save_to_s3.upload_stream.assert_called_once_with(
+            entry.path, mock.ANY, len(content), None
+        )
+        create_file.sync_repo.enqueue.assert_not_called()
+
+    async def test_create_durable_failure(
+        self,
+        extract_metadata_mock,
+        create_file,
+        aiofiles_mock,
+        os_mock,
+        session,
+        mocker,
+    ):
+        mocker.patch("services.create.aiofiles", aiofiles_mock)
+        mocker.patch("services.create.os", os_mock)
+        mocker.patch("services.create.random_string", return_value="random")
+        create_file.save_to_s3.upload_stream.side_effect = Exception
+
+        upload_file = UploadFile(
+            file=io.BytesIO(b"content"),
+            size=7,
+            filename="filename",
+            headers=None,
+        )
+        with pytest.raises(Custom503Exception):
+            await create_file(upload_file, durable=True, session=session)
+
+        os_mock.remove.assert_called_once_with(
+            str(Path(create_file.base_path, "random.ext"))
+        )
+        create_file.repo.create.assert_not_called()
+
+    async def test_create_cancelled(
+        self,
+        extract_metadata_mock,
+        create_file,
+        aiofiles_mock,
+        aiostream_mock,
+        os_mock,
+        session,
+        mocker,
+    ):
+        mocker.patch("services.create.aiofiles", aiofiles_mock)
+        mocker.patch("services.create.os", os_mock)
+        mocker.patch("services.create.random_string", return_value="random")
+        aiostream_mock.write.side_effect = asyncio.CancelledError
+
+        upload_file = UploadFile(
+            file=io.BytesIO(b"content"),
+            size=7,
+            filename="filename",
+            headers=None,
+        )
+        with pytest.raises(asyncio.CancelledError):
+            await create_file(upload_file, session=session)
+
+        # partially written file is removed
+        os_mock.remove.assert_called_once_with(
+            str(Path(create_file.base_path, "random.ext"))
+        )
+        create_file.repo.create.assert_not_called()
+
+    async def test_create_with_ttl(
+        self,
+        now,
+        create_file,
+        aiofiles_mock,
+        session,
+        mocker,
+    ):
+        mocker.patch("services.create.aiofiles", aiofiles_mock)
+        get_current_time_with_delta = mocker.patch(
+            "services.create.get_current_time_with_delta", return_value=now
+        )
+        upload_file = UploadFile(
+            file=io.BytesIO(b"data"),
+            size=4,
+            filename="filename",
+            headers=None,
+        )
+
+        await create_file(upload_file, ttl=3600, session=session)
+
+        get_current_time_with_delta.assert_called_once_with(seconds=3600)
+        assert create_file.repo.create.call_args.kwargs["entry"].expires_at == now
@@ -0,0 +1,109 @@
+import asyncio
+import uuid
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from schemas.files import CreateFileSchema
+from utils.exceptions import Custom400Exception
+from utils.sqlalchemy import mode
+
+
+@pytest.mark.asyncio
+class TestCreateDerivative:
+    @pytest.fixture
+    def source(self, file, tmp_path):
+        path = tmp_path / "source.png"
+        Image.new("RGB", (400, 100), "red").save(path)
+        file.path = str(path)
+        file.format = "image/png"
+        file.name = "photo.png"
+        file.parent_uuid = None
+        file.is_removed_from_disk = False
+        return file
+
+    async def test_existing(self, file, create_derivative, mocker):
+        resize_mock = mocker.patch("services.derivatives.resize_image")
+
+        result = await create_derivative(file.uuid, "thumbnail")
+
+        assert result is file
+        create_derivative.filter_class.return_value.assert_any_call(str(file.uuid))
+        create_derivative.filter_class.return_value.assert_any_call("thumbnail")
+        create_derivative.filter_seq_class.assert_called_once_with(
+            mode.and_,
+            create_derivative.filter_class.return_value,
+            create_derivative.filter_class.return_value,
+        )
+        resize_mock.assert_not_called()
+        create_derivative.repo.create.assert_not_called()
+
+    async def test_create(self, source, create_derivative, mocker):
+        mocker.patch("services.derivatives.random_string", return_value="random")
+        create_derivative.repo.get_by_filters.return_value = []
+
+        results = await asyncio.gather(
+            create_derivative(source.uuid, "thumbnail"),
+            create_derivative(source.uuid, "thumbnail"),
+        )
+
+        assert results == [create_derivative.repo.create.return_value] * 2
+        path = Path(create_derivative.base_path, "random.webp")
+        with Image.open(path) as image:
+            assert image.format == "WEBP"
+            assert image.size == (64, 16)
+        create_derivative.repo.create.assert_called_once()
+        entry = create_derivative.repo.create.call_args.kwargs["entry"]
+        assert entry == CreateFileSchema(
+            uuid=entry.uuid,
+            path=str(path),
+            size=path.stat().st_size,
+            format="image/webp",
+            name="photo_thumbnail.webp",
+            ext="webp",
+            parent_uuid=source.uuid,
+            variant="thumbnail",
+        )
+
+    async def test_recreate_evicted(self, source, create_derivative):
+        derivative = type(source)(
+            uuid=uuid.uuid4(),
+            path=str(Path(create_derivative.base_path, "evicted.webp")),
+            is_removed_from_disk=True,
+        )
+        create_derivative.repo.get_by_filters.return_value = [[derivative]]
+
+        result = await create_derivative(source.uuid, "thumbnail")
+
+        assert result is derivative
+        assert result.is_removed_from_disk is False
+        assert Path(derivative.path).exists()
+        create_derivative.repo.update.assert_called_once_with(
+            derivative,
+            values={
+                "size": Path(derivative.path).stat().st_size,
+                "is_removed_from_disk": False,
+            },
+        )
+        create_derivative.repo.create.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "variant,format,content",
+        (
+            ("unknown", "image/png", None),
+            ("thumbnail", "text/plain", None),
+            ("thumbnail", "image/png", b"not an image"),
+        ),
+    )
+    async def test_invalid(self, variant, format, content, source, create_derivative):
+        create_derivative.repo.get_by_filters.return_value = []
+        source.format = format
+        if content is not None:
+            Path(source.path).write_bytes(content)
+
+        with pytest.raises(Custom400Exception):
+            await create_derivative(source.uuid, variant)
+
+        create_derivative.repo.create.assert_not_called()
+        assert list(Path(create_derivative.base_path).glob("*.webp")) == []
@@ -0,0 +1,230 @@
+import pytest
+from botocore.exceptions import ClientError
+from sqlalchemy.exc import IntegrityError
+
+from schemas.files import (
+    CompleteDirectUploadRequest,
+    DirectUploadPart,
+    DirectUploadRequest,
+)
+from utils.exceptions import Custom400Exception
+
+MB = 1024 * 1024
+
+
+@pytest.mark.asyncio
+class TestStartDirectUpload:
+    async def test_single(self, start_direct_upload, s3_mock, mocker):
+        mocker.patch("services.direct.random_string", return_value="random")
+        s3_mock.generate_presigned_url.return_value = "url"
+
+        result = await start_direct_upload(
+            DirectUploadRequest(name="file.png", size=MB, format="image/png")
+        )
+
+        assert result.key == "media/random.png"
+        assert result.urls == ["url"]
+        assert result.upload_id is None
+        s3_mock.generate_presigned_url.assert_called_once_with(
+            "put_object",
+            Params={
+                "Bucket": "bucket",
+                "Key": "media/random.png",
+                "ContentType": "image/png",
+                "ContentLength": MB,
+            },
+            ExpiresIn=3600,
+        )
+        s3_mock.create_multipart_upload.assert_not_called()
+
+    async def test_multipart(self, start_direct_upload, s3_mock, mocker):
+        mocker.patch("services.direct.random_string", return_value="random")
+        s3_mock.create_multipart_upload.return_value = {"UploadId": "id"}
+        s3_mock.generate_presigned_url.side_effect = lambda method, Params, **_: (
+            f"url{Params['PartNumber']}"
+        )
+
+        result = await start_direct_upload(
+            DirectUploadRequest(name="file.bin", size=100 * MB)
+        )
+
+        assert result.upload_id == "id"
+        assert result.part_size == 8 * MB
+        assert result.urls == [f"url{i}" for i in range(1, 14)]
+        # every part is signed with its size, the last one is shorter
+        lengths = [
+            call.kwargs["Params"]["ContentLength"]
+            for call in s3_mock.generate_presigned_url.call_args_list
+        ]
+        assert lengths == [8 * MB] * 12 + [4 * MB]
+        s3_mock.create_multipart_upload.assert_called_once_with(
+            Bucket="bucket",
+            Key="media/random.bin",
+            ContentType="application/octet-stream",
+        )
+
+    async def test_too_big(self, start_direct_upload, s3_mock):
+        with pytest.raises(Custom400Exception):
+            await start_direct_upload(
+                DirectUploadRequest(name="file.bin", size=2 * 1024 * MB)
+            )
+
+        s3_mock.generate_presigned_url.assert_not_called()
+
+
+@pytest.mark.asyncio
+class TestCompleteDirectUpload:
+    @pytest.mark.parametrize("etag", (None, "etag", '"etag"'))
+    async def test_single(self, etag, complete_direct_upload, s3_mock, session, file):
+        s3_mock.head_object.return_value = {"ContentLength": 10, "ETag": '"etag"'}
+
+        result = await complete_direct_upload(
+            CompleteDirectUploadRequest(
+                key="media/random.png",
+                name="file.png",
+                size=10,
+                format="image/png",
+                etag=etag,
+            ),
+            session=session,
+        )
+
+        assert result.uuid == file.uuid
+        s3_mock.complete_multipart_upload.assert_not_called()
+        s3_mock.head_object.assert_called_once_with(
+            Bucket="bucket", Key="media/random.png"
+        )
+        entry = complete_direct_upload.repo.create.call_args.kwargs["entry"]
+        assert entry.path == "/media/random.png"
+        assert (entry.size, entry.format, entry.name, entry.ext) == (
+            10,
+            "image/png",
+            "file.png",
+            "png",
+        )
+        assert entry.is_saved_to_s3 is True
+        assert entry.is_removed_from_disk is True
+
+    async def test_multipart(self, complete_direct_upload, s3_mock, session):
+        s3_mock.head_object.return_value = {"ContentLength": 10, "ETag": "etag"}
+
+        await complete_direct_upload(
+            CompleteDirectUploadRequest(
+                key="media/random.bin",
+                name="file.bin",
+                size=10,
+                upload_id="id",
+                parts=[
+                    DirectUploadPart(part_number=2, etag="b"),
+                    DirectUploadPart(part_number=1, etag="a"),
+                ],
+            ),
+            session=session,
+        )
+
+        s3_mock.complete_multipart_upload.assert_called_once_with(
+            Bucket="bucket",
+            Key="media/random.bin",
+            UploadId="id",
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": 1, "ETag": "a"},
+                    {"PartNumber": 2, "ETag": "b"},
+                ]
+            },
+        )
+        complete_direct_upload.repo.create.assert_called_once()
+
+    async def test_registered_concurrently(
+        self, complete_direct_upload, s3_mock, session
+    ):
+        s3_mock.head_object.return_value = {"ContentLength": 10, "ETag": "etag"}
+        complete_direct_upload.repo.create.side_effect = IntegrityError(
+            "INSERT", {}, Exception()
+        )
+
+        with pytest.raises(Custom400Exception):
+            await complete_direct_upload(
+                CompleteDirectUploadRequest(
+                    key="media/random.bin", name="file.bin", size=10
+                ),
+                session=session,
+            )
+
+        s3_mock.delete_object.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "key,exists,head,deleted",
+        (
+            ("other/random.bin", False, {"ContentLength": 10, "ETag": "etag"}, False),
+            ("media/../random.bin", False, {"ContentLength": 10, "ETag": "e"}, False),
+            ("media/random.bin", True, {"ContentLength": 10, "ETag": "etag"}, False),
+            ("media/random.bin", False, ClientError({}, "HeadObject"), False),
+            ("media/random.bin", False, {"ContentLength": 9, "ETag": "etag"}, True),
+            ("media/random.bin", False, {"ContentLength": 10, "ETag": "other"}, True),
+        ),
+    )
+    async def test_invalid(
+        self,
+        key,
+        exists,
+        head,
+        deleted,
+        complete_direct_upload,
+        s3_mock,
+        session,
+    ):
+        complete_direct_upload.repo.exists_by_field.return_value = exists
+        if isinstance(head, Exception):
+            s3_mock.head_object.side_effect = head
+        else:
+            s3_mock.head_object.return_value = head
+
+        with pytest.raises(Custom400Exception):
+            await complete_direct_upload(
+                CompleteDirectUploadRequest(
+                    key=key, name="file.bin", size=10, etag="etag"
+                ),
+                session=session,
+            )
+
+        assert s3_mock.delete_object.called is deleted
+        complete_direct_upload.repo.create.assert_not_called()
+
+
+@pytest.mark.asyncio
+class TestPresignDownload:
+    async def test_presign(self, file, presign_download, s3_mock, mocker):
+        time_mock = mocker.patch("services.direct.time")
+        time_mock.monotonic.return_value = 1000
+        file.name = "my file.txt"
+        s3_mock.generate_presigned_url.side_effect = ["url1", "url2"]
+
+        assert await presign_download(file) == "url1"
+        s3_mock.generate_presigned_url.assert_called_once_with(
+            "get_object",
+            Params={
+                "Bucket": "bucket",
+                "Key": file.path.strip("/"),
+                "ResponseContentType": "application/octet-stream",
+                "ResponseContentDisposition": 'attachment; filename="my-file.txt"',
+            },
+            ExpiresIn=300,
+        )
+
+        # cached until shortly before expiration
+        time_mock.monotonic.return_value = 1269
+        assert await presign_download(file) == "url1"
+        time_mock.monotonic.return_value = 1270
+        assert await presign_download(file) == "url2"
+        assert s3_mock.generate_presigned_url.call_count == 2
+
+    @pytest.mark.parametrize("enabled,is_saved_to_s3", ((False, True), (True, False)))
+    async def test_unavailable(
+        self, enabled, is_saved_to_s3, file, presign_download, s3_mock
+    ):
+        presign_download.enabled = enabled
+        file.is_saved_to_s3 = is_saved_to_s3
+
+        assert await presign_download(file) is None
+        s3_mock.generate_presigned_url.assert_not_called()
@@ -0,0 +1,128 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from services import evict
+from utils.file import DiskUsage
+from utils.sqlalchemy import operator
+
+
+def row(path, size):
+    path.write_bytes(b"0" * size)
+    return SimpleNamespace(uuid=uuid.uuid4(), path=str(path), size=size)
+
+
+@pytest.fixture
+def get_disk_usage_mock(mocker):
+    return mocker.patch.object(evict, "get_disk_usage")
+
+
+@pytest.mark.asyncio
+class TestEvictFromDisk:
+    @pytest.mark.parametrize(
+        "high_watermark,used,expected",
+        ((0.9, 89, False), (0.9, 90, True), (0, 100, False)),
+    )
+    async def test_is_needed(
+        self,
+        high_watermark,
+        used,
+        expected,
+        evict_from_disk,
+        get_disk_usage_mock,
+        mocker,
+    ):
+        mocker.patch.object(evict_from_disk, "high_watermark", high_watermark)
+        get_disk_usage_mock.return_value = DiskUsage(used=used, total=100)
+
+        assert await evict_from_disk.is_needed() is expected
+        assert get_disk_usage_mock.called is bool(high_watermark)
+
+    async def test_evict(self, evict_from_disk, get_disk_usage_mock, tmp_path):
+        files = [
+            row(tmp_path / name, size) for name, size in (("a", 2), ("b", 2), ("c", 3))
+        ]
+        get_disk_usage_mock.side_effect = [
+            DiskUsage(used=85, total=100),
+            DiskUsage(used=79, total=100),
+        ]
+        evict_from_disk.repo.get_least_recently_used.side_effect = [
+            files[:2],
+            files[2:],
+        ]
+
+        stats = await evict_from_disk()
+
+        assert stats.model_dump() == {
+            "files": 3,
+            "bytes": 7,
+            "usage_before": 0.85,
+            "usage_after": 0.79,
+        }
+        assert not any((tmp_path / name).exists() for name in ("a", "b", "c"))
+        assert [
+            call.args[0] for call in evict_from_disk.repo.multi_update.call_args_list
+        ] == [[files[0].uuid, files[1].uuid], [files[2].uuid]]
+        evict_from_disk.repo.multi_update.assert_called_with(
+            [files[2].uuid], values={"is_removed_from_disk": True}
+        )
+        evict_from_disk.repo.get_least_recently_used.assert_called_with(2)
+        evict_from_disk.repo.get_by_filters.assert_not_called()
+
+    async def test_evict_largest(
+        self, evict_from_disk, get_disk_usage_mock, tmp_path, mocker
+    ):
+        mocker.patch.object(evict_from_disk, "order", "size")
+        files = [row(tmp_path / "a", 6)]
+        get_disk_usage_mock.return_value = DiskUsage(used=85, total=100)
+        evict_from_disk.repo.get_by_filters.return_value = files
+
+        stats = await evict_from_disk()
+
+        assert stats.files == 1
+        evict_from_disk.is_saved_to_s3_filter.assert_called_with(True, operator.is_)
+        kwargs = evict_from_disk.repo.get_by_filters.call_args.kwargs
+        assert kwargs["order_by"] == ("-size",)
+        assert kwargs["limit"] == 2
+        assert kwargs["columns"] == ("uuid", "path", "size")
+
+    async def test_usage_not_dropping(
+        self, evict_from_disk, get_disk_usage_mock, tmp_path
+    ):
+        files = [row(tmp_path / name, size) for name, size in (("a", 6), ("b", 6))]
+        # space of other data or of files still open is not freed
+        get_disk_usage_mock.return_value = DiskUsage(used=85, total=100)
+        evict_from_disk.repo.get_least_recently_used.return_value = files
+
+        stats = await evict_from_disk()
+
+        # batch is cut to the excess, no more is evicted until the next check
+        assert (stats.files, stats.bytes, stats.usage_after) == (1, 6, 0.85)
+        evict_from_disk.repo.get_least_recently_used.assert_called_once()
+        assert (tmp_path / "b").exists()
+
+    async def test_below_low_watermark(self, evict_from_disk, get_disk_usage_mock):
+        get_disk_usage_mock.return_value = DiskUsage(used=80, total=100)
+
+        stats = await evict_from_disk()
+
+        assert stats.files == 0
+        evict_from_disk.repo.get_least_recently_used.assert_not_called()
+
+    async def test_nothing_to_evict(self, evict_from_disk, get_disk_usage_mock):
+        get_disk_usage_mock.return_value = DiskUsage(used=99, total=100)
+        evict_from_disk.repo.get_least_recently_used.return_value = []
+
+        stats = await evict_from_disk()
+
+        assert stats.files == 0
+        assert stats.usage_after == 0.99
+        evict_from_disk.repo.multi_update.assert_not_called()
+
+
+def test_get_disk_usage(tmp_path):
+    usage = evict.get_disk_usage(str(tmp_path))
+
+    assert 0 < usage.used <= usage.total
+    assert 0 < usage.ratio <= 1
@@ -0,0 +1,97 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from services import expire
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def expiring(seconds):
+    return SimpleNamespace(
+        uuid=uuid.uuid4(),
+        expires_at=NOW + timedelta(seconds=seconds),
+    )
+
+
+def deleted(path, is_saved_to_s3=True, is_removed_from_disk=False):
+    return SimpleNamespace(
+        path=str(path),
+        is_saved_to_s3=is_saved_to_s3,
+        is_removed_from_disk=is_removed_from_disk,
+    )
+
+
+@pytest.fixture
+def clock(mocker):
+    # time moves only when the service sleeps
+    clock = SimpleNamespace(now=NOW, sleeps=[])
+
+    async def sleep(seconds):
+        clock.sleeps.append(seconds)
+        clock.now += timedelta(seconds=seconds)
+
+    mocker.patch.object(expire, "get_current_time", side_effect=lambda: clock.now)
+    mocker.patch.object(expire.asyncio, "sleep", side_effect=sleep)
+    return clock
+
+
+@pytest.mark.asyncio
+class TestExpireFiles:
+    async def test_expire(self, expire_files, s3_mock, clock, tmp_path):
+        overdue, first, second = expiring(-5), expiring(10), expiring(30)
+        # returned in deadline order by the index, heap does not rely on it
+        expire_files.repo.get_expiring.return_value = [second, overdue, first]
+        (tmp_path / "a").write_bytes(b"data")
+        (tmp_path / "b").write_bytes(b"data")
+        expire_files.repo.delete_expired.side_effect = [
+            [deleted(tmp_path / "a"), deleted(tmp_path / "a_variant", False)],
+            [deleted(tmp_path / "b", is_removed_from_disk=True)],
+            [],
+        ]
+        s3_mock.delete_objects.return_value = {}
+
+        stats = await expire_files()
+
+        assert stats.model_dump() == {"files": 3, "objects": 2}
+        expire_files.repo.get_expiring.assert_called_once_with(
+            NOW + timedelta(seconds=60), 100
+        )
+        # every file is removed at its deadline, not earlier
+        assert [
+            call.args for call in expire_files.repo.delete_expired.call_args_list
+        ] == [
+            ([overdue.uuid], NOW),
+            ([first.uuid], first.expires_at),
+            ([second.uuid], second.expires_at),
+        ]
+        assert clock.sleeps == [10, 20]
+        assert (tmp_path / "a").exists() is False
+        # file removed from disk before is left to s3 deletion
+        assert (tmp_path / "b").exists() is True
+        s3_mock.delete_objects.assert_any_call(
+            Bucket="bucket",
+            Delete={
+                "Objects": [{"Key": str(tmp_path / "a").strip("/")}],
+                "Quiet": True,
+            },
+        )
+
+    async def test_nothing_expiring(self, expire_files, s3_mock, clock):
+        expire_files.repo.get_expiring.return_value = []
+
+        assert (await expire_files()).files == 0
+        expire_files.repo.delete_expired.assert_not_called()
+        assert clock.sleeps == []
+
+    async def test_s3_failure(self, expire_files, s3_mock, clock, tmp_path):
+        expire_files.repo.get_expiring.return_value = [expiring(0)]
+        expire_files.repo.delete_expired.return_value = [deleted(tmp_path / "a")]
+        s3_mock.delete_objects.side_effect = Exception("s3 is down")
+
+        stats = await expire_files()
+
+        # objects left behind are removed by reconciliation
+        assert stats.model_dump() == {"files": 1, "objects": 0}
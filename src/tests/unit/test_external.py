@@ -1,4 +1,20 @@
+import asyncio
+import base64
+import hashlib
+import os
+from unittest import mock
+
 import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from utils.asyncio import CircuitOpenError, Hedger
+from utils.exceptions import (
+    Custom400Exception,
+    Custom404Exception,
+    Custom416Exception,
+    Custom503Exception,
+)
+from utils.s3 import MB, get_part_size
 
 
 class S3Error(Exception):
@@ -31,7 +47,7 @@ class TestSaveFileToS3:
         upload_error,
         expected_error,
         file,
-        boto3_mock,
+        s3_client_mock,
         s3_mock,
         save_file_to_s3,
         aiofiles_mock,
@@ -40,7 +56,7 @@ class TestSaveFileToS3:
     ):
         mocker.patch("services.external.aiofiles", aiofiles_mock)
         if s3_error:
-            boto3_mock.client.side_effect = S3Error
+            s3_client_mock.side_effect = S3Error
         if file_error:
             aiofiles_mock.open.side_effect = FileError
         if upload_error:
@@ -57,10 +73,7 @@ class TestSaveFileToS3:
             )
         else:
             save_file_to_s3.repo.update.assert_not_called()
-        boto3_mock.client.assert_called_once_with(
-            "s3",
-            endpoint_url=save_file_to_s3.endpoint_url,
-        )
+        s3_client_mock.assert_called_once_with()
         if s3_error:
             aiofiles_mock.open.assert_not_called()
             s3_mock.upload_fileobj.assert_not_called()
@@ -74,3 +87,338 @@ class TestSaveFileToS3:
             save_file_to_s3.bucket,
             file.path.strip("/"),
         )
+
+    async def test_circuit_open(
+        self,
+        file,
+        s3_client_mock,
+        s3_mock,
+        save_file_to_s3,
+        aiofiles_mock,
+        mocker,
+    ):
+        mocker.patch("services.external.aiofiles", aiofiles_mock)
+        s3_mock.upload_fileobj.side_effect = EndpointConnectionError(
+            endpoint_url="http://s3"
+        )
+        for _ in range(2):
+            assert await save_file_to_s3("uuid") is False
+
+        # s3 is not called again until the reset timeout passes
+        with pytest.raises(CircuitOpenError):
+            await save_file_to_s3("uuid")
+        with pytest.raises(CircuitOpenError):
+            await save_file_to_s3.upload_stream("/media/file", None, 1024)
+        assert s3_client_mock.call_count == 2
+        save_file_to_s3.repo.update.assert_not_called()
+
+    @pytest.mark.parametrize("encoding", (None, "gzip"))
+    async def test_content_encoding(
+        self,
+        encoding,
+        file,
+        s3_mock,
+        save_file_to_s3,
+        aiofiles_mock,
+        aiostream_mock,
+        mocker,
+    ):
+        mocker.patch("services.external.aiofiles", aiofiles_mock)
+        file.encoding = encoding
+
+        assert await save_file_to_s3("uuid") is True
+
+        extra = {} if encoding is None else {"ExtraArgs": {"ContentEncoding": encoding}}
+        s3_mock.upload_fileobj.assert_called_once_with(
+            aiostream_mock,
+            save_file_to_s3.bucket,
+            file.path.strip("/"),
+            **extra,
+        )
+
+    @pytest.mark.parametrize("encoding", (None, "gzip"))
+    async def test_multipart(self, encoding, file, s3_mock, save_file_to_s3, tmp_path):
+        content = os.urandom(2 * 1024 * 1024 + 512)
+        path = tmp_path / "file"
+        path.write_bytes(content)
+        file.path, file.size, file.encoding = str(path), len(content), encoding
+        s3_mock.create_multipart_upload.return_value = {"UploadId": "id"}
+        s3_mock.upload_part.side_effect = lambda **kwargs: {
+            "ETag": f"etag{kwargs['PartNumber']}"
+        }
+
+        assert await save_file_to_s3("uuid") is True
+
+        key = file.path.strip("/")
+        extra = {} if encoding is None else {"ContentEncoding": encoding}
+        s3_mock.create_multipart_upload.assert_called_once_with(
+            Bucket=save_file_to_s3.bucket,
+            Key=key,
+            ChecksumAlgorithm="SHA256",
+            **extra,
+        )
+        parts = [content[:MB], content[MB : 2 * MB], content[2 * MB :]]  # noqa: E203
+        checksums = [
+            base64.b64encode(hashlib.sha256(part).digest()).decode() for part in parts
+        ]
+        uploaded = sorted(
+            s3_mock.upload_part.call_args_list,
+            key=lambda call: call.kwargs["PartNumber"],
+        )
+        assert [call.kwargs["Body"] for call in uploaded] == parts
+        assert [call.kwargs["ChecksumSHA256"] for call in uploaded] == checksums
+        s3_mock.complete_multipart_upload.assert_called_once_with(
+            Bucket=save_file_to_s3.bucket,
+            Key=key,
+            UploadId="id",
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": i, "ETag": f"etag{i}", "ChecksumSHA256": checksum}
+                    for i, checksum in enumerate(checksums, 1)
+                ]
+            },
+        )
+        s3_mock.abort_multipart_upload.assert_not_called()
+        s3_mock.upload_fileobj.assert_not_called()
+        save_file_to_s3.repo.update.assert_called_once_with(
+            file,
+            values={"is_saved_to_s3": True},
+        )
+
+    @pytest.mark.parametrize("encoding", (None, "gzip"))
+    async def test_hedged(self, encoding, file, s3_mock, save_file_to_s3, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes(b"content")
+        file.path, file.size, file.encoding = str(path), 7, encoding
+        save_file_to_s3.hedge.enabled = True
+
+        assert await save_file_to_s3("uuid") is True
+
+        extra = {} if encoding is None else {"ContentEncoding": encoding}
+        s3_mock.put_object.assert_called_once_with(
+            Bucket=save_file_to_s3.bucket,
+            Key=file.path.strip("/"),
+            Body=b"content",
+            **extra,
+        )
+        s3_mock.upload_fileobj.assert_not_called()
+
+    async def test_multipart_failure(self, file, s3_mock, save_file_to_s3, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes(os.urandom(3 * 1024 * 1024))
+        file.path, file.size = str(path), 3 * 1024 * 1024
+        s3_mock.create_multipart_upload.return_value = {"UploadId": "id"}
+        s3_mock.upload_part.side_effect = UploadError
+
+        assert await save_file_to_s3("uuid") is False
+
+        s3_mock.complete_multipart_upload.assert_not_called()
+        s3_mock.abort_multipart_upload.assert_called_once_with(
+            Bucket=save_file_to_s3.bucket,
+            Key=file.path.strip("/"),
+            UploadId="id",
+        )
+        save_file_to_s3.repo.update.assert_not_called()
+
+
+class Body:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    async def iter_chunks(self, chunk_size):
+        for chunk in self.chunks:
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+class TestStreamFileFromS3:
+    @pytest.mark.parametrize(
+        "range,status_code,extra_headers",
+        (
+            (None, 200, {}),
+            ("bytes=0-3", 206, {"Content-Range": "bytes 0-3/8"}),
+        ),
+    )
+    async def test_stream(
+        self, range, status_code, extra_headers, file, s3_mock, stream_file_from_s3
+    ):
+        file.is_saved_to_s3 = True
+        body = Body([b"abcd", b"efgh"] if range is None else [b"abcd"])
+        s3_mock.get_object.return_value = {
+            "Body": body,
+            "ContentLength": 8 if range is None else 4,
+            "ETag": '"etag"',
+            "ResponseMetadata": {"HTTPStatusCode": status_code},
+            **({"ContentRange": "bytes 0-3/8"} if range else {}),
+        }
+
+        result = await stream_file_from_s3(file, range)
+
+        extra = {} if range is None else {"Range": range}
+        s3_mock.get_object.assert_called_once_with(
+            Bucket="bucket",
+            Key=file.path.strip("/"),
+            **extra,
+        )
+        assert result.status_code == status_code
+        assert result.headers == {
+            "Accept-Ranges": "bytes",
+            "Content-Length": "8" if range is None else "4",
+            "ETag": '"etag"',
+            **extra_headers,
+        }
+        # slot is held until the stream is over
+        assert stream_file_from_s3.semaphore.locked()
+        assert b"".join([chunk async for chunk in result.chunks]) == b"".join(
+            body.chunks
+        )
+        assert body.closed
+        assert not stream_file_from_s3.semaphore.locked()
+
+    async def test_not_saved_to_s3(self, file, s3_mock, stream_file_from_s3):
+        file.is_saved_to_s3 = False
+
+        with pytest.raises(Custom400Exception):
+            await stream_file_from_s3(file)
+
+        s3_mock.get_object.assert_not_called()
+
+    async def test_busy(self, file, s3_mock, stream_file_from_s3):
+        file.is_saved_to_s3 = True
+        s3_mock.get_object.return_value = {
+            "Body": Body([b"abcd"]),
+            "ContentLength": 4,
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+        }
+        result = await stream_file_from_s3(file)
+
+        with pytest.raises(Custom503Exception):
+            await stream_file_from_s3(file)
+
+        [chunk async for chunk in result.chunks]
+        assert (await stream_file_from_s3(file)).status_code == 200
+
+    @pytest.mark.parametrize(
+        "code,expected_error",
+        (
+            ("InvalidRange", Custom416Exception),
+            ("NoSuchKey", Custom404Exception),
+            ("AccessDenied", ClientError),
+        ),
+    )
+    async def test_error(
+        self, code, expected_error, file, s3_mock, stream_file_from_s3
+    ):
+        file.is_saved_to_s3 = True
+        s3_mock.get_object.side_effect = ClientError(
+            {"Error": {"Code": code}}, "GetObject"
+        )
+
+        with pytest.raises(expected_error):
+            await stream_file_from_s3(file, "bytes=100-")
+
+        assert not stream_file_from_s3.semaphore.locked()
+
+
+@pytest.mark.asyncio
+class TestHedger:
+    @pytest.fixture
+    def hedger(self):
+        hedger = Hedger(enabled=True, percentile=95, budget=0.5, discard=mock.Mock())
+        hedger.delay = 0.01
+        return hedger
+
+    @staticmethod
+    def call(*delays, error=None):
+        started = []
+
+        async def func():
+            started.append(len(started))
+            number = started[-1]
+            await asyncio.sleep(delays[number])
+            if error is not None:
+                raise error
+            return number
+
+        return func, started
+
+    async def test_fast(self, hedger):
+        func, started = self.call(0)
+
+        assert await hedger(func) == 0
+        assert started == [0]
+
+    async def test_slow(self, hedger):
+        func, started = self.call(1, 0)
+
+        # duplicate answers first, the slow call is cancelled
+        assert await asyncio.wait_for(hedger(func), 0.5) == 1
+        assert started == [0, 1]
+        hedger.discard.assert_not_called()
+
+    async def test_both_done(self, hedger):
+        gate = asyncio.Event()
+        calls = []
+
+        async def func():
+            calls.append(len(calls))
+            if calls[-1] == 0:
+                # slow first call finishes along with the duplicate
+                await gate.wait()
+                return 0
+            gate.set()
+            return 1
+
+        result = await hedger(func)
+        await asyncio.sleep(0)
+
+        # result of the loser is cleaned up
+        assert calls == [0, 1]
+        hedger.discard.assert_called_once_with(1 - result)
+
+    async def test_budget(self, hedger):
+        hedger.budget = 0
+        hedger._tokens = 0
+        func, started = self.call(0.05, 0)
+
+        assert await hedger(func) == 0
+        assert started == [0]
+
+    @pytest.mark.parametrize("enabled,delay", ((False, 0.01), (True, None)))
+    async def test_not_hedged(self, enabled, delay, hedger):
+        hedger.enabled, hedger.delay = enabled, delay
+        func, started = self.call(0.05, 0)
+
+        assert await hedger(func) == 0
+        assert started == [0]
+
+    async def test_failure(self, hedger):
+        func, started = self.call(0.05, 0, error=S3Error())
+
+        with pytest.raises(S3Error):
+            await hedger(func)
+        assert started == [0, 1]
+
+    async def test_delay(self):
+        hedger = Hedger(enabled=True, percentile=95, budget=0.05)
+        for latency in range(1, 101):
+            hedger._record(latency / 100)
+
+        assert hedger.delay == 0.95
+
+
+@pytest.mark.parametrize(
+    "size,min_part_size,expected_result",
+    (
+        (0, 8 * MB, 8 * MB),
+        (100 * MB, 8 * MB, 8 * MB),
+        (100 * 1024 * MB, 8 * MB, 11 * MB),
+        (100 * 1024 * MB, 16 * MB, 16 * MB),
+    ),
+)
+def test_get_part_size(size, min_part_size, expected_result):
+    assert get_part_size(size, min_part_size) == expected_result
@@ -1,9 +1,15 @@
+import asyncio
+import gzip
 import io
+import struct
 
 import pytest
 from fastapi import UploadFile
+from PIL import Image
 
 from schemas.files import FileMetadata
+from utils.attributes import extract_attributes
+from utils.compression import GZIP
 
 
 class TestExtractMetadata:
@@ -42,3 +48,141 @@ class TestExtractMetadata:
     )
     def test_extract(self, upload_file, expected_result, extract_metadata):
         assert extract_metadata(upload_file) == expected_result
+
+
+def _mp4(duration: int, timescale: int) -> bytes:
+    def box(kind: bytes, payload: bytes) -> bytes:
+        return struct.pack(">I4s", len(payload) + 8, kind) + payload
+
+    mvhd = box(b"mvhd", bytes(12) + struct.pack(">II", timescale, duration))
+    return (
+        box(b"ftyp", b"isom" + bytes(4))
+        + box(b"mdat", bytes(4096))
+        + box(b"moov", box(b"trak", bytes(16)) + mvhd)
+    )
+
+
+def _wav(seconds: int, sample_rate: int) -> bytes:
+    byte_rate = sample_rate * 2
+    fmt = struct.pack("<HHIIHH", 1, 1, sample_rate, byte_rate, 2, 16)
+    data = bytes(seconds * byte_rate)
+    return (
+        b"RIFF"
+        + struct.pack("<I", 4 + 8 + len(fmt) + 8 + len(data))
+        + b"WAVE"
+        + b"fmt "
+        + struct.pack("<I", len(fmt))
+        + fmt
+        + b"LIST"
+        + struct.pack("<I", 3)
+        + b"abc\x00"
+        + b"data"
+        + struct.pack("<I", len(data))
+        + data
+    )
+
+
+def _image(format: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (120, 45)).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+class TestExtractAttributes:
+    @pytest.mark.parametrize(
+        "content,expected_result",
+        (
+            (b"plain text", {"mime": None}),
+            (_image("png"), {"mime": "image/png", "width": 120, "height": 45}),
+            (_image("jpeg"), {"mime": "image/jpeg", "width": 120, "height": 45}),
+            (_image("gif"), {"mime": "image/gif", "width": 120, "height": 45}),
+            (_image("webp"), {"mime": "image/webp", "width": 120, "height": 45}),
+            (_image("bmp"), {"mime": "image/bmp", "width": 120, "height": 45}),
+            (_mp4(1500, 1000), {"mime": "video/mp4", "duration": 1.5}),
+            (
+                _wav(2, 8000),
+                {
+                    "mime": "audio/wav",
+                    "duration": 2.0,
+                    "channels": 1,
+                    "sample_rate": 8000,
+                },
+            ),
+            (
+                b"%PDF-1.4\n1 0 obj << /Type /Pages /Kids [2 0 R] /Count 3 >>\n"
+                b"2 0 obj << /Type /Pages /Parent 1 0 R /Count 2 >>\n%%EOF",
+                {"mime": "application/pdf", "pages": 3},
+            ),
+            # damaged file still gets its type detected
+            (_image("png")[:20], {"mime": "image/png"}),
+        ),
+    )
+    def test_extract_attributes(self, content, expected_result, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes(content)
+
+        assert extract_attributes(str(path)) == expected_result
+
+    @pytest.mark.parametrize(
+        "middle,tail,expected_result",
+        (
+            (b"", b"1 0 obj << /Type /Pages /Count 7 >>", {"pages": 7}),
+            # page tree far from both ends is not scanned
+            (b"1 0 obj << /Type /Pages /Count 7 >>", b"", {}),
+        ),
+    )
+    def test_extract_attributes_pdf_scanned(
+        self, middle, tail, expected_result, tmp_path, mocker
+    ):
+        mocker.patch("utils.attributes._PDF_SCAN_SIZE", 2048)
+        path = tmp_path / "file"
+        path.write_bytes(
+            b"%PDF-1.4\n" + b" " * 4096 + middle + b" " * 4096 + tail + b"\n%%EOF"
+        )
+
+        assert extract_attributes(str(path)) == {
+            "mime": "application/pdf",
+            **expected_result,
+        }
+
+    def test_extract_attributes_gzip(self, tmp_path):
+        path = tmp_path / "file.gz"
+        path.write_bytes(gzip.compress(_image("png")))
+
+        assert extract_attributes(str(path), GZIP) == {
+            "mime": "image/png",
+            "width": 120,
+            "height": 45,
+        }
+
+    @pytest.mark.asyncio
+    async def test_call(self, extract_attributes, file, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes(_image("gif"))
+        file.path = str(path)
+        expected_result = {"mime": "image/gif", "width": 120, "height": 45}
+
+        results = await asyncio.gather(
+            extract_attributes(file),
+            extract_attributes(file),
+        )
+
+        assert results == [expected_result, expected_result]
+        extract_attributes.repo.update.assert_awaited_once_with(
+            file, values={"attributes": expected_result}
+        )
+        assert file.attributes == expected_result
+
+    @pytest.mark.asyncio
+    async def test_call_extracted(self, extract_attributes, file):
+        file.attributes = {"mime": None}
+
+        assert await extract_attributes(file) == {"mime": None}
+        extract_attributes.repo.update.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_call_missing(self, extract_attributes, file):
+        file.path = "missing"
+
+        assert await extract_attributes(file) is None
+        extract_attributes.repo.update.assert_not_awaited()
@@ -0,0 +1,192 @@
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from services import orphans
+from utils.file import DirEntry, move_files, scan_directory
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+OLD = NOW - timedelta(days=1)
+
+
+def row(path, is_saved_to_s3=True, is_removed_from_disk=False, updated_at=OLD):
+    return SimpleNamespace(
+        uuid=uuid.uuid4(),
+        path=str(path),
+        is_saved_to_s3=is_saved_to_s3,
+        is_removed_from_disk=is_removed_from_disk,
+        updated_at=updated_at,
+    )
+
+
+def write(path, modified_at=OLD):
+    path.write_bytes(b"data")
+    os.utime(path, (modified_at.timestamp(), modified_at.timestamp()))
+
+
+def table(rows):
+    # keyset pages of rows sorted by path, the way db returns them
+    async def get_page_by_path(after, limit):
+        return sorted(
+            (file for file in rows if after is None or file.path > after),
+            key=lambda file: file.path,
+        )[:limit]
+
+    return get_page_by_path
+
+
+@pytest.fixture(autouse=True)
+def get_current_time_mock(mocker):
+    return mocker.patch.object(orphans, "get_current_time", return_value=NOW)
+
+
+@pytest.mark.asyncio
+class TestReconcileDisk:
+    async def test_reconcile(self, reconcile_disk, tmp_path):
+        media = tmp_path / "media"
+        for name in ("a", "b"):
+            write(media / name)
+        # could be written before its row is created
+        write(media / "c", modified_at=NOW)
+        missing = row(media / "a2")
+        lost = row(media / "a3", is_saved_to_s3=False)
+        reconcile_disk.repo.get_page_by_path.side_effect = table(
+            [
+                row(media / "a"),
+                missing,
+                lost,
+                # updated after the directory could have been scanned
+                row(media / "a4", updated_at=NOW),
+                row(media / "a5", is_removed_from_disk=True),
+                row(tmp_path / "other" / "a"),
+            ]
+        )
+
+        stats = await reconcile_disk()
+
+        assert stats.model_dump() == {
+            "entries": 3,
+            "files": 5,
+            "orphans": 1,
+            "orphan_bytes": 4,
+            "missing": 1,
+            "lost": 1,
+            "finished": True,
+        }
+        assert sorted(os.listdir(media)) == [".reconcile", "a", "c"]
+        assert os.listdir(tmp_path / "orphans") == ["b"]
+        assert (media / ".reconcile").read_text() == ""
+        reconcile_disk.repo.multi_update.assert_called_once_with(
+            [missing.uuid], values={"is_removed_from_disk": True}
+        )
+
+    async def test_removed_from_disk(self, reconcile_disk, tmp_path):
+        media = tmp_path / "media"
+        for name in ("a", "b"):
+            write(media / name)
+        reconcile_disk.repo.get_page_by_path.side_effect = table(
+            [
+                # variant sharing the path of a file kept on disk
+                row(media / "a", is_removed_from_disk=True),
+                row(media / "a"),
+                row(media / "b", is_removed_from_disk=True),
+            ]
+        )
+
+        stats = await reconcile_disk()
+
+        assert (stats.orphans, stats.missing, stats.lost) == (1, 0, 0)
+        assert os.listdir(tmp_path / "orphans") == ["b"]
+        reconcile_disk.repo.multi_update.assert_not_called()
+
+    async def test_resume(self, reconcile_disk, tmp_path):
+        media = tmp_path / "media"
+        for index in range(1, 7):
+            write(media / f"f{index}")
+        reconcile_disk.repo.get_page_by_path.side_effect = table(
+            [row(media / "f5"), row(media / "g")]
+        )
+
+        first = await reconcile_disk()
+
+        assert (first.entries, first.files, first.orphans) == (4, 0, 4)
+        assert not first.finished
+        assert (media / ".reconcile").read_text() == "f4"
+
+        second = await reconcile_disk()
+
+        assert (second.entries, second.files, second.orphans) == (2, 2, 1)
+        assert second.finished
+        assert sorted(os.listdir(tmp_path / "orphans")) == [
+            "f1",
+            "f2",
+            "f3",
+            "f4",
+            "f6",
+        ]
+        # rows before the cursor are not read again
+        reconcile_disk.repo.get_page_by_path.assert_any_call(f"{media}/f4", 2)
+
+    async def test_removed_while_scanned(self, reconcile_disk, tmp_path, mocker):
+        media = tmp_path / "media"
+        for index in range(1, 7):
+            write(media / f"f{index}")
+        reconcile_disk.repo.get_page_by_path.side_effect = table(
+            [row(media / "f5"), row(media / "f6")]
+        )
+        stat = os.stat
+
+        def vanish(path, **kwargs):
+            # removed by another job after its name was listed
+            if path == str(media / "f2"):
+                raise FileNotFoundError(path)
+            return stat(path, **kwargs)
+
+        mocker.patch.object(os, "stat", side_effect=vanish)
+
+        stats = await reconcile_disk()
+
+        # files after the slice are not taken for missing ones
+        assert (stats.entries, stats.files, stats.missing) == (3, 0, 0)
+        assert not stats.finished
+        assert (media / ".reconcile").read_text() == "f4"
+        reconcile_disk.repo.multi_update.assert_not_called()
+
+    async def test_delete(self, reconcile_disk, tmp_path):
+        reconcile_disk.quarantine = ""
+        write(tmp_path / "media" / "a")
+        reconcile_disk.repo.get_page_by_path.return_value = []
+
+        stats = await reconcile_disk()
+
+        assert stats.orphans == 1
+        assert os.listdir(tmp_path / "media") == [".reconcile"]
+        assert not (tmp_path / "orphans").exists()
+
+
+def test_scan_directory(tmp_path):
+    for name in ("c", "a", "d", "b", ".hidden"):
+        write(tmp_path / name)
+    (tmp_path / "dir").mkdir()
+
+    assert scan_directory(str(tmp_path), "a", 2) == (
+        [
+            DirEntry(name="b", size=4, mtime=OLD.timestamp()),
+            DirEntry(name="c", size=4, mtime=OLD.timestamp()),
+        ],
+        "c",
+    )
+    entries, last = scan_directory(str(tmp_path), "b", 2)
+    assert ([entry.name for entry in entries], last) == (["c", "d"], None)
+
+
+def test_move_files(tmp_path):
+    write(tmp_path / "a")
+
+    moved = move_files([str(tmp_path / "a"), str(tmp_path / "b")], str(tmp_path / "q"))
+
+    assert moved == [True, False]
+    assert os.listdir(tmp_path / "q") == ["a"]
@@ -0,0 +1,94 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from services import placement
+from utils.heat import to_count, to_heat
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def row(path):
+    path.write_bytes(b"data")
+    return SimpleNamespace(uuid=uuid.uuid4(), path=str(path))
+
+
+@pytest.fixture(autouse=True)
+def get_current_time_mock(mocker):
+    return mocker.patch.object(placement, "get_current_time", return_value=NOW)
+
+
+@pytest.mark.asyncio
+class TestPlaceFiles:
+    async def test_demote(self, place_files, tmp_path):
+        files = [row(tmp_path / name) for name in ("a", "b", "c")]
+        place_files.repo.get_cold_page.side_effect = [files[:2], files[2:]]
+        place_files.repo.get_hot.return_value = []
+
+        stats = await place_files()
+
+        assert stats.model_dump() == {"demoted": 3, "promoted": 0}
+        assert list(tmp_path.iterdir()) == []
+        heat_below = to_heat(0.5, NOW, 3600)
+        created_before = NOW - timedelta(seconds=60)
+        assert [
+            call.args for call in place_files.repo.get_cold_page.call_args_list
+        ] == [
+            (heat_below, created_before, None, 2),
+            (heat_below, created_before, files[1].uuid, 2),
+        ]
+        place_files.repo.multi_update.assert_called_with(
+            [files[2].uuid], values={"is_removed_from_disk": True}
+        )
+
+    async def test_promote(self, place_files):
+        promoted = SimpleNamespace(uuid=uuid.uuid4(), is_removed_from_disk=True)
+        too_large = SimpleNamespace(uuid=uuid.uuid4(), is_removed_from_disk=True)
+        failed = SimpleNamespace(uuid=uuid.uuid4(), is_removed_from_disk=True)
+        place_files.repo.get_cold_page.return_value = []
+        place_files.repo.get_hot.return_value = [promoted, too_large, failed]
+
+        def disk_cache(file):
+            if file is failed:
+                raise Exception("s3 is down")
+            file.is_removed_from_disk = file is not promoted
+            return file
+
+        place_files.disk_cache.side_effect = disk_cache
+
+        stats = await place_files()
+
+        assert stats.promoted == 1
+        place_files.repo.get_hot.assert_called_once_with(to_heat(2, NOW, 3600), 2)
+
+    async def test_disabled(self, place_files, mocker):
+        mocker.patch.object(place_files, "demote_below", 0)
+        mocker.patch.object(place_files, "promote_above", 0)
+
+        assert (await place_files()).model_dump() == {"demoted": 0, "promoted": 0}
+        place_files.repo.get_cold_page.assert_not_called()
+        place_files.repo.get_hot.assert_not_called()
+
+
+def test_thresholds(place_files):
+    with pytest.raises(AssertionError):
+        placement.PlaceFiles(
+            half_life=3600,
+            demote_below=2,
+            promote_above=2,
+            min_age=60,
+            batch_size=2,
+            max_promotions=2,
+            repo=place_files.repo,
+            disk_cache=place_files.disk_cache,
+        )
+
+
+def test_heat():
+    # a download an hour ago counts half of one made now
+    heat = to_heat(1, NOW - timedelta(hours=1), 3600)
+    assert to_count(heat, NOW, 3600) == pytest.approx(0.5)
+    # heats of different times compare as decayed counts
+    assert to_heat(3, NOW - timedelta(hours=2), 3600) < to_heat(1, NOW, 3600)
@@ -0,0 +1,122 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from services import reconcile
+
+NOW = datetime(2024, 1, 1)
+OLD = NOW - timedelta(days=1)
+
+
+def row(path, is_saved_to_s3=True, is_removed_from_disk=False, updated_at=OLD):
+    return SimpleNamespace(
+        uuid=uuid.uuid4(),
+        path=f"/media/{path}",
+        is_saved_to_s3=is_saved_to_s3,
+        is_removed_from_disk=is_removed_from_disk,
+        updated_at=updated_at,
+    )
+
+
+def page(keys, token=None):
+    return {
+        "Contents": [
+            {"Key": f"media/{key}", "LastModified": last_modified}
+            for key, last_modified in keys
+        ],
+        "IsTruncated": token is not None,
+        **({"NextContinuationToken": token} if token else {}),
+    }
+
+
+@pytest.fixture(autouse=True)
+def get_current_time_mock(mocker):
+    return mocker.patch.object(reconcile, "get_current_time", return_value=NOW)
+
+
+@pytest.mark.asyncio
+class TestReconcileS3:
+    async def test_reconcile(self, reconcile_s3, s3_mock):
+        missing = row("b")
+        lost = row("c", is_removed_from_disk=True)
+        rows = [
+            row("a"),
+            missing,
+            lost,
+            # saved after its key could have been listed
+            row("d", updated_at=NOW),
+            # not synced yet
+            row("e", is_saved_to_s3=False),
+            row("f"),
+        ]
+        reconcile_s3.repo.get_page_by_path.side_effect = [
+            rows[:2],
+            rows[2:4],
+            rows[4:],
+            [],
+        ]
+        s3_mock.list_objects_v2.side_effect = [
+            page((("a", OLD), ("aa", OLD)), token="token"),
+            # recent object of a direct upload in progress is kept
+            page((("ab", NOW), ("f", OLD), ("g", OLD))),
+        ]
+        s3_mock.delete_objects.return_value = {}
+
+        stats = await reconcile_s3()
+
+        assert stats.model_dump() == {
+            "objects": 5,
+            "files": 6,
+            "missing": 1,
+            "lost": 1,
+            "orphans": 2,
+        }
+        assert [
+            call.args for call in reconcile_s3.repo.get_page_by_path.call_args_list
+        ] == [(None, 2), ("/media/b", 2), ("/media/d", 2), ("/media/f", 2)]
+        s3_mock.list_objects_v2.assert_any_call(
+            Bucket="bucket",
+            Prefix="media/",
+            ContinuationToken="token",
+        )
+        s3_mock.delete_objects.assert_called_once_with(
+            Bucket="bucket",
+            Delete={
+                "Objects": [{"Key": "media/aa"}, {"Key": "media/g"}],
+                "Quiet": True,
+            },
+        )
+        reconcile_s3.repo.multi_update.assert_called_once_with(
+            [missing.uuid], values={"is_saved_to_s3": False}
+        )
+        reconcile_s3.sync_repo.enqueue.assert_called_once_with([missing.uuid])
+
+    async def test_batches(self, reconcile_s3, s3_mock, mocker):
+        mocker.patch.object(reconcile, "BATCH_SIZE", 2)
+        reconcile_s3.repo.get_page_by_path.return_value = []
+        s3_mock.list_objects_v2.return_value = page(
+            (key, OLD) for key in ("a", "b", "c", "d", "e")
+        )
+        s3_mock.delete_objects.side_effect = [
+            {},
+            {},
+            {"Errors": [{"Key": "media/e", "Message": "Access Denied"}]},
+        ]
+
+        stats = await reconcile_s3()
+
+        assert stats.orphans == 4
+        assert s3_mock.delete_objects.call_count == 3
+        reconcile_s3.repo.multi_update.assert_not_called()
+
+    async def test_duplicate_paths(self, reconcile_s3, s3_mock):
+        reconcile_s3.repo.get_page_by_path.side_effect = [[row("a"), row("a")], []]
+        s3_mock.list_objects_v2.return_value = page((("a", OLD),))
+
+        stats = await reconcile_s3()
+
+        assert stats.files == 2
+        assert stats.orphans == stats.missing == 0
+        s3_mock.delete_objects.assert_not_called()
@@ -0,0 +1,136 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+import worker
+from services.schedule import LeaseLostError
+
+
+@pytest.mark.asyncio
+class TestRunScheduled:
+    @pytest.mark.parametrize("force", (False, True))
+    async def test_run_once(self, force, disk_cleanup_scheduler):
+        scheduler = disk_cleanup_scheduler
+        scheduler.repo.acquire.return_value = True
+
+        assert await scheduler.run_once(force=force) is True
+        scheduler.repo.acquire.assert_called_once_with(
+            "disk_cleanup",
+            scheduler.owner,
+            timedelta() if force else timedelta(hours=1),
+            timedelta(seconds=0.03),
+        )
+        scheduler.job.assert_called_once_with()
+        scheduler.repo.release.assert_called_once()
+        name, owner, duration, result = scheduler.repo.release.call_args.args
+        assert (name, owner) == ("disk_cleanup", scheduler.owner)
+        assert duration >= 0
+        assert result == {"files": 2, "removed": 1, "missing": 0, "accessed": 0}
+
+    async def test_not_acquired(self, disk_cleanup_scheduler):
+        disk_cleanup_scheduler.repo.acquire.return_value = False
+
+        assert await disk_cleanup_scheduler.run_once() is False
+        disk_cleanup_scheduler.job.assert_not_called()
+        disk_cleanup_scheduler.repo.release.assert_not_called()
+
+    @pytest.mark.parametrize("force", (False, True))
+    async def test_not_due(self, force, disk_cleanup_scheduler, mocker):
+        disk_cleanup_scheduler.repo.acquire.return_value = True
+        is_due = mocker.AsyncMock(return_value=False)
+        mocker.patch.object(disk_cleanup_scheduler, "is_due", is_due)
+
+        assert await disk_cleanup_scheduler.run_once(force=force) is force
+        # forced run skips the check
+        assert is_due.call_count == int(not force)
+        assert disk_cleanup_scheduler.repo.acquire.call_count == int(force)
+
+    async def test_failure(self, disk_cleanup_scheduler):
+        disk_cleanup_scheduler.repo.acquire.return_value = True
+        disk_cleanup_scheduler.job.side_effect = Exception("db is down")
+
+        with pytest.raises(Exception, match="db is down"):
+            await disk_cleanup_scheduler.run_once()
+        assert disk_cleanup_scheduler.repo.release.call_args.args[3] == {
+            "error": "db is down"
+        }
+
+    async def test_heartbeat(self, disk_cleanup_scheduler):
+        disk_cleanup_scheduler.repo.acquire.return_value = True
+
+        async def job():
+            await asyncio.sleep(0.05)
+            return disk_cleanup_scheduler.job.return_value
+
+        disk_cleanup_scheduler.job.side_effect = job
+
+        await disk_cleanup_scheduler.run_once()
+        calls = disk_cleanup_scheduler.repo.renew.call_count
+        await asyncio.sleep(0.03)
+
+        # lease is renewed during the run only
+        assert calls >= 2
+        assert disk_cleanup_scheduler.repo.renew.call_count == calls
+        disk_cleanup_scheduler.repo.renew.assert_called_with(
+            "disk_cleanup",
+            disk_cleanup_scheduler.owner,
+            timedelta(seconds=0.03),
+        )
+
+    async def test_lease_lost(self, disk_cleanup_scheduler):
+        disk_cleanup_scheduler.repo.acquire.return_value = True
+        disk_cleanup_scheduler.repo.renew.return_value = False
+        cancelled = asyncio.Event()
+
+        async def job():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        disk_cleanup_scheduler.job.side_effect = job
+
+        # job is stopped soon after the lease can not be renewed
+        with pytest.raises(LeaseLostError):
+            await asyncio.wait_for(disk_cleanup_scheduler.run_once(), 1)
+        assert cancelled.is_set()
+        disk_cleanup_scheduler.repo.renew.assert_called_once()
+        result = disk_cleanup_scheduler.repo.release.call_args.args[3]
+        assert result == {"error": "Lease of scheduled job disk_cleanup is lost."}
+
+    async def test_call(self, disk_cleanup_scheduler):
+        # failed poll is retried, the job is not due after it is run
+        disk_cleanup_scheduler.repo.acquire.side_effect = (
+            [Exception("db is down")] + [True] + [False] * 100
+        )
+
+        task = asyncio.create_task(disk_cleanup_scheduler())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert disk_cleanup_scheduler.repo.acquire.call_count > 2
+        disk_cleanup_scheduler.job.assert_called_once_with()
+
+
+@pytest.mark.parametrize(
+    "argv,jobs,once",
+    (
+        ([], ["sync"], False),
+        (["cleanup", "orphans"], ["cleanup", "orphans"], False),
+        (["--once", "evict"], ["evict"], True),
+    ),
+)
+def test_worker_args(argv, jobs, once):
+    args = worker.parse_args(argv)
+
+    assert (args.jobs, args.once) == (jobs, once)
+
+
+@pytest.mark.parametrize("argv", (["unknown"], ["--once"], ["--once", "sync"]))
+def test_worker_args_invalid(argv):
+    with pytest.raises(SystemExit):
+        worker.parse_args(argv)
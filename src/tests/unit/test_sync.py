@@ -0,0 +1,364 @@
+import asyncio
+import uuid
+from datetime import timedelta
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from models.sync import S3SyncJob
+from utils.asyncio import CircuitBreaker, CircuitOpenError
+from utils.s3 import is_overload_error, is_unavailable_error
+
+
+def job(attempts):
+    return S3SyncJob(file_uuid=uuid.uuid4(), attempts=attempts)
+
+
+@pytest.mark.asyncio
+class TestSyncFilesToS3:
+    async def test_process_empty(self, sync_files_to_s3):
+        sync_files_to_s3.repo.claim.return_value = []
+
+        assert await sync_files_to_s3.process() is False
+        sync_files_to_s3.repo.claim.assert_called_once_with(1, timedelta(seconds=60))
+        sync_files_to_s3.save_to_s3.assert_not_called()
+
+    async def test_process_saved(self, sync_files_to_s3):
+        instance = job(1)
+        sync_files_to_s3.repo.claim.return_value = [instance]
+
+        assert await sync_files_to_s3.process() is True
+        sync_files_to_s3.save_to_s3.assert_called_once_with(str(instance.file_uuid))
+        sync_files_to_s3.repo.delete.assert_called_once_with(instance)
+        sync_files_to_s3.repo.update.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "attempts,delay",
+        ((1, 5), (2, 10), (3, None)),
+    )
+    @pytest.mark.parametrize(
+        "error",
+        (None, Exception("s3 is unavailable")),
+    )
+    async def test_process_retry(
+        self,
+        attempts,
+        delay,
+        error,
+        sync_files_to_s3,
+        get_current_time_mock,
+        mocker,
+    ):
+        mocker.patch("utils.time.get_current_time", get_current_time_mock)
+        instance = job(attempts)
+        sync_files_to_s3.repo.claim.return_value = [instance]
+        sync_files_to_s3.save_to_s3.return_value = False
+        sync_files_to_s3.save_to_s3.side_effect = error
+
+        assert await sync_files_to_s3.process() is True
+        sync_files_to_s3.repo.delete.assert_not_called()
+        sync_files_to_s3.repo.update.assert_called_once_with(
+            instance,
+            values={
+                "next_attempt_at": (
+                    None
+                    if delay is None
+                    else get_current_time_mock() + timedelta(seconds=delay)
+                )
+            },
+        )
+
+    async def test_max_backoff(self, sync_files_to_s3, get_current_time_mock, mocker):
+        mocker.patch("utils.time.get_current_time", get_current_time_mock)
+        sync_files_to_s3.max_attempts = 10
+        instance = job(5)
+        sync_files_to_s3.repo.claim.return_value = [instance]
+        sync_files_to_s3.save_to_s3.return_value = False
+
+        await sync_files_to_s3.process()
+
+        sync_files_to_s3.repo.update.assert_called_once_with(
+            instance,
+            values={"next_attempt_at": get_current_time_mock() + timedelta(seconds=15)},
+        )
+
+    async def test_call(self, sync_files_to_s3):
+        jobs = [job(1), job(1)]
+        sync_files_to_s3.repo.sweep.return_value = 2
+        sync_files_to_s3.repo.claim.side_effect = lambda *args: (
+            [jobs.pop()] if jobs else []
+        )
+
+        task = asyncio.create_task(sync_files_to_s3())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        sync_files_to_s3.repo.sweep.assert_called_once_with()
+        assert sync_files_to_s3.save_to_s3.call_count == 2
+        assert sync_files_to_s3.repo.delete.call_count == 2
+
+    async def test_notify(self, sync_files_to_s3):
+        sync_files_to_s3.poll_interval = 60
+        sync_files_to_s3.repo.claim.return_value = []
+
+        task = asyncio.create_task(sync_files_to_s3())
+        await asyncio.sleep(0.05)
+        calls = sync_files_to_s3.repo.claim.call_count
+        sync_files_to_s3.notify()
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # every idle worker polls again right away
+        assert sync_files_to_s3.repo.claim.call_count == calls + 2
+
+    async def test_process_circuit_open(self, sync_files_to_s3, mocker):
+        mocker.patch.object(sync_files_to_s3.breaker, "available", return_value=False)
+
+        assert await sync_files_to_s3.process() is False
+        sync_files_to_s3.repo.claim.assert_not_called()
+        sync_files_to_s3.save_to_s3.assert_not_called()
+
+    async def test_process_deferred(
+        self, sync_files_to_s3, get_current_time_mock, mocker
+    ):
+        mocker.patch("utils.time.get_current_time", get_current_time_mock)
+        mocker.patch.object(sync_files_to_s3.breaker, "retry_in", return_value=20)
+        instance = job(3)
+        sync_files_to_s3.repo.claim.return_value = [instance]
+        sync_files_to_s3.save_to_s3.side_effect = CircuitOpenError()
+
+        assert await sync_files_to_s3.process() is True
+        # attempt counted by the claim is given back, even the last one
+        sync_files_to_s3.repo.update.assert_called_once_with(
+            instance,
+            values={
+                "attempts": 2,
+                "next_attempt_at": get_current_time_mock() + timedelta(seconds=20),
+            },
+        )
+        sync_files_to_s3.repo.delete.assert_not_called()
+
+    async def test_process_half_open(self, sync_files_to_s3, mocker):
+        mocker.patch.object(
+            type(sync_files_to_s3.breaker),
+            "state",
+            new_callable=mocker.PropertyMock,
+            return_value=CircuitBreaker.HALF_OPEN,
+        )
+        release = asyncio.Event()
+
+        async def claim(*args):
+            await release.wait()
+            return [job(1)]
+
+        sync_files_to_s3.repo.claim.side_effect = claim
+
+        probe = asyncio.create_task(sync_files_to_s3.process())
+        await asyncio.sleep(0)
+        # other workers do not claim jobs while one probes s3
+        assert await sync_files_to_s3.process() is False
+        release.set()
+
+        assert await probe is True
+        sync_files_to_s3.repo.claim.assert_called_once()
+
+    async def test_stats(self, sync_files_to_s3):
+        sync_files_to_s3.repo.count_pending.return_value = 7
+
+        stats = await sync_files_to_s3.stats()
+
+        assert stats.model_dump() == {
+            "limit": 4,
+            "in_flight": 0,
+            "waiting": 0,
+            "circuit": "closed",
+            "queue_depth": 7,
+        }
+
+
+def throttled():
+    return ClientError(
+        {"Error": {"Code": "SlowDown"}, "ResponseMetadata": {"HTTPStatusCode": 503}},
+        "PutObject",
+    )
+
+
+@pytest.mark.asyncio
+class TestAIMDLimiter:
+    async def test_increase(self, limiter):
+        limiter.limit = 2
+
+        async with limiter():
+            pass
+
+        assert limiter.limit == 2.5
+        assert limiter.in_flight == 0
+
+    async def test_slow(self, limiter, mocker):
+        time_mock = mocker.patch("utils.asyncio.time")
+        time_mock.monotonic.side_effect = [0, 10, 10]
+
+        # 10 seconds for 4 MB is over 1 second per MB
+        async with limiter(4):
+            pass
+
+        assert limiter.limit == pytest.approx(3.6)
+
+    async def test_overload(self, limiter):
+        async def call():
+            async with limiter():
+                await asyncio.sleep(0.01)
+                raise throttled()
+
+        results = await asyncio.gather(
+            *(call() for _ in range(4)), return_exceptions=True
+        )
+
+        # calls of one overload episode cut the limit once
+        assert all(is_overload_error(result) for result in results)
+        assert limiter.limit == 2
+
+        with pytest.raises(ClientError):
+            await call()
+        assert limiter.limit == 1
+
+        with pytest.raises(ClientError):
+            await call()
+        assert limiter.limit == limiter.min_limit
+
+    async def test_wait(self, limiter):
+        limiter.limit = 1
+        release = asyncio.Event()
+
+        async def call():
+            async with limiter():
+                await release.wait()
+
+        tasks = [asyncio.create_task(call()) for _ in range(2)]
+        await asyncio.sleep(0.01)
+
+        assert limiter.in_flight == 1
+        assert limiter.waiting == 1
+        release.set()
+        await asyncio.gather(*tasks)
+        assert limiter.in_flight == 0
+        assert limiter.waiting == 0
+
+
+def unavailable():
+    return EndpointConnectionError(endpoint_url="http://s3")
+
+
+@pytest.mark.asyncio
+class TestCircuitBreaker:
+    async def call(self, breaker, error=None):
+        async with breaker():
+            if error is not None:
+                raise error
+
+    async def test_open(self, breaker, mocker):
+        time_mock = mocker.patch("utils.asyncio.time")
+        time_mock.monotonic.return_value = 0
+        assert breaker.retry_in() == 0
+        for _ in range(2):
+            with pytest.raises(EndpointConnectionError):
+                await self.call(breaker, unavailable())
+        time_mock.monotonic.return_value = 10
+
+        assert breaker.state == breaker.OPEN
+        assert breaker.available() is False
+        assert breaker.retry_in() == 20
+        with pytest.raises(CircuitOpenError):
+            await self.call(breaker)
+
+    async def test_not_failure(self, breaker):
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                await self.call(breaker, ValueError())
+
+        # errors caused by a call itself do not open the circuit
+        assert breaker.state == breaker.CLOSED
+        assert breaker.failures == 0
+
+    async def test_success_resets(self, breaker):
+        with pytest.raises(EndpointConnectionError):
+            await self.call(breaker, unavailable())
+        await self.call(breaker)
+        with pytest.raises(EndpointConnectionError):
+            await self.call(breaker, unavailable())
+
+        assert breaker.state == breaker.CLOSED
+
+    @pytest.mark.parametrize("probe_fails", (False, True))
+    async def test_half_open(self, probe_fails, breaker, mocker):
+        time_mock = mocker.patch("utils.asyncio.time")
+        time_mock.monotonic.return_value = 0
+        for _ in range(2):
+            with pytest.raises(EndpointConnectionError):
+                await self.call(breaker, unavailable())
+        time_mock.monotonic.return_value = 30
+
+        assert breaker.state == breaker.HALF_OPEN
+        release = asyncio.Event()
+
+        async def probe():
+            async with breaker():
+                await release.wait()
+                if probe_fails:
+                    raise unavailable()
+
+        task = asyncio.create_task(probe())
+        await asyncio.sleep(0)
+        # only one call probes
+        assert breaker.state == breaker.OPEN
+        assert breaker.retry_in() == 30
+        with pytest.raises(CircuitOpenError):
+            await self.call(breaker)
+        release.set()
+        await asyncio.gather(task, return_exceptions=True)
+
+        if probe_fails:
+            assert breaker.state == breaker.OPEN
+            assert breaker.retry_in() == 30
+            time_mock.monotonic.return_value = 60
+            assert breaker.state == breaker.HALF_OPEN
+        else:
+            assert breaker.state == breaker.CLOSED
+            assert breaker.failures == 0
+
+
+@pytest.mark.parametrize(
+    "error,expected_result",
+    (
+        (unavailable(), True),
+        (asyncio.TimeoutError(), True),
+        (throttled(), True),
+        (ClientError({"ResponseMetadata": {"HTTPStatusCode": 500}}, "PutObject"), True),
+        (
+            ClientError({"ResponseMetadata": {"HTTPStatusCode": 404}}, "PutObject"),
+            False,
+        ),
+        (ClientError({"Error": {"Code": "AccessDenied"}}, "PutObject"), False),
+        (OSError(), False),
+    ),
+)
+def test_is_unavailable_error(error, expected_result):
+    assert is_unavailable_error(error) is expected_result
+
+
+@pytest.mark.parametrize(
+    "error,expected_result",
+    (
+        (throttled(), True),
+        (ClientError({"Error": {"Code": "ServiceUnavailable"}}, "PutObject"), True),
+        (ClientError({"ResponseMetadata": {"HTTPStatusCode": 429}}, "PutObject"), True),
+        (ClientError({"Error": {"Code": "AccessDenied"}}, "PutObject"), False),
+        (OSError(), False),
+    ),
+)
+def test_is_overload_error(error, expected_result):
+    assert is_overload_error(error) is expected_result
@@ -0,0 +1,425 @@
+import asyncio
+import io
+import struct
+import zipfile
+import zlib
+from datetime import datetime
+from pathlib import PurePath
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    List,
+    NamedTuple,
+    Set,
+    Tuple,
+)
+
+
+class ArchiveEntry(NamedTuple):
+    name: str
+    size: int
+    modified_at: datetime
+    chunks: AsyncIterable[bytes]
+
+
+class _ZipBuffer(io.RawIOBase):
+    """
+    Write-only, non-seekable buffer for zipfile.
+
+    zipfile falls back to data descriptors on non-seekable streams,
+    so every written byte can be sent right away.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: Any) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_zip(
+    entries: AsyncIterable[ArchiveEntry],
+    *,
+    compress: bool = False,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Build zip archive on the fly, entry by entry.
+    Only current chunk is kept in memory, ZIP64 is used when needed
+
+    :param entries: archive entries
+    :type entries: AsyncIterable[ArchiveEntry]
+    :param compress: use deflate instead of store, defaults to False
+    :type compress: bool, optional
+    :return: async generator
+    :rtype: AsyncGenerator[bytes, None]
+    :yield: archive bytes
+    :rtype: Iterator[AsyncGenerator[bytes, None]]
+    """
+    buffer = _ZipBuffer()
+    compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    names: Set[str] = set()
+    with zipfile.ZipFile(buffer, "w", compression=compress_type) as archive:
+        async for entry in entries:
+            info = zipfile.ZipInfo(
+                _unique_name(entry.name, names),
+                date_time=_zip_date_time(entry.modified_at),
+            )
+            info.compress_type = compress_type
+            # size is known beforehand, so zipfile
+            # can decide whether entry needs ZIP64 extra
+            info.file_size = entry.size
+            with archive.open(info, "w") as stream:
+                async for chunk in entry.chunks:
+                    if compress:
+                        # deflate is cpu-bound
+                        await asyncio.to_thread(stream.write, chunk)
+                    else:
+                        stream.write(chunk)
+                    if data := buffer.drain():
+                        yield data
+            if data := buffer.drain():
+                yield data
+    if data := buffer.drain():
+        yield data
+
+
+def _unique_name(name: str, names: Set[str]) -> str:
+    # entry names must not escape archive root
+    name = PurePath(name.replace("\\", "/")).name or "file"
+    candidate, counter = name, 0
+    path = PurePath(name)
+    # names differing in case only collide when extracted on
+    # case-insensitive file systems
+    while candidate.casefold() in names:
+        counter += 1
+        candidate = f"{path.stem} ({counter}){path.suffix}"
+    names.add(candidate.casefold())
+    return candidate
+
+
+def _zip_date_time(value: datetime) -> tuple:
+    # zip format does not support dates before 1980
+    if value.year < 1980:
+        return (1980, 1, 1, 0, 0, 0)
+    return value.timetuple()[:6]
+
+
+class ArchiveError(Exception):
+    pass
+
+
+UnpackedEntry = Tuple[str, AsyncIterator[bytes]]
+
+CHUNK_SIZE: int = 64 * 1024
+
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+TAR_CONTENT_TYPES = ("application/x-tar",)
+TAR_GZ_CONTENT_TYPES = ("application/gzip", "application/x-gzip", "application/x-gtar")
+
+_ZIP_LOCAL_HEADER = b"PK\x03\x04"
+_ZIP_DATA_DESCRIPTOR = b"PK\x07\x08"
+_ZIP_CENTRAL_DIRECTORY = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06")
+_ZIP64_EXTRA = 0x0001
+_TAR_BLOCK = 512
+
+
+class _StreamReader:
+    """Buffered reader on top of async chunks with exact reads and push back"""
+
+    def __init__(self, chunks: AsyncIterable[bytes]) -> None:
+        self._iterator = chunks.__aiter__()
+        self._buffer = bytearray()
+        self._eof = False
+
+    async def _fill(self) -> bool:
+        if self._eof:
+            return False
+        try:
+            self._buffer += await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            return False
+        return True
+
+    async def read_exactly(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            if not await self._fill():
+                raise ArchiveError("Unexpected end of archive.")
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    async def read_some(self, size: int) -> bytes:
+        if not self._buffer:
+            await self._fill()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    async def skip(self, size: int) -> None:
+        while size > 0:
+            data = await self.read_some(min(size, CHUNK_SIZE))
+            if not data:
+                raise ArchiveError("Unexpected end of archive.")
+            size -= len(data)
+
+    async def at_eof(self) -> bool:
+        return not self._buffer and not await self._fill()
+
+    def unread(self, data: bytes) -> None:
+        self._buffer[:0] = data
+
+
+async def unpack(
+    chunks: AsyncIterable[bytes],
+    content_type: str,
+) -> AsyncGenerator[UnpackedEntry, None]:
+    """
+    Unpack zip, tar or tar.gz stream entry by entry as bytes arrive.
+    Each entry must be consumed (or abandoned) before the next one is requested
+
+    :param chunks: archive bytes
+    :type chunks: AsyncIterable[bytes]
+    :param content_type: content type of the archive
+    :type content_type: str
+    :raises ArchiveError: archive is malformed or not supported
+    :return: async generator
+    :rtype: AsyncGenerator[UnpackedEntry, None]
+    :yield: entry name and entry content chunks
+    :rtype: Iterator[AsyncGenerator[UnpackedEntry, None]]
+    """
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type in ZIP_CONTENT_TYPES:
+        entries = _unpack_zip(_StreamReader(chunks))
+    elif content_type in TAR_CONTENT_TYPES:
+        entries = _unpack_tar(_StreamReader(chunks))
+    elif content_type in TAR_GZ_CONTENT_TYPES:
+        entries = _unpack_tar(_StreamReader(_gunzip(chunks)))
+    else:
+        raise ArchiveError(f"Unsupported archive type - {content_type}.")
+
+    async for entry in entries:
+        yield entry
+
+
+async def _gunzip(chunks: AsyncIterable[bytes]) -> AsyncGenerator[bytes, None]:
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    try:
+        async for chunk in chunks:
+            while chunk:
+                if data := decompressor.decompress(chunk, CHUNK_SIZE):
+                    yield data
+                chunk = decompressor.unconsumed_tail
+        if data := decompressor.flush():
+            yield data
+    except zlib.error as e:
+        raise ArchiveError(f"Corrupted gzip stream - {str(e)}.")
+
+
+async def _unpack_tar(reader: _StreamReader) -> AsyncGenerator[UnpackedEntry, None]:
+    long_name: str | None = None
+    pax: Dict[str, str] = {}
+    while not await reader.at_eof():
+        header = await reader.read_exactly(_TAR_BLOCK)
+        if header == bytes(_TAR_BLOCK):
+            # end of archive marker
+            break
+        _check_tar_header(header)
+        type_ = header[156:157]
+        size = _tar_number(header[124:136])
+        if type_ in (b"L", b"x", b"g"):
+            data = await reader.read_exactly(size)
+            await reader.skip(-size % _TAR_BLOCK)
+            if type_ == b"L":
+                long_name = data.rstrip(b"\x00").decode("utf-8", "replace")
+            elif type_ == b"x":
+                pax = _parse_pax(data)
+            continue
+
+        name = pax.get("path") or long_name or _tar_name(header)
+        size = int(pax.get("size", size))
+        long_name, pax = None, {}
+        data = _read_stored(reader, size, None)
+        if type_ in (b"0", b"\x00", b"7") and not name.endswith("/"):
+            yield name, data
+        # whatever consumer did not read must be skipped
+        async for _ in data:
+            pass
+        await reader.skip(-size % _TAR_BLOCK)
+
+
+def _check_tar_header(header: bytes) -> None:
+    try:
+        checksum = _tar_number(header[148:156])
+    except ValueError:
+        raise ArchiveError("Malformed tar header.")
+    if checksum != sum(header[:148]) + 8 * 0x20 + sum(header[156:]):
+        raise ArchiveError("Malformed tar header.")
+
+
+def _tar_number(field: bytes) -> int:
+    if field[0] & 0x80:
+        # base-256 encoding for big numbers
+        return int.from_bytes(field[1:], "big")
+    return int(field.rstrip(b"\x00 ").strip() or b"0", 8)
+
+
+def _tar_name(header: bytes) -> str:
+    name = header[0:100].split(b"\x00", 1)[0]
+    if header[257:262] == b"ustar":
+        if prefix := header[345:500].split(b"\x00", 1)[0]:
+            name = prefix + b"/" + name
+    return name.decode("utf-8", "replace")
+
+
+def _parse_pax(data: bytes) -> Dict[str, str]:
+    result = {}
+    # records look like `<length> <key>=<value>\n`
+    for record in data.split(b"\n"):
+        key, _, value = record.partition(b" ")[2].partition(b"=")
+        if key:
+            result[key.decode("utf-8", "replace")] = value.decode("utf-8", "replace")
+    return result
+
+
+class _Checksum:
+    def __init__(self) -> None:
+        self.crc = 0
+        self.size = 0
+
+    def update(self, data: bytes) -> bytes:
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        return data
+
+
+async def _unpack_zip(reader: _StreamReader) -> AsyncGenerator[UnpackedEntry, None]:
+    while True:
+        signature = await reader.read_exactly(4)
+        if signature in _ZIP_CENTRAL_DIRECTORY:
+            # entries are over, central directory is not needed
+            break
+        if signature != _ZIP_LOCAL_HEADER:
+            raise ArchiveError("Malformed zip archive.")
+
+        (
+            _,
+            flags,
+            method,
+            _,
+            _,
+            crc,
+            compressed_size,
+            size,
+            name_length,
+            extra_length,
+        ) = struct.unpack("<HHHHHIIIHH", await reader.read_exactly(26))
+        name = (await reader.read_exactly(name_length)).decode(
+            "utf-8" if flags & 0x800 else "cp437"
+        )
+        zip64 = _zip64_sizes(await reader.read_exactly(extra_length))
+        if zip64 is not None:
+            size, compressed_size = (
+                zip64[0] if size == 0xFFFFFFFF else size,
+                zip64[1] if compressed_size == 0xFFFFFFFF else compressed_size,
+            )
+        has_descriptor = bool(flags & 0x08)
+        if flags & 0x01:
+            raise ArchiveError("Encrypted zip entries are not supported.")
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise ArchiveError("Only stored and deflated zip entries are supported.")
+        if method == zipfile.ZIP_STORED and has_descriptor:
+            # size of such entry can not be known without central directory
+            raise ArchiveError(
+                "Stored zip entries with data descriptor are not supported."
+            )
+
+        checksum = _Checksum()
+        length = None if has_descriptor else compressed_size
+        if method == zipfile.ZIP_STORED:
+            data = _read_stored(reader, compressed_size, checksum)
+        else:
+            data = _read_deflated(reader, length, checksum)
+        if not name.endswith("/"):
+            yield name, data
+        # whatever consumer did not read must be skipped
+        async for _ in data:
+            pass
+
+        if has_descriptor:
+            descriptor = await reader.read_exactly(4)
+            if descriptor != _ZIP_DATA_DESCRIPTOR:
+                reader.unread(descriptor)
+            if zip64 is not None:
+                crc, _, size = struct.unpack("<IQQ", await reader.read_exactly(20))
+            else:
+                crc, _, size = struct.unpack("<III", await reader.read_exactly(12))
+        if checksum.crc != crc or checksum.size != size:
+            raise ArchiveError(f"Corrupted zip entry - {name}.")
+
+
+def _zip64_sizes(extra: bytes) -> Tuple[int, int] | None:
+    while len(extra) >= 4:
+        tag, length = struct.unpack("<HH", extra[:4])
+        end = 4 + length
+        if tag == _ZIP64_EXTRA:
+            # local header stores both sizes, original size goes first
+            values = extra[4:end] + bytes(16)
+            return struct.unpack("<QQ", values[:16])
+        extra = extra[end:]
+    return None
+
+
+async def _read_stored(
+    reader: _StreamReader,
+    size: int,
+    checksum: _Checksum | None,
+) -> AsyncGenerator[bytes, None]:
+    while size > 0:
+        data = await reader.read_some(min(size, CHUNK_SIZE))
+        if not data:
+            raise ArchiveError("Unexpected end of archive.")
+        size -= len(data)
+        yield checksum.update(data) if checksum else data
+
+
+async def _read_deflated(
+    reader: _StreamReader,
+    length: int | None,
+    checksum: _Checksum,
+) -> AsyncGenerator[bytes, None]:
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    try:
+        while not decompressor.eof:
+            size = CHUNK_SIZE if length is None else min(length, CHUNK_SIZE)
+            data = await reader.read_some(size) if size else b""
+            if length is not None:
+                length -= len(data)
+            if not data:
+                if tail := decompressor.flush():
+                    yield checksum.update(tail)
+                if not decompressor.eof:
+                    raise ArchiveError("Unexpected end of archive.")
+                break
+            while data:
+                # output is bounded, so zip bombs can't blow up memory
+                if output := decompressor.decompress(data, CHUNK_SIZE):
+                    yield checksum.update(output)
+                data = decompressor.unconsumed_tail
+    except zlib.error as e:
+        raise ArchiveError(f"Corrupted zip entry - {str(e)}.")
+    if decompressor.unused_data:
+        # data descriptor or next header was read together with the entry
+        reader.unread(decompressor.unused_data)
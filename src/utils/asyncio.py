@@ -1,5 +1,21 @@
 import asyncio
-from typing import List, TypeVar
+import math
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterator,
+    List,
+    TypeVar,
+)
 
 DEFAULT_CONCURRENCY: int = 5
 
@@ -30,3 +46,342 @@ async def gather_with_concurrency(
             return await task
 
     return await asyncio.gather(*(semaphore_task(task) for task in tasks))
+
+
+class SingleFlight(Generic[TResult]):
+    """
+    Coalesces concurrent calls with the same key into one execution.
+    Execution is shielded, so cancelling one caller does not affect others
+    """
+
+    def __init__(self) -> None:
+        self._futures: Dict[Hashable, asyncio.Future[TResult]] = {}
+
+    async def __call__(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[TResult]],
+    ) -> TResult:
+        """
+        :param key: key of the call
+        :type key: Hashable
+        :param func: function to call if there is no call in flight for the key
+        :type func: Callable[[], Awaitable[TResult]]
+        :return: result of the call
+        :rtype: TResult
+        """
+        future = self._futures.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._futures[key] = future
+            future.add_done_callback(lambda _: self._futures.pop(key, None))
+        return await asyncio.shield(future)
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit adjusted with additive increase, multiplicative decrease.
+    Limit grows by one per `limit` fast calls, shrinks on slow calls and
+    halves on overload errors. Calls started before the last decrease
+    do not decrease it again, so one overload episode is one cut
+    """
+
+    def __init__(
+        self,
+        min_limit: int,
+        max_limit: int,
+        latency_target: float,
+        is_overload: Callable[[BaseException], bool],
+        backoff: float = 0.9,
+        overload_backoff: float = 0.5,
+    ) -> None:
+        """
+        :param min_limit: min number of calls in flight
+        :type min_limit: int
+        :param max_limit: max number of calls in flight, initial limit
+        :type max_limit: int
+        :param latency_target: max latency in seconds per unit of call weight
+        :type latency_target: float
+        :param is_overload: whether an error means the callee is overloaded
+        :type is_overload: Callable[[BaseException], bool]
+        :param backoff: limit multiplier on slow calls, defaults to 0.9
+        :type backoff: float, optional
+        :param overload_backoff: limit multiplier on overload, defaults to 0.5
+        :type overload_backoff: float, optional
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.is_overload = is_overload
+        self.backoff = backoff
+        self.overload_backoff = overload_backoff
+        self.limit: float = max_limit
+        self.in_flight = 0
+        self.waiting = 0
+        self._decreased_at = 0.0
+        self._released = asyncio.Event()
+
+    @asynccontextmanager
+    async def __call__(self, weight: float = 1) -> AsyncIterator[None]:
+        """
+        Hold a slot for a call
+
+        :param weight: call weight latency is divided by, like size in MB,
+            defaults to 1
+        :type weight: float, optional
+        :return: context manager
+        :rtype: AsyncIterator[None]
+        """
+        await self._acquire()
+        started_at = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            if self.is_overload(e):
+                self._decrease(started_at, self.overload_backoff)
+            raise
+        else:
+            latency = (time.monotonic() - started_at) / max(weight, 1)
+            if latency > self.latency_target:
+                self._decrease(started_at, self.backoff)
+            else:
+                self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+        finally:
+            self.in_flight -= 1
+            self._released.set()
+
+    async def _acquire(self) -> None:
+        self.waiting += 1
+        try:
+            while self.in_flight >= int(self.limit):
+                self._released.clear()
+                await self._released.wait()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def _decrease(self, started_at: float, backoff: float) -> None:
+        if started_at < self._decreased_at:
+            return
+        self._decreased_at = time.monotonic()
+        self.limit = max(self.limit * backoff, self.min_limit)
+
+
+class Hedger(Generic[TResult]):
+    """
+    Issues a duplicate of a call that has not finished within a percentile
+    of recent latencies, the first result wins and the other call is
+    cancelled. Extra calls are capped by a budget, a share of all calls
+    """
+
+    window: int = 1000
+    min_samples: int = 20
+    refresh_every: int = 50
+    max_tokens: float = 10
+
+    def __init__(
+        self,
+        enabled: bool,
+        percentile: float,
+        budget: float,
+        discard: Callable[[TResult], None] | None = None,
+    ) -> None:
+        """
+        :param enabled: whether calls are hedged
+        :type enabled: bool
+        :param percentile: latency percentile to wait before hedging, like 95
+        :type percentile: float
+        :param budget: max share of hedged calls, like 0.05
+        :type budget: float
+        :param discard: cleanup of a result that lost, defaults to None
+        :type discard: Callable[[TResult], None] | None, optional
+        """
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget = budget
+        self.discard = discard
+        self.delay: float | None = None
+        self._latencies: deque[float] = deque(maxlen=self.window)
+        self._recorded = 0
+        self._tokens = 1.0
+
+    async def __call__(self, func: Callable[[], Awaitable[TResult]]) -> TResult:
+        """
+        :param func: idempotent call
+        :type func: Callable[[], Awaitable[TResult]]
+        :return: result of the call that finished first
+        :rtype: TResult
+        """
+        if not self.enabled:
+            return await func()
+        self._tokens = min(self._tokens + self.budget, self.max_tokens)
+        tasks = [asyncio.ensure_future(self._timed(func))]
+        try:
+            if self.delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=self.delay)
+                if not done and self._tokens >= 1:
+                    self._tokens -= 1
+                    tasks.append(asyncio.ensure_future(self._timed(func)))
+            return await self._first(tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif self.discard is not None and not task.cancelled():
+                    task.add_done_callback(self._discard)
+
+    async def _first(self, tasks: List[asyncio.Future[TResult]]) -> TResult:
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    tasks.remove(task)
+                    return task.result()
+            if not pending:
+                # every attempt failed, the first error is the cause
+                return tasks[0].result()
+
+    def _discard(self, task: asyncio.Future[TResult]) -> None:
+        if task.exception() is None:
+            self.discard(task.result())  # type: ignore[misc]
+
+    async def _timed(self, func: Callable[[], Awaitable[TResult]]) -> TResult:
+        started_at = time.monotonic()
+        result = await func()
+        self._record(time.monotonic() - started_at)
+        return result
+
+    def _record(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self._recorded += 1
+        if len(self._latencies) < self.min_samples:
+            return
+        if self.delay is None or self._recorded % self.refresh_every == 0:
+            latencies = sorted(self._latencies)
+            index = math.ceil(len(latencies) * self.percentile / 100) - 1
+            self.delay = latencies[max(index, 0)]
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while the callee is unhealthy. Circuit opens after
+    consecutive failures, after the reset timeout one probe call is let
+    through: its success closes the circuit, its failure opens it again
+    """
+
+    CLOSED: str = "closed"
+    OPEN: str = "open"
+    HALF_OPEN: str = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        is_failure: Callable[[BaseException], bool],
+    ) -> None:
+        """
+        :param failure_threshold: consecutive failures that open the circuit
+        :type failure_threshold: int
+        :param reset_timeout: seconds before a probe call is let through
+        :type reset_timeout: float
+        :param is_failure: whether an error means the callee is unhealthy
+        :type is_failure: Callable[[BaseException], bool]
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._probing or time.monotonic() < self._opened_at + self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def available(self) -> bool:
+        """
+        :return: whether a call would be let through
+        :rtype: bool
+        """
+        return self.state != self.OPEN
+
+    def retry_in(self) -> float:
+        """
+        :return: seconds until a probe call could be let through,
+            a probe in progress is expected to fail
+        :rtype: float
+        """
+        if self._opened_at is None:
+            return 0.0
+        if self._probing:
+            return self.reset_timeout
+        return max(self._opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    @asynccontextmanager
+    async def __call__(self) -> AsyncIterator[None]:
+        """
+        Guard a call
+
+        :raises CircuitOpenError: circuit is open
+        :return: context manager
+        :rtype: AsyncIterator[None]
+        """
+        state = self.state
+        if state == self.OPEN:
+            raise CircuitOpenError("Circuit is open.")
+        probe = state == self.HALF_OPEN
+        self._probing = probe
+        try:
+            yield
+        except BaseException as e:
+            if self.is_failure(e):
+                self._failed()
+            elif probe:
+                # probe was not conclusive, let the next call probe
+                self._opened_at = time.monotonic() - self.reset_timeout
+            raise
+        else:
+            self.failures = 0
+            self._opened_at = None
+        finally:
+            if probe:
+                self._probing = False
+
+    def _failed(self) -> None:
+        self.failures += 1
+        if self._opened_at is not None or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+def init_process_pool(max_workers: int) -> Iterator[ProcessPoolExecutor]:
+    """
+    Process pool resource for cpu-bound work,
+    pending work is cancelled on shutdown
+
+    :param max_workers: number of worker processes
+    :type max_workers: int
+    :return: iterator
+    :rtype: Iterator[ProcessPoolExecutor]
+    :yield: process pool
+    :rtype: Iterator[ProcessPoolExecutor]
+    """
+    # forking a process with running event loop and threads is unsafe
+    pool = ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    try:
+        yield pool
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
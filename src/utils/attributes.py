@@ -0,0 +1,311 @@
+"""
+Registry of file attribute extractors.
+
+Extractors receive a binary stream positioned at the beginning of the file
+and read only what they need (headers, box/chunk tables) seeking over
+the rest. New extractors are plugged in with `register` decorator.
+"""
+
+import gzip
+import logging
+import os
+import re
+import struct
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Tuple
+
+from utils.compression import GZIP
+
+logger = logging.getLogger("attributes")
+
+Extractor = Callable[[BinaryIO], Dict[str, Any]]
+
+HEADER_SIZE: int = 512
+
+_EXTRACTORS: List[Tuple[Tuple[str, ...], Extractor]] = []
+
+_SIGNATURES: Tuple[Tuple[int, bytes, str], ...] = (
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"BM", "image/bmp"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"PK\x03\x04", "application/zip"),
+    (0, b"\x1f\x8b", "application/gzip"),
+    (0, b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (0, b"fLaC", "audio/flac"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b"\x1a\x45\xdf\xa3", "video/webm"),
+    (257, b"ustar", "application/x-tar"),
+)
+_RIFF_TYPES: Dict[bytes, str] = {
+    b"WEBP": "image/webp",
+    b"WAVE": "audio/wav",
+    b"AVI ": "video/x-msvideo",
+}
+_FTYP_BRANDS: Dict[bytes, str] = {
+    b"qt  ": "video/quicktime",
+    b"M4A ": "audio/mp4",
+    b"M4B ": "audio/mp4",
+    b"heic": "image/heic",
+    b"heix": "image/heic",
+    b"mif1": "image/heif",
+    b"avif": "image/avif",
+}
+
+
+def register(*content_types: str) -> Callable[[Extractor], Extractor]:
+    """
+    Register extractor for files with specified content types
+
+    :param content_types: content types or their prefixes, like `image/`
+    :type content_types: Tuple[str, ...]
+    :return: decorator
+    :rtype: Callable[[Extractor], Extractor]
+    """
+
+    def decorator(func: Extractor) -> Extractor:
+        _EXTRACTORS.append((content_types, func))
+        return func
+
+    return decorator
+
+
+def sniff_content_type(header: bytes) -> str | None:
+    """
+    Detect content type by magic bytes
+
+    :param header: first bytes of the file
+    :type header: bytes
+    :return: content type if detected
+    :rtype: str | None
+    """
+    if header[:4] == b"RIFF":
+        return _RIFF_TYPES.get(header[8:12])
+    if header[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(header[8:12], "video/mp4")
+    for offset, signature, content_type in _SIGNATURES:
+        if header[offset : offset + len(signature)] == signature:  # noqa: E203
+            return content_type
+    return None
+
+
+def extract_attributes(path: str, encoding: str | None = None) -> Dict[str, Any]:
+    """
+    Extract attributes of a file with registered extractors.
+    Blocking, meant to be run in a worker pool
+
+    :param path: path to the file
+    :type path: str
+    :param encoding: content encoding of the stored file, defaults to None
+    :type encoding: str | None, optional
+    :return: extracted attributes, `mime` is always present
+    :rtype: Dict[str, Any]
+    """
+    opener = gzip.open if encoding == GZIP else open
+    with opener(path, "rb") as stream:
+        mime = sniff_content_type(stream.read(HEADER_SIZE))
+        attributes: Dict[str, Any] = {"mime": mime}
+        if mime is None:
+            return attributes
+        for content_types, extractor in _EXTRACTORS:
+            if not mime.startswith(content_types):
+                continue
+            stream.seek(0)
+            try:
+                attributes.update(extractor(stream))
+            except (struct.error, ValueError, OSError, EOFError) as e:
+                # damaged or unusual file must not break the rest
+                logger.info(
+                    f"Error extracting file attributes. - {str(e)}",
+                    extra={"path": path, "extractor": extractor.__name__},
+                )
+    return attributes
+
+
+def _read(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError("Unexpected end of file.")
+    return data
+
+
+@register("image/png")
+def png_dimensions(stream: BinaryIO) -> Dict[str, Any]:
+    width, height = struct.unpack(">II", _read(stream, 24)[16:24])
+    return {"width": width, "height": height}
+
+
+@register("image/gif")
+def gif_dimensions(stream: BinaryIO) -> Dict[str, Any]:
+    width, height = struct.unpack("<HH", _read(stream, 10)[6:10])
+    return {"width": width, "height": height}
+
+
+@register("image/bmp")
+def bmp_dimensions(stream: BinaryIO) -> Dict[str, Any]:
+    width, height = struct.unpack("<ii", _read(stream, 26)[18:26])
+    return {"width": width, "height": abs(height)}
+
+
+@register("image/webp")
+def webp_dimensions(stream: BinaryIO) -> Dict[str, Any]:
+    header = _read(stream, 30)
+    chunk = header[12:16]
+    if chunk == b"VP8X":
+        width = int.from_bytes(header[24:27], "little") + 1
+        height = int.from_bytes(header[27:30], "little") + 1
+    elif chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", header[26:30])
+        width, height = width & 0x3FFF, height & 0x3FFF
+    elif chunk == b"VP8L":
+        bits = int.from_bytes(header[21:25], "little")
+        width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    else:
+        raise ValueError("Unknown webp chunk.")
+    return {"width": width, "height": height}
+
+
+# start of frame markers, excluding DHT, JPG and DAC
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7}
+_JPEG_SOF |= {0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+@register("image/jpeg")
+def jpeg_dimensions(stream: BinaryIO) -> Dict[str, Any]:
+    stream.seek(2)
+    while True:
+        marker = _read(stream, 2)
+        while marker[1] == 0xFF:
+            # fill bytes
+            marker = marker[1:] + _read(stream, 1)
+        if marker[0] != 0xFF:
+            raise ValueError("Malformed jpeg segment.")
+        (length,) = struct.unpack(">H", _read(stream, 2))
+        if marker[1] in _JPEG_SOF:
+            height, width = struct.unpack(">xHH", _read(stream, 5))
+            return {"width": width, "height": height}
+        stream.seek(length - 2, 1)
+
+
+@register("audio/wav")
+def wav_duration(stream: BinaryIO) -> Dict[str, Any]:
+    stream.seek(12)
+    byte_rate = None
+    while True:
+        chunk, size = struct.unpack("<4sI", _read(stream, 8))
+        if chunk == b"fmt ":
+            fmt = _read(stream, size + size % 2)
+            _, channels, sample_rate, byte_rate = struct.unpack("<HHII", fmt[:12])
+        elif chunk == b"data":
+            if not byte_rate:
+                raise ValueError("Missing wav format chunk.")
+            return {
+                "duration": round(size / byte_rate, 3),
+                "channels": channels,
+                "sample_rate": sample_rate,
+            }
+        else:
+            # chunks are padded to even size
+            stream.seek(size + size % 2, 1)
+
+
+@register("audio/flac")
+def flac_duration(stream: BinaryIO) -> Dict[str, Any]:
+    stream.seek(4)
+    block_type = _read(stream, 4)[0] & 0x7F
+    if block_type != 0:
+        raise ValueError("Missing flac stream info.")
+    info = int.from_bytes(_read(stream, 34)[10:18], "big")
+    sample_rate = info >> 44
+    channels = ((info >> 41) & 0x07) + 1
+    samples = info & 0xFFFFFFFFF
+    if not sample_rate or not samples:
+        return {"channels": channels, "sample_rate": sample_rate}
+    return {
+        "duration": round(samples / sample_rate, 3),
+        "channels": channels,
+        "sample_rate": sample_rate,
+    }
+
+
+def _mp4_boxes(stream: BinaryIO, end: int | None) -> Iterator[Tuple[bytes, int | None]]:
+    while end is None or stream.tell() < end:
+        header = stream.read(8)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack(">I4s", header)
+        start = stream.tell() - 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", _read(stream, 8))
+        elif size == 0:
+            # box lasts till the end of file
+            yield kind, None
+            return
+        if size < 8:
+            raise ValueError("Malformed mp4 box.")
+        yield kind, start + size
+        stream.seek(start + size)
+
+
+@register("video/", "audio/mp4")
+def mp4_duration(stream: BinaryIO) -> Dict[str, Any]:
+    # moov box may be at the end, skipping over media data is just a seek
+    for kind, moov_end in _mp4_boxes(stream, None):
+        if kind != b"moov":
+            continue
+        for kind, _ in _mp4_boxes(stream, moov_end):
+            if kind != b"mvhd":
+                continue
+            version = _read(stream, 4)[0]
+            if version == 1:
+                timescale, duration = struct.unpack(">16xIQ", _read(stream, 28))
+            else:
+                timescale, duration = struct.unpack(">8xII", _read(stream, 16))
+            if not timescale:
+                raise ValueError("Malformed mp4 movie header.")
+            return {"duration": round(duration / timescale, 3)}
+    return {}
+
+
+_PDF_LINEARIZED = re.compile(rb"/Linearized\b.{0,256}?/N\s+(\d+)", re.DOTALL)
+_PDF_PAGES = re.compile(rb"/Type\s*/Pages\b")
+_PDF_COUNT = re.compile(rb"/Count\s+(\d+)")
+_PDF_SCAN_SIZE: int = 4 * 1024 * 1024
+_PDF_WINDOW: int = 512
+
+
+def _pdf_max_count(data: bytes) -> int | None:
+    pages = None
+    for match in _PDF_PAGES.finditer(data):
+        start = max(match.start() - _PDF_WINDOW, 0)
+        for count in _PDF_COUNT.findall(data, start, match.end() + _PDF_WINDOW):
+            pages = max(pages or 0, int(count))
+    return pages
+
+
+@register("application/pdf")
+def pdf_page_count(stream: BinaryIO) -> Dict[str, Any]:
+    # linearized documents have page count in the very first object
+    if match := _PDF_LINEARIZED.search(stream.read(1024)):
+        return {"pages": int(match.group(1))}
+
+    # otherwise look for the biggest count among page tree nodes,
+    # which is the root one. Writers put the page tree either next to
+    # the header or next to the trailer, so only those parts are scanned
+    # to keep big documents cheap. Best effort: page trees in the middle
+    # or inside compressed object streams are not visible this way.
+    stream.seek(0)
+    head = stream.read(_PDF_SCAN_SIZE)
+    pages = _pdf_max_count(head)
+    if len(head) == _PDF_SCAN_SIZE and not isinstance(stream, gzip.GzipFile):
+        # seeking to the end of gzip stream means inflating all of it
+        end = stream.seek(0, os.SEEK_END)
+        stream.seek(max(end - _PDF_SCAN_SIZE, _PDF_SCAN_SIZE - 2 * _PDF_WINDOW))
+        tail = _pdf_max_count(stream.read(_PDF_SCAN_SIZE))
+        if tail is not None:
+            pages = max(pages or 0, tail)
+    return {} if pages is None else {"pages": pages}
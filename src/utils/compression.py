@@ -0,0 +1,141 @@
+import gzip
+import zlib
+from typing import AsyncGenerator, AsyncIterable
+
+GZIP: str = "gzip"
+
+COMPRESSIBLE_FORMATS = (
+    "text/",
+    "application/json",
+    "application/xml",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/csv",
+    "application/sql",
+    "application/x-yaml",
+    "application/yaml",
+    "image/svg+xml",
+)
+COMPRESSIBLE_EXTENSIONS = (
+    "txt",
+    "log",
+    "csv",
+    "tsv",
+    "json",
+    "ndjson",
+    "jsonl",
+    "xml",
+    "html",
+    "htm",
+    "css",
+    "js",
+    "md",
+    "yaml",
+    "yml",
+    "sql",
+    "svg",
+)
+SNIFF_SIZE: int = 4096
+
+
+def is_compressible(format: str, ext: str, sample: bytes) -> bool:
+    """
+    Check whether file content is worth compressing.
+    Decision is based on content type, extension and,
+    if both are inconclusive, on sniffing the first bytes
+
+    :param format: content type of the file
+    :type format: str
+    :param ext: extension of the file
+    :type ext: str
+    :param sample: first bytes of the file
+    :type sample: bytes
+    :return: flag whether file is compressible
+    :rtype: bool
+    """
+    if format.lower().startswith(COMPRESSIBLE_FORMATS):
+        return True
+    if ext.lower() in COMPRESSIBLE_EXTENSIONS:
+        return True
+    if format not in ("unknown", "application/octet-stream"):
+        return False
+    return _looks_like_text(sample[:SNIFF_SIZE])
+
+
+def _looks_like_text(sample: bytes) -> bool:
+    if not sample or b"\x00" in sample:
+        return False
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # multibyte character could be cut at the end of the sample
+        return e.start >= len(sample) - 3
+    return True
+
+
+def compress(content: bytes) -> bytes:
+    """
+    Compress content with gzip. CPU-bound, run it in a thread
+
+    :param content: raw content
+    :type content: bytes
+    :return: compressed content
+    :rtype: bytes
+    """
+    return gzip.compress(content, compresslevel=6, mtime=0)
+
+
+def accepts_encoding(accept_encoding: str | None, encoding: str) -> bool:
+    """
+    Check whether client accepts specified content encoding
+    according to the Accept-Encoding header
+
+    :param accept_encoding: value of the Accept-Encoding header
+    :type accept_encoding: str | None
+    :param encoding: content encoding to check
+    :type encoding: str
+    :return: flag whether encoding is accepted
+    :rtype: bool
+    """
+    if not accept_encoding:
+        return False
+
+    accepted = False
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if coding not in (encoding, "*"):
+            continue
+        quality = 1.0
+        param, _, value = params.strip().partition("=")
+        if param.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        if coding == encoding:
+            # exact match always wins over wildcard
+            return quality > 0
+        accepted = quality > 0
+    return accepted
+
+
+async def decompress_stream(
+    chunks: AsyncIterable[bytes],
+) -> AsyncGenerator[bytes, None]:
+    """
+    Decompress gzip stream on the fly
+
+    :param chunks: compressed chunks
+    :type chunks: AsyncIterable[bytes]
+    :return: async generator
+    :rtype: AsyncGenerator[bytes, None]
+    :yield: decompressed chunk bytes
+    :rtype: Iterator[AsyncGenerator[bytes, None]]
+    """
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        if data := decompressor.decompress(chunk):
+            yield data
+    if data := decompressor.flush():
+        yield data
@@ -55,6 +55,26 @@ class Custom404Exception(CustomException):
         super().__init__(status.HTTP_404_NOT_FOUND, detail, headers)
 
 
+class Custom416Exception(CustomException):
+    def __init__(
+        self,
+        detail: Any = None,
+        headers: Dict[str, str] | None = None,
+    ) -> None:
+        super().__init__(
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, detail, headers
+        )
+
+
+class Custom503Exception(CustomException):
+    def __init__(
+        self,
+        detail: Any = None,
+        headers: Dict[str, str] | None = None,
+    ) -> None:
+        super().__init__(status.HTTP_503_SERVICE_UNAVAILABLE, detail, headers)
+
+
 def custom_exception_handler(request: Request, exc: HTTPException) -> Response:
     headers = getattr(exc, "headers", None)
     if not is_body_allowed_for_status_code(exc.status_code):
@@ -1,8 +1,25 @@
-from typing import AsyncGenerator
+import heapq
+import os
+from typing import AsyncGenerator, List, NamedTuple, Sequence, Tuple
 
 import aiofiles
 
 
+class DiskUsage(NamedTuple):
+    used: int
+    total: int
+
+    @property
+    def ratio(self) -> float:
+        return self.used / self.total if self.total else 0.0
+
+
+class DirEntry(NamedTuple):
+    name: str
+    size: int
+    mtime: float
+
+
 async def chunk_file(path: str, *, chunk_size: int = 1024) -> AsyncGenerator:
     """
     Read file from disk in chunks
@@ -19,3 +36,108 @@ async def chunk_file(path: str, *, chunk_size: int = 1024) -> AsyncGenerator:
     async with aiofiles.open(path, "rb") as f:
         while chunk := await f.read(chunk_size):
             yield chunk
+
+
+def remove_files(paths: Sequence[str]) -> List[bool]:
+    """
+    Remove files from disk, so a batch of files costs one thread hop.
+    Blocking, meant to be run in a thread
+
+    :param paths: paths to the files
+    :type paths: Sequence[str]
+    :return: flags whether each file was removed, missing files are not
+    :rtype: List[bool]
+    """
+    result = []
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            result.append(False)
+        else:
+            result.append(True)
+    return result
+
+
+def get_disk_usage(path: str) -> DiskUsage:
+    """
+    Get usage of the filesystem the path is on, the same way df does,
+    so space reserved for root is not counted as available.
+    Blocking, meant to be run in a thread
+
+    :param path: any path on the filesystem
+    :type path: str
+    :return: used and total bytes
+    :rtype: DiskUsage
+    """
+    stat = os.statvfs(path)
+    used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+    return DiskUsage(used=used, total=used + stat.f_bavail * stat.f_frsize)
+
+
+def scan_directory(
+    path: str, after: str, limit: int
+) -> Tuple[List[DirEntry], str | None]:
+    """
+    List regular files of a directory with names following the given one,
+    in name order. Only names are kept while the directory is walked,
+    so memory is bounded by the limit however large the directory is.
+    Hidden files are skipped. Blocking, meant to be run in a thread
+
+    :param path: path to the directory
+    :type path: str
+    :param after: name to list files after, empty string to list from the start
+    :type after: str
+    :param limit: max number of files
+    :type limit: int
+    :return: names, sizes and modification times of files, and the name
+        to continue listing after, None if no files follow. Files removed
+        while they are listed are skipped, so fewer files can be returned
+        even when more follow
+    :rtype: Tuple[List[DirEntry], str | None]
+    """
+    with os.scandir(path) as entries:
+        # one more name tells whether the listing is truncated
+        names = heapq.nsmallest(
+            limit + 1,
+            (
+                entry.name
+                for entry in entries
+                if entry.name > after
+                and not entry.name.startswith(".")
+                and entry.is_file(follow_symlinks=False)
+            ),
+        )
+    last = names[limit - 1] if len(names) > limit else None
+    result = []
+    for name in names[:limit]:
+        try:
+            stat = os.stat(os.path.join(path, name), follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        result.append(DirEntry(name=name, size=stat.st_size, mtime=stat.st_mtime))
+    return result, last
+
+
+def move_files(paths: Sequence[str], directory: str) -> List[bool]:
+    """
+    Move files to a directory on the same filesystem, keeping their names.
+    Blocking, meant to be run in a thread
+
+    :param paths: paths to the files
+    :type paths: Sequence[str]
+    :param directory: path to the directory, created if missing
+    :type directory: str
+    :return: flags whether each file was moved, missing files are not
+    :rtype: List[bool]
+    """
+    os.makedirs(directory, exist_ok=True)
+    result = []
+    for path in paths:
+        try:
+            os.replace(path, os.path.join(directory, os.path.basename(path)))
+        except FileNotFoundError:
+            result.append(False)
+        else:
+            result.append(True)
+    return result
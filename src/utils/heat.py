@@ -0,0 +1,46 @@
+"""
+Exponentially decayed access counts in forward decay form.
+
+A count decayed with a half-life `h` is `sum(2 ** -((now - t_i) / h))`
+over access times `t_i`. Its logarithm, shifted by `now / h`, is
+`log2(sum(2 ** (t_i / h)))`, which does not depend on the current time.
+So heat is stored once per file and never rewritten just because time passes,
+files are ordered by it directly and it is compared to a threshold
+converted into heat at the current time.
+Heats are summed up as `max(a, b) + log2(1 + 2 ** -|a - b|)`.
+"""
+
+import math
+from datetime import datetime
+
+
+def to_heat(count: float, at: datetime, half_life: float) -> float:
+    """
+    Convert count of accesses at a moment to heat
+
+    :param count: number of accesses, must be positive
+    :type count: float
+    :param at: time of the accesses
+    :type at: datetime
+    :param half_life: seconds after which count is halved
+    :type half_life: float
+    :return: heat
+    :rtype: float
+    """
+    return math.log2(count) + at.timestamp() / half_life
+
+
+def to_count(heat: float, now: datetime, half_life: float) -> float:
+    """
+    Convert heat to count of accesses decayed up to the given time
+
+    :param heat: heat
+    :type heat: float
+    :param now: time to decay count to
+    :type now: datetime
+    :param half_life: seconds after which count is halved
+    :type half_life: float
+    :return: decayed count
+    :rtype: float
+    """
+    return 2 ** (heat - now.timestamp() / half_life)
@@ -0,0 +1,77 @@
+import os
+from typing import Dict, NamedTuple, Tuple
+
+from PIL import Image, ImageOps
+
+# output format -> (content type, extension)
+IMAGE_FORMATS: Dict[str, Tuple[str, str]] = {
+    "jpeg": ("image/jpeg", "jpg"),
+    "png": ("image/png", "png"),
+    "webp": ("image/webp", "webp"),
+}
+
+
+class ImageVariant(NamedTuple):
+    name: str
+    width: int
+    height: int
+    format: str
+
+    @property
+    def content_type(self) -> str:
+        return IMAGE_FORMATS[self.format][0]
+
+    @property
+    def ext(self) -> str:
+        return IMAGE_FORMATS[self.format][1]
+
+
+def parse_variants(value: str) -> Dict[str, ImageVariant]:
+    """
+    Parse image variants configuration
+
+    :param value: comma separated variants in `name:WIDTHxHEIGHT:format` form,
+        for example `thumbnail:128x128:webp,preview:1024x1024:jpeg`
+    :type value: str
+    :raises ValueError: configuration is malformed
+    :return: variants by name
+    :rtype: Dict[str, ImageVariant]
+    """
+    variants = {}
+    for item in filter(None, (item.strip() for item in value.split(","))):
+        name, size, format = item.split(":")
+        width, height = size.lower().split("x")
+        if format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format - {format}.")
+        variants[name] = ImageVariant(name, int(width), int(height), format)
+    return variants
+
+
+def resize_image(source: str, destination: str, variant: ImageVariant) -> int:
+    """
+    Resize image to fit into variant bounds, keeping aspect ratio.
+    CPU-bound, meant to be run in a process pool
+
+    :param source: path to the original image
+    :type source: str
+    :param destination: path to save resized image to
+    :type destination: str
+    :param variant: variant to produce
+    :type variant: ImageVariant
+    :return: size of resized image in bytes
+    :rtype: int
+    """
+    try:
+        with Image.open(source) as image:
+            # lets jpeg decoder skip most of the work for big downscales
+            image.draft("RGB", (variant.width, variant.height))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((variant.width, variant.height))
+            if variant.format == "jpeg" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.save(destination, format=variant.format, optimize=True)
+    except Exception:
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+    return os.path.getsize(destination)
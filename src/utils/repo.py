@@ -1,9 +1,18 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Generic, List, Type, TypeVar
+from typing import Any, Dict, Generic, List, Sequence, Type, TypeVar
 from uuid import UUID
 
 from pydantic import BaseModel
-from sqlalchemy import Column, Result, Select, delete, select, update
+from sqlalchemy import (
+    Column,
+    Result,
+    Select,
+    UnaryExpression,
+    delete,
+    insert,
+    select,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config.db import Database
@@ -126,6 +135,9 @@ class IRepo(ABC, Generic[TModel]):
         *,
         filters: IFilterSeq,
         for_update: bool = False,
+        order_by: Sequence[str] = (),
+        limit: int | None = None,
+        columns: Sequence[str] = (),
         session: AsyncSession = None,
     ) -> Result[TModel]:
         """
@@ -135,6 +147,14 @@ class IRepo(ABC, Generic[TModel]):
         :type filters: IFilterSeq
         :param for_update: lock for update, defaults to False
         :type for_update: bool, optional
+        :param order_by: field names to order by,
+            prefix name with `-` for descending order, defaults to ()
+        :type order_by: Sequence[str], optional
+        :param limit: max number of rows, defaults to None
+        :type limit: int | None, optional
+        :param columns: names of columns to select instead of
+            whole objects, defaults to ()
+        :type columns: Sequence[str], optional
         :param session: orm session, defaults to None
         :type session: AsyncSession, optional
         :return: rows
@@ -183,6 +203,25 @@ class IRepo(ABC, Generic[TModel]):
         """
         ...
 
+    @abstractmethod
+    async def multi_create(
+        self,
+        entries: Sequence[TSchema],
+        *,
+        session: AsyncSession = None,
+    ) -> List[TModel]:
+        """
+        Insert multiple rows in one batch
+
+        :param entries: entries with rows data
+        :type entries: Sequence[TSchema]
+        :param session: orm session, defaults to None
+        :type session: AsyncSession, optional
+        :return: rows
+        :rtype: List[TModel]
+        """
+        ...
+
     @abstractmethod
     async def update(
         self,
@@ -276,6 +315,13 @@ class Repo(IRepo[TModel]):
     def all_as_select(self) -> Select[TModel]:
         return select(self.model_class)
 
+    def _order_by(self, fields: Sequence[str]) -> List[UnaryExpression]:
+        result = []
+        for field in fields:
+            column = getattr(self.model_class, field.lstrip("-"))
+            result.append(column.desc() if field.startswith("-") else column.asc())
+        return result
+
     @handle_orm_error
     @inject_session
     async def all(self, *, session: AsyncSession = None) -> Result[TModel]:
@@ -337,9 +383,20 @@ class Repo(IRepo[TModel]):
         *,
         filters: IFilterSeq,
         for_update: bool = False,
+        order_by: Sequence[str] = (),
+        limit: int | None = None,
+        columns: Sequence[str] = (),
         session: AsyncSession = None,
     ) -> Result[TModel]:
-        qs = self.all_as_select().filter(filters.compile())
+        qs = (
+            select(*(getattr(self.model_class, column) for column in columns))
+            if columns
+            else self.all_as_select()
+        ).filter(filters.compile())
+        if order_by:
+            qs = qs.order_by(*self._order_by(order_by))
+        if limit is not None:
+            qs = qs.limit(limit)
         if for_update:
             qs = qs.with_for_update()
         return await session.execute(qs)
@@ -375,6 +432,22 @@ class Repo(IRepo[TModel]):
         await session.refresh(instance)
         return instance
 
+    @handle_orm_error
+    @inject_session
+    async def multi_create(
+        self,
+        entries: Sequence[TSchema],
+        *,
+        session: AsyncSession = None,
+    ) -> List[TModel]:
+        if not entries:
+            return []
+        result = await session.scalars(
+            insert(self.model_class).returning(self.model_class),
+            [entry.model_dump() for entry in entries],
+        )
+        return list(result)
+
     @handle_orm_error
     @inject_session
     async def update(
@@ -0,0 +1,169 @@
+import asyncio
+import base64
+import hashlib
+import math
+import os
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    NamedTuple,
+    Tuple,
+)
+
+from aioboto3 import Session
+from aiobotocore.client import AioBaseClient
+from aiobotocore.config import AioConfig
+from botocore.exceptions import ClientError
+from botocore.exceptions import ConnectionError as BotoConnectionError
+from botocore.exceptions import HTTPClientError
+
+S3ClientProvider = Callable[[], Awaitable[AioBaseClient]]
+
+MAX_PARTS: int = 10000
+MB: int = 1024 * 1024
+
+_OVERLOAD_CODES = frozenset(
+    (
+        "SlowDown",
+        "Throttling",
+        "ThrottlingException",
+        "RequestLimitExceeded",
+        "TooManyRequestsException",
+        "ServiceUnavailable",
+    )
+)
+
+
+class S3Object(NamedTuple):
+    status_code: int
+    headers: Dict[str, str]
+    chunks: AsyncIterable[bytes]
+
+
+async def init_s3_client(
+    session: Session,
+    endpoint_url: str,
+    max_pool_connections: int,
+) -> AsyncIterator[AioBaseClient]:
+    """
+    S3 client resource shared by all uploads, so credentials are resolved
+    once and connections are reused. Client is closed on shutdown
+
+    :param session: boto3 initialized session
+    :type session: Session
+    :param endpoint_url: bucket endpoint url
+    :type endpoint_url: str
+    :param max_pool_connections: max number of pooled connections
+    :type max_pool_connections: int
+    :return: iterator
+    :rtype: AsyncIterator[AioBaseClient]
+    :yield: s3 client
+    :rtype: AioBaseClient
+    """
+    async with session.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        config=AioConfig(
+            max_pool_connections=max_pool_connections,
+            # presigned urls sign Content-Length only with sigv4
+            signature_version="s3v4",
+        ),
+    ) as client:
+        yield client
+
+
+def get_part_size(size: int, min_part_size: int) -> int:
+    """
+    Get multipart upload part size for a file, so that
+    the file fits into max number of parts
+
+    :param size: file size in bytes
+    :type size: int
+    :param min_part_size: min part size in bytes
+    :type min_part_size: int
+    :return: part size in bytes, rounded up to megabytes
+    :rtype: int
+    """
+    part_size = max(min_part_size, math.ceil(size / MAX_PARTS))
+    return math.ceil(part_size / MB) * MB
+
+
+def read_part(fd: int, offset: int, size: int) -> Tuple[bytes, str]:
+    """
+    Read part of a file with pread, so parts can be read concurrently
+    from one descriptor, and compute its checksum.
+    Blocking, meant to be run in a thread
+
+    :param fd: file descriptor
+    :type fd: int
+    :param offset: part offset in bytes
+    :type offset: int
+    :param size: part size in bytes
+    :type size: int
+    :return: part data and its base64 encoded sha256 checksum
+    :rtype: Tuple[bytes, str]
+    """
+    data = os.pread(fd, size, offset)
+    return data, get_checksum(data)
+
+
+def get_checksum(data: bytes) -> str:
+    """
+    Get checksum of data in the form s3 expects it
+
+    :param data: data to get checksum of
+    :type data: bytes
+    :return: base64 encoded sha256 checksum
+    :rtype: str
+    """
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    Check if s3 asks to slow down
+
+    :param error: error raised by s3 client
+    :type error: BaseException
+    :return: whether the error is throttling or unavailability
+    :rtype: bool
+    """
+    if not isinstance(error, ClientError):
+        return False
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    code = error.response.get("Error", {}).get("Code")
+    return code in _OVERLOAD_CODES or status in (429, 503)
+
+
+def is_unavailable_error(error: BaseException) -> bool:
+    """
+    Check if s3 is unhealthy, unlike errors caused by a request itself
+
+    :param error: error raised by s3 client
+    :type error: BaseException
+    :return: whether the error is a connection, timeout, server or overload one
+    :rtype: bool
+    """
+    if isinstance(error, (BotoConnectionError, HTTPClientError, asyncio.TimeoutError)):
+        return True
+    if is_overload_error(error):
+        return True
+    if isinstance(error, ClientError):
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return status is not None and status >= 500
+    return False
+
+
+def close_body(response: Dict[str, Any]) -> None:
+    """
+    Close body of a get_object response that is not going to be read,
+    so its connection is not left hanging
+
+    :param response: get_object response
+    :type response: Dict[str, Any]
+    """
+    response["Body"].close()
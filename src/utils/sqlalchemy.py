@@ -26,6 +26,7 @@ class operator(IntEnum):
     ge = 4
     in_ = 5
     is_ = 6
+    is_not = 7
 
 
 class mode(IntEnum):
@@ -44,6 +45,7 @@ _OPERATOR_TO_ORM: Dict[
     operator.ge: Column.__ge__,
     operator.in_: Column.in_,
     operator.is_: Column.is_,
+    operator.is_not: Column.is_not,
 }
 
 
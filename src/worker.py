@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import inspect
+import logging.config
+from typing import List
+
+from config import settings
+from config.di import get_di_container
+from utils.logging import get_config
+
+logging.config.dictConfig(get_config(settings.LOGGING_PATH))
+
+# job name - container provider name
+SCHEDULED = {
+    "cleanup": "disk_cleanup_scheduler",
+    "reconcile": "s3_reconcile_scheduler",
+    "evict": "disk_eviction_scheduler",
+    "place": "file_placement_scheduler",
+    "expire": "file_expiry_scheduler",
+    "orphans": "disk_reconcile_scheduler",
+}
+
+
+async def main(jobs: List[str], once: bool) -> None:
+    container = get_di_container()
+    try:
+        if once:
+            # leases are respected, a job run elsewhere right now is skipped
+            for job in jobs:
+                await getattr(container, SCHEDULED[job])().run_once(force=True)
+            return
+        async with asyncio.TaskGroup() as group:
+            for job in jobs:
+                if job == "sync":
+                    group.create_task(container.sync_files_to_s3()())
+                else:
+                    group.create_task(getattr(container, SCHEDULED[job])()())
+    finally:
+        if inspect.isawaitable(result := container.shutdown_resources()):
+            await result
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run background jobs.")
+    # validated by hand, argparse checks an empty list against choices
+    # of a positional with nargs="*" and rejects it
+    parser.add_argument(
+        "jobs",
+        nargs="*",
+        metavar="{%s}" % ",".join(("sync", *SCHEDULED)),
+        help="jobs to run, s3 sync queue by default",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="run scheduled jobs once right away and exit",
+    )
+    args = parser.parse_args(argv)
+    args.jobs = args.jobs or ["sync"]
+    for job in args.jobs:
+        if job != "sync" and job not in SCHEDULED:
+            parser.error(f"unknown job: {job}")
+    if args.once and "sync" in args.jobs:
+        parser.error("s3 sync queue can not be run once")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(main(args.jobs, args.once))